@@ -0,0 +1,310 @@
+from flask import render_template, redirect, url_for, flash, request
+from sqlalchemy.orm import joinedload
+from flask_login import login_required, current_user
+from werkzeug.security import generate_password_hash
+from io import TextIOWrapper
+
+from models import db, User, Product, QuickAccessProduct, AuditLog
+from catalog_cache import get_catalog, bump_catalog_version, bump_version
+from inventory_listing import inventory_filters, inventory_page, page_count, product_categories
+from catalog_import import import_products, CatalogImportError
+from bulk_edit import BulkChanges, preview_bulk_edit, preview_token, apply_bulk_edit
+from forms import ProductForm, UserForm, QuickAccessProductForm, ProductImportForm, BulkEditForm
+
+
+def init_admin_routes(app):
+    """Product, user and quick access management routes."""
+
+    # Product management routes
+    @app.route('/products')
+    @login_required
+    def products():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        filters = inventory_filters(request.args)
+        products, summary = inventory_page(filters)
+        return render_template('products.html',
+                             products=products,
+                             summary=summary,
+                             filters=filters,
+                             pages=page_count(summary, filters),
+                             categories=product_categories())
+
+    @app.route('/products/add', methods=['GET', 'POST'])
+    @login_required
+    def add_product():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        form = ProductForm()
+        if form.validate_on_submit():
+            product = Product(
+                name=form.name.data,
+                price=form.price.data,
+                quantity=form.quantity.data,
+                category=form.category.data,
+                barcode=form.barcode.data or None,
+                sku=form.sku.data or None,
+                low_stock_threshold=form.low_stock_threshold.data or 5,
+                tax_exempt=form.tax_exempt.data
+            )
+            db.session.add(product)
+            db.session.flush()
+            bump_catalog_version([product.id])
+            db.session.commit()
+            flash('Product added successfully', 'success')
+            return redirect(url_for('products'))
+        return render_template('product_form.html', form=form, title='Add Product')
+
+    @app.route('/products/edit/<int:id>', methods=['GET', 'POST'])
+    @login_required
+    def edit_product(id):
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        product = Product.query.get_or_404(id)
+        form = ProductForm(obj=product, product_id=product.id)
+        if form.validate_on_submit():
+            product.name = form.name.data
+            product.price = form.price.data
+            product.quantity = form.quantity.data
+            product.category = form.category.data
+            product.barcode = form.barcode.data or None
+            product.sku = form.sku.data or None
+            product.low_stock_threshold = form.low_stock_threshold.data or 5
+            product.tax_exempt = form.tax_exempt.data
+            bump_catalog_version([product.id])
+            db.session.commit()
+            flash('Product updated successfully', 'success')
+            return redirect(url_for('products'))
+        return render_template('product_form.html', form=form, title='Edit Product')
+
+    @app.route('/products/import', methods=['GET', 'POST'])
+    @login_required
+    def import_products_upload():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        form = ProductImportForm()
+        summary = None
+        if form.validate_on_submit():
+            # Parse the upload as a stream instead of reading it into memory
+            stream = TextIOWrapper(form.file.data.stream, encoding='utf-8-sig', newline='')
+            try:
+                summary = import_products(stream)
+            except (CatalogImportError, UnicodeDecodeError) as e:
+                flash(f'Could not import the file: {e}', 'danger')
+                return render_template('product_import.html', form=form, summary=None)
+            flash(f'Imported {summary.inserted} new and {summary.updated} updated products'
+                  f'{f", skipped {len(summary.errors)} rows" if summary.errors else ""}.',
+                  'warning' if summary.errors else 'success')
+        return render_template('product_import.html', form=form, summary=summary)
+
+    @app.route('/products/bulk_edit', methods=['GET', 'POST'])
+    @login_required
+    def bulk_edit_products():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        # Opened from the products page with its filters or selected rows
+        prefill = None
+        if request.method == 'GET':
+            prefill = {
+                'q': request.args.get('q', ''),
+                'category': request.args.get('category', ''),
+                'product_ids': ','.join(request.args.getlist('ids'))
+            }
+        form = BulkEditForm(data=prefill)
+        preview = None
+        if form.validate_on_submit():
+            changes = BulkChanges(
+                price_mode=form.price_mode.data or None,
+                price_value=form.price_value.data if form.price_mode.data else None,
+                low_stock_threshold=form.low_stock_threshold.data or None,
+                category=(form.new_category.data or '').strip() or None
+            )
+            filters = {'q': (form.q.data or '').strip(), 'category': form.category.data or '', 'status': ''}
+            product_ids = form.selected_ids()
+            preview = preview_bulk_edit(changes, filters, product_ids)
+            token = preview_token(changes, filters, product_ids, preview)
+            if form.apply.data:
+                if form.preview_token.data == token:
+                    updated = apply_bulk_edit(changes, filters, product_ids, current_user.id)
+                    db.session.commit()
+                    flash(f'Updated {len(updated)} products.', 'success')
+                    return redirect(url_for('products'))
+                # No preview, or the form or the matching products changed since
+                flash('Check the preview below before applying the changes.', 'warning')
+            form.preview_token.data = token
+        recent = (AuditLog.query.options(joinedload(AuditLog.user))
+                  .filter_by(action='bulk_edit')
+                  .order_by(AuditLog.date.desc())
+                  .limit(10).all())
+        return render_template('bulk_edit.html', form=form, preview=preview, recent=recent)
+
+    @app.route('/products/delete/<int:id>', methods=['POST'])
+    @login_required
+    def delete_product(id):
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        product = Product.query.get_or_404(id)
+        db.session.delete(product)
+        bump_catalog_version([product.id])
+        db.session.commit()
+        flash('Product deleted successfully', 'success')
+        return redirect(url_for('products'))
+
+    # User management routes
+    @app.route('/users')
+    @login_required
+    def users():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        users = User.query.all()
+        return render_template('users.html', users=users)
+
+    @app.route('/users/add', methods=['GET', 'POST'])
+    @login_required
+    def add_user():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        form = UserForm()
+        if form.validate_on_submit():
+            # Check if username already exists
+            existing_user = User.query.filter_by(username=form.username.data).first()
+            if existing_user:
+                flash('Username already exists', 'danger')
+                return render_template('user_form.html', form=form, title='Add User')
+                
+            user = User(
+                username=form.username.data,
+                password=generate_password_hash(form.password.data),
+                role=form.role.data
+            )
+            db.session.add(user)
+            db.session.commit()
+            flash('User added successfully', 'success')
+            return redirect(url_for('users'))
+        return render_template('user_form.html', form=form, title='Add User')
+
+    @app.route('/users/edit/<int:id>', methods=['GET', 'POST'])
+    @login_required
+    def edit_user(id):
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        user = User.query.get_or_404(id)
+        form = UserForm(obj=user)
+        
+        # Don't require password for edit
+        if request.method == 'GET':
+            form.password.data = ''
+            
+        if form.validate_on_submit():
+            # Check if username already exists and is not the current user
+            existing_user = User.query.filter_by(username=form.username.data).first()
+            if existing_user and existing_user.id != id:
+                flash('Username already exists', 'danger')
+                return render_template('user_form.html', form=form, title='Edit User')
+                
+            user.username = form.username.data
+            if form.password.data:
+                user.password = generate_password_hash(form.password.data)
+            user.role = form.role.data
+            # Every worker reloads its cached copy of the user
+            bump_version('users')
+            db.session.commit()
+            flash('User updated successfully', 'success')
+            return redirect(url_for('users'))
+        return render_template('user_form.html', form=form, title='Edit User')
+
+    @app.route('/users/delete/<int:id>', methods=['POST'])
+    @login_required
+    def delete_user(id):
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        if id == current_user.id:
+            flash('Cannot delete your own account', 'danger')
+            return redirect(url_for('users'))
+            
+        user = User.query.get_or_404(id)
+        db.session.delete(user)
+        bump_version('users')
+        db.session.commit()
+        flash('User deleted successfully', 'success')
+        return redirect(url_for('users'))
+
+    # Quick access management routes
+    @app.route('/quick_access/manage', methods=['GET'])
+    @login_required
+    def manage_quick_access():
+        if current_user.role != 'manager':
+            flash('You do not have permission to access this page.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        quick_access_products = []
+        for position in range(1, 11):  # Positions 1-10
+            quick_product = QuickAccessProduct.query.filter_by(position=position).first()
+            if quick_product:
+                quick_access_products.append({
+                    'position': position,
+                    'product_id': quick_product.product_id,
+                    'product_name': quick_product.product.name
+                })
+            else:
+                quick_access_products.append({
+                    'position': position,
+                    'product_id': None,
+                    'product_name': 'Not Set'
+                })
+                
+        form = QuickAccessProductForm()
+        form.product_id.choices = [(p.id, p.name) for p in get_catalog().snapshot()]
+        
+        return render_template('manage_quick_access.html', quick_access_products=quick_access_products, form=form)
+        
+    @app.route('/quick_access/update', methods=['POST'])
+    @login_required
+    def update_quick_access():
+        if current_user.role != 'manager':
+            flash('You do not have permission to access this page.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        form = QuickAccessProductForm()
+        form.product_id.choices = [(p.id, p.name) for p in get_catalog().snapshot()]
+        
+        if form.validate_on_submit():
+            position = int(form.position.data)
+            product_id = form.product_id.data
+            
+            # Check if position already exists
+            existing = QuickAccessProduct.query.filter_by(position=position).first()
+            if existing:
+                existing.product_id = product_id
+                # Registers re-render their cached quick access grid
+                bump_version('quick_access')
+                db.session.commit()
+                flash(f'Updated quick access button at position {position}', 'success')
+            else:
+                new_quick_access = QuickAccessProduct(position=position, product_id=product_id)
+                db.session.add(new_quick_access)
+                bump_version('quick_access')
+                db.session.commit()
+                flash(f'Added quick access button at position {position}', 'success')
+                
+        return redirect(url_for('manage_quick_access'))
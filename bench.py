@@ -0,0 +1,419 @@
+"""
+Synthetic store data and a benchmark runner for the hot pages.
+
+`flask seed-bench` fills the configured database with a deterministic store:
+a catalog of products, a history of sales with their items, and a daily close
+with lottery and cash ledger entries for every day of that history. The same
+--seed and scale always produce the same rows.
+
+`flask bench` then times the register and report endpoints through the Flask
+test client and compares each median against a saved baseline, so a change
+that slows a page down shows up as a percentage rather than a feeling. It
+also times a cold start: a fresh Python process importing the app, building
+it and serving its first request, as a newly started worker would.
+"""
+
+import json
+import os
+import random
+import re
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import func, insert, select
+from werkzeug.security import generate_password_hash
+
+from catalog_cache import bump_catalog_version
+from inventory import refresh_low_stock
+from models import (db, User, Product, Transaction, TransactionItem, QuickAccessProduct,
+                    DailyReport, LotteryTransaction, CashTransaction)
+from rollups import backfill_rollups
+
+CATEGORIES = {
+    'Beverages': (['Cola', 'Lemon Soda', 'Iced Tea', 'Sparkling Water', 'Energy Drink', 'Orange Juice'], (0.99, 4.99)),
+    'Snacks': (['Potato Chips', 'Pretzels', 'Popcorn', 'Trail Mix', 'Beef Jerky', 'Tortilla Chips'], (0.99, 6.49)),
+    'Confectionery': (['Chocolate Bar', 'Gummy Bears', 'Mints', 'Licorice', 'Caramel Chews', 'Lollipop'], (0.49, 3.99)),
+    'Dairy': (['Milk', 'Yogurt', 'Cheddar', 'Butter', 'Cream', 'Chocolate Milk'], (1.29, 7.99)),
+    'Bakery': (['White Bread', 'Bagels', 'Muffins', 'Croissants', 'Donuts', 'Rye Bread'], (1.49, 5.99)),
+    'Tobacco': (['Cigarettes', 'Cigarillos', 'Rolling Papers', 'Lighter'], (1.99, 16.99)),
+    'Household': (['Paper Towels', 'Dish Soap', 'Batteries', 'Light Bulbs', 'Trash Bags'], (1.99, 12.99)),
+    'Grocery': (['Pasta', 'Rice', 'Canned Soup', 'Cereal', 'Peanut Butter', 'Coffee'], (0.99, 9.99)),
+}
+BRANDS = ['Northern', 'Maple', 'Harbour', 'Summit', 'Prairie', 'Lakeside', 'Cedar', 'Golden', 'Valley', 'Coastal']
+SIZES = ['Small', 'Regular', 'Large', 'Family Size', '355ml', '500ml', '1L', '2L', '6 Pack', '12 Pack']
+
+# Share of sales per hour of the day (store open 7:00-23:00)
+HOURLY_WEIGHTS = [0] * 7 + [3, 5, 6, 6, 7, 9, 8, 6, 6, 7, 9, 10, 9, 7, 5, 4, 3]
+
+BENCH_CASHIERS = 5
+QUICK_ACCESS_STOCK = 10 ** 9
+
+# Matches a mid-sized slice of the seeded catalog
+SEARCH_TERM = 'choc'
+
+# Run in a fresh interpreter; prints the wall clock time once the first
+# response is done and that response's Server-Timing header
+COLD_START_SCRIPT = '''
+import time
+from app import create_app
+response = create_app().test_client().get('/login')
+print(time.time(), response.status_code, ', '.join(response.headers.getlist('Server-Timing')))
+'''
+
+
+def _product_rows(rng, count):
+    categories = list(CATEGORIES)
+    for i in range(1, count + 1):
+        category = categories[i % len(categories)]
+        items, (low, high) = CATEGORIES[category]
+        yield {
+            'id': i,
+            'name': f'{rng.choice(BRANDS)} {rng.choice(items)} {rng.choice(SIZES)} #{i}',
+            'price': round(rng.uniform(low, high), 2),
+            'quantity': QUICK_ACCESS_STOCK if i <= 10 else rng.randint(0, 200),
+            'category': category,
+            'barcode': f'{700000000000 + i:013d}',
+            'sku': f'{category[:4].upper()}{i:07d}',
+            'low_stock_threshold': 5,
+            'tax_exempt': category in ('Dairy', 'Bakery', 'Grocery') and rng.random() < 0.5,
+        }
+
+
+def _insert_chunks(model, rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(insert(model), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(model), chunk)
+
+
+def _advance_sequences():
+    """
+    Move PostgreSQL's id sequences past the explicit ids inserted by the seed,
+    so the next row the app inserts doesn't collide with a seeded one.
+    """
+    if db.engine.dialect.name != 'postgresql':
+        return
+    preparer = db.engine.dialect.identifier_preparer
+    for table in db.metadata.sorted_tables:
+        column = table.c.get('id')
+        if column is None or not column.primary_key:
+            continue
+        highest = func.max(column)
+        db.session.execute(select(func.setval(
+            func.pg_get_serial_sequence(preparer.format_table(table), 'id'),
+            func.coalesce(highest, 1),
+            highest.isnot(None)
+        )))
+
+
+def seed_bench(products=100_000, transactions=5_000_000, days=365, seed=42, chunk_size=20_000, echo=print):
+    """
+    Replace the database contents with a deterministic synthetic store.
+
+    Products follow a long-tail popularity curve (a few best sellers make up
+    most of the volume), sales are spread over store hours of the last `days`
+    days, and every day gets a daily report with its lottery and cash ledger.
+    """
+    rng = random.Random(seed)
+    db.drop_all()
+    db.create_all()
+
+    password = generate_password_hash('admin123')
+    users = [{'id': 1, 'username': 'admin', 'password': password, 'role': 'manager'},
+             {'id': 2, 'username': 'cashier', 'password': generate_password_hash('cashier123'), 'role': 'cashier'}]
+    users += [{'id': 3 + i, 'username': f'bench{i + 1}', 'password': password, 'role': 'cashier'}
+              for i in range(BENCH_CASHIERS)]
+    db.session.execute(insert(User), users)
+    cashier_ids = [user['id'] for user in users]
+
+    prices = []
+    def track_prices(rows):
+        for row in rows:
+            prices.append(row['price'])
+            yield row
+    _insert_chunks(Product, track_prices(_product_rows(rng, products)), chunk_size)
+    db.session.execute(insert(QuickAccessProduct),
+                       [{'position': i, 'product_id': i} for i in range(1, min(products, 10) + 1)])
+    # Bulk INSERTs skip the ORM events that maintain the flag
+    refresh_low_stock()
+    db.session.commit()
+    echo(f'Inserted {products} products')
+
+    end = datetime.utcnow().replace(minute=0, second=0, microsecond=0)
+    first_day = (end - timedelta(days=days - 1)).replace(hour=0)
+    hours = list(range(24))
+    daily = {}
+
+    def sales():
+        item_id = 0
+        for transaction_id in range(1, transactions + 1):
+            day = first_day + timedelta(days=rng.randrange(days))
+            date = day + timedelta(hours=rng.choices(hours, HOURLY_WEIGHTS)[0],
+                                   minutes=rng.randrange(60), seconds=rng.randrange(60))
+            if date > end:
+                date = end - timedelta(seconds=rng.randrange(3600))
+            items = []
+            subtotal = 0.0
+            for _ in range(min(int(rng.expovariate(0.4)) + 1, 12)):
+                # Long tail: low ids sell far more often than the rest
+                product_id = min(int(rng.paretovariate(1.2)), products)
+                quantity = 1 if rng.random() < 0.8 else rng.randint(2, 4)
+                price = prices[product_id - 1]
+                item_id += 1
+                items.append({'id': item_id, 'transaction_id': transaction_id, 'product_id': product_id,
+                              'quantity': quantity, 'price_at_time_of_sale': price,
+                              'custom_name': None, 'is_custom_product': False})
+                subtotal += price * quantity
+            gst = round(subtotal * 0.13, 2)
+            discount = round(subtotal * 0.1, 2) if rng.random() < 0.03 else 0.0
+            total = round(subtotal + gst - discount, 2)
+            method = 'cash' if rng.random() < 0.45 else 'card'
+            totals = daily.setdefault(date.date(), {'cash': 0.0, 'card': 0.0})
+            totals[method] += total
+            yield {'id': transaction_id, 'date': date, 'total_amount': total, 'payment_method': method,
+                   'user_id': rng.choice(cashier_ids), 'discount_amount': discount, 'gst_amount': gst,
+                   'gst_applied': True, 'is_return': False}, items
+
+    batch, items = [], []
+    for count, (transaction, lines) in enumerate(sales(), 1):
+        batch.append(transaction)
+        items.extend(lines)
+        if len(batch) >= chunk_size:
+            db.session.execute(insert(Transaction), batch)
+            db.session.execute(insert(TransactionItem), items)
+            db.session.commit()
+            batch, items = [], []
+            if count % (chunk_size * 10) == 0:
+                echo(f'Inserted {count} transactions')
+    if batch:
+        db.session.execute(insert(Transaction), batch)
+        db.session.execute(insert(TransactionItem), items)
+        db.session.commit()
+    echo(f'Inserted {transactions} transactions')
+
+    _seed_daily_reports(rng, first_day.date(), days, daily, chunk_size)
+    echo(f'Inserted {days} daily reports with lottery and cash ledgers')
+
+    rollup_rows = backfill_rollups()
+    bump_catalog_version()
+    _advance_sequences()
+    db.session.commit()
+    echo(f'Wrote {rollup_rows} sales rollup rows')
+
+
+def _seed_daily_reports(rng, first_day, days, daily, chunk_size):
+    reports, lottery, cash = [], [], []
+    opening = 500.0
+    for offset in range(days):
+        day = first_day + timedelta(days=offset)
+        report_id = offset + 1
+        at = datetime.combine(day, datetime.min.time()) + timedelta(hours=22)
+        totals = daily.get(day, {'cash': 0.0, 'card': 0.0})
+
+        lottery_sales = lottery_payouts = commission = 0.0
+        for _ in range(rng.randint(5, 30)):
+            kind = 'sale' if rng.random() < 0.8 else 'payout'
+            amount = round(rng.choice([2, 3, 5, 10, 20]) * (1 if kind == 'sale' else rng.randint(1, 10)), 2)
+            rate = 0.05 if kind == 'sale' else 0.0
+            lottery.append({'date': at, 'transaction_type': kind, 'amount': amount,
+                            'ticket_number': f'{rng.randrange(10 ** 9):09d}', 'commission_rate': rate,
+                            'commission_amount': round(amount * rate, 2),
+                            'daily_report_id': report_id, 'created_by': 1})
+            if kind == 'sale':
+                lottery_sales += amount
+                commission += amount * rate
+            else:
+                lottery_payouts += amount
+
+        expenses = deposits = 0.0
+        for kind in rng.sample(['deposit', 'withdrawal', 'expense', 'expense'], rng.randint(1, 3)):
+            amount = round(rng.uniform(20, 400), 2)
+            cash.append({'date': at, 'transaction_type': kind, 'amount': amount,
+                         'description': f'Bench {kind}', 'daily_report_id': report_id, 'created_by': 1})
+            if kind == 'deposit':
+                deposits += amount
+            elif kind == 'expense':
+                expenses += amount
+
+        closing = round(opening + totals['cash'] + lottery_sales - lottery_payouts - expenses - deposits, 2)
+        reports.append({'id': report_id, 'date': day, 'opening_cash_balance': opening,
+                        'closing_cash_balance': closing, 'cash_sales': round(totals['cash'], 2),
+                        'card_sales': round(totals['card'], 2), 'lottery_sales': round(lottery_sales, 2),
+                        'lottery_payouts': round(lottery_payouts, 2), 'lottery_commission': round(commission, 2),
+                        'miscellaneous_expenses': round(expenses, 2), 'cash_deposits': round(deposits, 2),
+                        'created_by': 1, 'created_at': at})
+        opening = closing
+
+    _insert_chunks(DailyReport, reports, chunk_size)
+    _insert_chunks(LotteryTransaction, lottery, chunk_size)
+    _insert_chunks(CashTransaction, cash, chunk_size)
+    db.session.commit()
+
+
+def benchmark_cases():
+    """(name, callable(client)) pairs. Each callable issues one timed request and returns the response."""
+    def checkout(client):
+        # Cart setup is part of the round but not of the timing
+        for position in (1, 2, 3):
+            client.post(f'/quick_access/add_to_cart/{position}')
+        started = time.perf_counter()
+        response = client.post('/transactions/checkout', data={
+            'payment_method': 'cash', 'amount_tendered': '1000', 'discount_amount': '0'})
+        return response, time.perf_counter() - started
+
+    def get(url):
+        def case(client):
+            started = time.perf_counter()
+            response = client.get(url)
+            # Streamed responses are only done once the body is consumed
+            response.get_data()
+            return response, time.perf_counter() - started
+        return case
+
+    cases = [
+        ('checkout', checkout),
+        ('new_transaction', get('/transactions/new')),
+        ('search_products', get(f'/products/search?search_term={SEARCH_TERM}')),
+        ('api_search_products', get(f'/api/products/search?term={SEARCH_TERM}')),
+    ]
+    for period in ('daily', 'weekly', 'monthly', 'yearly', 'all'):
+        cases.append((f'sales_report[{period}]', get(f'/reports/sales?period={period}')))
+    cases += [
+        ('export_sales_report[monthly]', get('/reports/sales/export?period=monthly')),
+        ('inventory_report', get('/reports/inventory')),
+        ('dashboard', get('/dashboard')),
+    ]
+    return cases
+
+
+def _queries(server_timing):
+    match = re.search(r'desc="(\d+) queries"', server_timing)
+    return int(match.group(1)) if match else None
+
+
+def _query_count(response):
+    return _queries(', '.join(response.headers.getlist('Server-Timing')))
+
+
+def cold_start(app):
+    """
+    Start a new process on the app's database and time it up to its first response.
+
+    Returns:
+        tuple: (seconds from spawning the process to the end of its first request,
+                status code, Server-Timing header)
+    """
+    env = dict(os.environ, DATABASE_URL=app.config['SQLALCHEMY_DATABASE_URI'])
+    started = time.time()
+    output = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], env=env, capture_output=True,
+                            text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    if output.returncode:
+        raise RuntimeError(f'cold start failed: {output.stderr.strip().splitlines()[-1]}')
+    finished, status, server_timing = output.stdout.strip().splitlines()[-1].split(' ', 2)
+    return float(finished) - started, int(status), server_timing
+
+
+def run_benchmarks(app, rounds=5, only=None, echo=print):
+    """
+    Time every benchmark case through the test client.
+
+    Returns:
+        dict: case name -> {'median_ms', 'min_ms', 'max_ms', 'queries', 'rounds'}
+    """
+    # Forms are posted straight from the test client, without a CSRF token
+    app.config['WTF_CSRF_ENABLED'] = False
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    if response.status_code != 302:
+        raise RuntimeError('Could not log in as admin; run `flask seed-bench` first')
+
+    results = {}
+    for name, case in benchmark_cases():
+        if only and not any(pattern in name for pattern in only):
+            continue
+        # One untimed round warms caches and compiled statements
+        case(client)
+        timings = []
+        queries = None
+        for _ in range(rounds):
+            response, elapsed = case(client)
+            if response.status_code >= 400:
+                raise RuntimeError(f'{name} returned {response.status_code}')
+            timings.append(elapsed * 1000)
+            queries = _query_count(response)
+        results[name] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': queries,
+            'rounds': rounds,
+        }
+        echo(f'{name:32} median {results[name]["median_ms"]:10.2f} ms   queries {queries}')
+
+    if not only or any(pattern in 'cold_start' for pattern in only):
+        # The untimed round leaves compiled templates in the bytecode cache
+        cold_start(app)
+        timings = []
+        for _ in range(rounds):
+            elapsed, status, server_timing = cold_start(app)
+            if status >= 400:
+                raise RuntimeError(f'cold_start returned {status}')
+            timings.append(elapsed * 1000)
+        results['cold_start'] = {
+            'median_ms': round(statistics.median(timings), 3),
+            'min_ms': round(min(timings), 3),
+            'max_ms': round(max(timings), 3),
+            'queries': _queries(server_timing),
+            'rounds': rounds,
+        }
+        echo(f'{"cold_start":32} median {results["cold_start"]["median_ms"]:10.2f} ms   '
+             f'queries {results["cold_start"]["queries"]}')
+    return results
+
+
+def load_baseline(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_baseline(path, results, app):
+    with app.app_context():
+        database = db.engine.dialect.name
+        scale = {
+            'products': db.session.execute(select(func.count(Product.id))).scalar(),
+            'transactions': db.session.execute(select(func.count(Transaction.id))).scalar(),
+        }
+    with open(path, 'w') as f:
+        json.dump({
+            'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+            'database': database,
+            'scale': scale,
+            'results': results,
+        }, f, indent=2, sort_keys=True)
+
+
+def compare(results, baseline, threshold=0.2):
+    """
+    Compare medians against a baseline.
+
+    Returns:
+        list: (name, baseline_ms, current_ms, change) for cases slower than the threshold
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline['results'].get(name)
+        if not previous or not previous['median_ms']:
+            continue
+        change = result['median_ms'] / previous['median_ms'] - 1
+        if change > threshold:
+            regressions.append((name, previous['median_ms'], result['median_ms'], change))
+    return regressions
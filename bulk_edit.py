@@ -0,0 +1,144 @@
+"""
+Set-based bulk edits to the product catalog.
+
+A bulk edit selects products with the same filters as the product listing
+(search term, category, stock status) and/or an explicit list of ids, and
+changes their price, low stock threshold and/or category with one UPDATE.
+preview_bulk_edit() runs the same selection read-only so a manager can check
+the count and a sample of new prices first; apply_bulk_edit() records one
+AuditLog entry for the whole batch. The page only applies an edit whose
+preview_token matches the preview it showed, so the selection and changes
+applied are the ones the manager saw.
+"""
+
+import hashlib
+import json
+from collections import namedtuple
+
+from sqlalchemy import Numeric, case, cast, func, literal, select, update
+
+from catalog_cache import bump_catalog_version
+from inventory import low_stock_values
+from inventory_listing import filter_conditions
+from models import db, AuditLog, Product
+
+PRICE_MODES = (
+    ('percent', 'Change by %'),
+    ('amount', 'Change by $'),
+    ('set', 'Set to $'),
+)
+
+# Prices can't be changed to less than this; such products are left out
+MIN_PRICE = 0.01
+
+PREVIEW_ROWS = 50
+
+# What to change; None leaves that attribute alone
+BulkChanges = namedtuple('BulkChanges', ['price_mode', 'price_value', 'low_stock_threshold', 'category'])
+
+# How many products match, how many of those the price change would push
+# below MIN_PRICE, and the first PREVIEW_ROWS of them with their new values
+BulkPreview = namedtuple('BulkPreview', ['matched', 'skipped', 'products'])
+
+PreviewRow = namedtuple('PreviewRow', [
+    'id', 'name', 'category', 'price', 'new_price', 'low_stock_threshold', 'new_category', 'new_threshold'
+])
+
+
+def _selection(filters, product_ids):
+    conditions = filter_conditions(filters)
+    if product_ids:
+        conditions.append(Product.id.in_(product_ids))
+    return conditions
+
+
+def _new_price(changes):
+    if not changes.price_mode:
+        return None
+    value = changes.price_value
+    if changes.price_mode == 'percent':
+        price = Product.price * (1 + value / 100.0)
+    elif changes.price_mode == 'amount':
+        price = Product.price + value
+    else:
+        price = literal(value)
+    # round() on PostgreSQL needs a numeric, not a double precision
+    return func.round(cast(price, Numeric(12, 4)), 2)
+
+
+def preview_bulk_edit(changes, filters, product_ids=None):
+    """
+    Count and sample the products a bulk edit would change, without writing.
+
+    Returns:
+        BulkPreview
+    """
+    conditions = _selection(filters, product_ids)
+    new_price = _new_price(changes)
+    too_low = case((new_price < MIN_PRICE, 1), else_=0) if new_price is not None else literal(0)
+    matched, skipped = db.session.execute(
+        select(func.count(Product.id), func.coalesce(func.sum(too_low), 0)).where(*conditions)
+    ).one()
+    rows = db.session.execute(
+        select(Product.id, Product.name, Product.category, Product.price,
+               new_price if new_price is not None else Product.price,
+               Product.low_stock_threshold)
+        .where(*conditions)
+        .order_by(Product.name, Product.id)
+        .limit(PREVIEW_ROWS)
+    ).all()
+    products = [PreviewRow(row.id, row.name, row.category, row.price, float(row[4]), row.low_stock_threshold,
+                           changes.category if changes.category is not None else row.category,
+                           changes.low_stock_threshold or row.low_stock_threshold)
+                for row in rows]
+    return BulkPreview(matched, skipped, products)
+
+
+def preview_token(changes, filters, product_ids, preview):
+    """Fingerprint of a bulk edit and the number of products its preview matched."""
+    raw = json.dumps([changes, [filters.get(key) for key in ('q', 'category', 'status')],
+                      sorted(product_ids or []), preview.matched, preview.skipped])
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+
+def apply_bulk_edit(changes, filters, product_ids, user_id):
+    """
+    Apply a bulk edit with a single UPDATE and log it (caller commits).
+
+    Products whose new price would fall below MIN_PRICE are left unchanged.
+
+    Returns:
+        list: ids of the updated products
+    """
+    conditions = _selection(filters, product_ids)
+    values = {}
+    new_price = _new_price(changes)
+    if new_price is not None:
+        values['price'] = new_price
+        conditions.append(new_price >= MIN_PRICE)
+    if changes.low_stock_threshold:
+        values['low_stock_threshold'] = changes.low_stock_threshold
+        values.update(low_stock_values(Product.quantity, changes.low_stock_threshold))
+    if changes.category is not None:
+        values['category'] = changes.category
+    if not values:
+        return []
+
+    updated = db.session.execute(
+        update(Product).where(*conditions).values(**values)
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if updated:
+        bump_catalog_version(updated)
+    db.session.add(AuditLog(
+        user_id=user_id,
+        action='bulk_edit',
+        affected=len(updated),
+        details=json.dumps({
+            'filters': {key: filters[key] for key in ('q', 'category', 'status') if filters.get(key)},
+            'product_ids': product_ids or None,
+            'changes': {key: value for key, value in changes._asdict().items() if value is not None}
+        })
+    ))
+    return updated
@@ -0,0 +1,194 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from flask import current_app, session
+
+
+class MemoryCartStore:
+    """Carts held in this process's memory. Only safe with a single worker."""
+
+    def __init__(self):
+        self._carts = {}
+        self._lock = threading.Lock()
+
+    def lines(self, handle):
+        with self._lock:
+            return [dict(line) for line in self._carts.get(handle, {}).values()]
+
+    def get_line(self, handle, product_id):
+        with self._lock:
+            line = self._carts.get(handle, {}).get(product_id)
+            return dict(line) if line else None
+
+    def put_line(self, handle, line):
+        # Dicts keep insertion order, so replacing a line keeps its position
+        with self._lock:
+            self._carts.setdefault(handle, {})[line['product_id']] = dict(line)
+
+    def remove_line(self, handle, product_id):
+        with self._lock:
+            self._carts.get(handle, {}).pop(product_id, None)
+
+    def clear(self, handle):
+        with self._lock:
+            self._carts.pop(handle, None)
+
+
+class SQLiteCartStore:
+    """
+    Carts kept in a local SQLite table shared by every worker process.
+
+    Each line records when it was last written. Carts nobody has changed for
+    max_age seconds were abandoned (the register was closed mid-sale, or the
+    session expired); they are deleted on a write at most once every
+    purge_interval seconds per process, so the table doesn't grow forever.
+    """
+
+    def __init__(self, path, max_age=86400, purge_interval=3600):
+        self.path = path
+        self.max_age = max_age
+        self.purge_interval = purge_interval
+        self._next_purge = 0.0
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute(
+            'CREATE TABLE IF NOT EXISTS cart_line ('
+            ' handle TEXT NOT NULL,'
+            ' product_key TEXT NOT NULL,'
+            ' position INTEGER NOT NULL,'
+            ' data TEXT NOT NULL,'
+            ' updated_at REAL NOT NULL DEFAULT 0,'
+            ' PRIMARY KEY (handle, product_key)'
+            ') WITHOUT ROWID'
+        )
+        columns = [row[1] for row in conn.execute('PRAGMA table_info(cart_line)')]
+        if 'updated_at' not in columns:
+            # Stores created before carts were purged; their lines count as old
+            conn.execute('ALTER TABLE cart_line ADD COLUMN updated_at REAL NOT NULL DEFAULT 0')
+
+    def _connect(self):
+        # One connection per thread, reopened after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def lines(self, handle):
+        rows = self._connect().execute(
+            'SELECT data FROM cart_line WHERE handle = ? ORDER BY position', (handle,)
+        ).fetchall()
+        return [json.loads(data) for (data,) in rows]
+
+    def get_line(self, handle, product_id):
+        row = self._connect().execute(
+            'SELECT data FROM cart_line WHERE handle = ? AND product_key = ?',
+            (handle, str(product_id))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_line(self, handle, line):
+        now = time.time()
+        self._connect().execute(
+            'INSERT INTO cart_line (handle, product_key, position, data, updated_at) '
+            'VALUES (?, ?, (SELECT COALESCE(MAX(position), 0) + 1 FROM cart_line WHERE handle = ?), ?, ?) '
+            'ON CONFLICT (handle, product_key) DO UPDATE SET data = excluded.data, updated_at = excluded.updated_at',
+            (handle, str(line['product_id']), handle, json.dumps(line), now)
+        )
+        if self.max_age and now >= self._next_purge:
+            self._next_purge = now + self.purge_interval
+            self.purge(now - self.max_age)
+
+    def purge(self, before):
+        """
+        Delete the carts none of whose lines were written since `before` (a Unix time).
+
+        Returns:
+            int: number of cart lines deleted
+        """
+        return self._connect().execute(
+            'DELETE FROM cart_line WHERE handle IN '
+            '(SELECT handle FROM cart_line GROUP BY handle HAVING MAX(updated_at) < ?)',
+            (before,)
+        ).rowcount
+
+    def remove_line(self, handle, product_id):
+        self._connect().execute(
+            'DELETE FROM cart_line WHERE handle = ? AND product_key = ?',
+            (handle, str(product_id))
+        )
+
+    def clear(self, handle):
+        self._connect().execute('DELETE FROM cart_line WHERE handle = ?', (handle,))
+
+
+class Cart:
+    """The current register's cart. The session cookie only carries its handle."""
+
+    def __init__(self, store, handle):
+        self.store = store
+        self.handle = handle
+
+    def lines(self):
+        return self.store.lines(self.handle) if self.handle else []
+
+    def get(self, product_id):
+        return self.store.get_line(self.handle, product_id) if self.handle else None
+
+    def put(self, line):
+        if not self.handle:
+            self.handle = session['cart_id'] = uuid.uuid4().hex
+        self.store.put_line(self.handle, line)
+
+    def remove(self, product_id):
+        if self.handle:
+            self.store.remove_line(self.handle, product_id)
+
+    def clear(self):
+        if self.handle:
+            self.store.clear(self.handle)
+
+
+def cart_key(product_id):
+    """Normalize a product id taken from a URL: inventory ids are ints, custom lines are strings."""
+    product_id = str(product_id)
+    return int(product_id) if product_id.isdigit() else product_id
+
+
+def cart_totals(lines):
+    """Subtotal, GST and total for a list of cart lines."""
+    subtotal = sum(item['price'] * item['quantity'] for item in lines)
+    gst_amount = round(subtotal * 0.13, 2)
+    return {
+        'item_count': len(lines),
+        'subtotal': round(subtotal, 2),
+        'gst_amount': gst_amount,
+        'total': round(subtotal + gst_amount, 2)
+    }
+
+
+def init_cart_store(app):
+    """Create the cart backend selected by CART_STORE ('sqlite' or 'memory')."""
+    backend = app.config.get('CART_STORE', 'sqlite')
+    if backend == 'memory':
+        store = MemoryCartStore()
+    elif backend == 'sqlite':
+        path = (app.config.get('CART_STORE_PATH') or os.environ.get('CART_STORE_PATH')
+                or os.path.join(app.instance_path, 'carts.sqlite'))
+        store = SQLiteCartStore(path, max_age=app.config.get('CART_MAX_AGE', 86400))
+    else:
+        raise ValueError(f'Unknown CART_STORE backend: {backend}')
+    app.extensions['cart_store'] = store
+    return store
+
+
+def get_cart():
+    """Return the cart for the current session."""
+    return Cart(current_app.extensions['cart_store'], session.get('cart_id'))
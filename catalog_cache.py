@@ -0,0 +1,225 @@
+import threading
+from collections import namedtuple
+
+from flask import current_app, g
+from sqlalchemy import delete, func, select
+
+from models import db, Product, CacheVersion, CatalogChange, upsert
+
+# Compact, read-only view of a product row held in the per-worker snapshot
+CatalogProduct = namedtuple('CatalogProduct', [
+    'id', 'name', 'price', 'quantity', 'category', 'barcode', 'sku',
+    'low_stock_threshold', 'tax_exempt'
+])
+
+# How many catalog versions of change history to keep. A worker that falls
+# further behind than this reloads the whole catalog.
+CHANGE_LOG_RETENTION = 1000
+
+
+# Versions a request is likely to need; the first lookup reads them all at once
+CACHE_VERSIONS = ('catalog', 'quick_access', 'users')
+
+
+def current_version(name='catalog'):
+    """Read a cache version once per request (0 if it was never bumped)."""
+    versions = g.setdefault('cache_versions', {})
+    if name not in versions:
+        names = ({name} | set(CACHE_VERSIONS)) - versions.keys()
+        versions.update(dict.fromkeys(names, 0))
+        versions.update(db.session.execute(
+            select(CacheVersion.name, CacheVersion.version).where(CacheVersion.name.in_(names))
+        ).all())
+    return versions[name]
+
+
+def bump_version(name='catalog'):
+    """
+    Increment a cache version inside the caller's transaction.
+
+    Workers compare their snapshot's version against this counter at the start
+    of each request, so the change becomes visible to every gunicorn worker as
+    soon as the caller commits.
+
+    Returns:
+        int: the new version
+    """
+    version = db.session.execute(
+        upsert(CacheVersion)
+        .values(name=name, version=1)
+        .on_conflict_do_update(
+            index_elements=[CacheVersion.name],
+            set_={'version': CacheVersion.version + 1}
+        )
+        .returning(CacheVersion.version)
+    ).scalar()
+    g.pop('cache_versions', None)
+    return version
+
+
+def bump_catalog_version(product_ids=None):
+    """
+    Bump the catalog version and record which products changed.
+
+    Args:
+        product_ids: ids of the products that were added, changed or deleted;
+                     None forces every worker to reload the whole catalog.
+                     An empty list changes nothing.
+    """
+    if product_ids is not None and not product_ids:
+        return
+    version = bump_version('catalog')
+    if product_ids is None:
+        product_ids = [None]
+    db.session.execute(
+        CatalogChange.__table__.insert(),
+        [{'version': version, 'product_id': product_id} for product_id in set(product_ids)]
+    )
+    if version % CHANGE_LOG_RETENTION == 0:
+        db.session.execute(
+            delete(CatalogChange).where(CatalogChange.version <= version - CHANGE_LOG_RETENTION)
+        )
+
+
+def _product_rows(*criteria):
+    return db.session.execute(
+        select(Product.id, Product.name, Product.price, Product.quantity, Product.category,
+               Product.barcode, Product.sku, Product.low_stock_threshold, Product.tax_exempt)
+        .where(*criteria)
+    ).all()
+
+
+class CatalogCache:
+    """
+    Snapshot of the product catalog, refreshed when the catalog version moves.
+
+    Besides the name-ordered product list the snapshot keeps a hash index from
+    barcode and SKU to the product, so a scan resolves without touching the
+    database. Refreshes only reload the products recorded in the change log
+    since this worker's version, falling back to a full reload when the log
+    cannot account for every version in between.
+
+    The snapshot includes stock quantities, so every checkout and return moves
+    the catalog version and each worker reloads the products sold on its next
+    request (and re-renders fragments keyed on the catalog version).
+    """
+
+    def __init__(self):
+        self.version = None
+        self.by_id = {}
+        self.by_code = {}
+        self.products = ()
+        self.hits = 0
+        self.misses = 0
+        self.full_reloads = 0
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        version = current_version('catalog')
+        with self._lock:
+            # Another thread may already have moved the snapshot past the
+            # version this request read; going back would only reload twice
+            if self.version is not None and version <= self.version:
+                self.hits += 1
+                return
+            self.misses += 1
+            cached_version = self.version
+
+        changed = None
+        if cached_version is not None:
+            changes = db.session.execute(
+                select(func.count(func.distinct(CatalogChange.version)),
+                       func.count(CatalogChange.id) - func.count(CatalogChange.product_id))
+                .where(CatalogChange.version > cached_version, CatalogChange.version <= version)
+            ).one()
+            covered, full_reloads = changes
+            if covered == version - cached_version and not full_reloads:
+                changed = db.session.execute(
+                    select(CatalogChange.product_id.distinct())
+                    .where(CatalogChange.version > cached_version, CatalogChange.version <= version)
+                ).scalars().all()
+
+        if changed is None:
+            rows = _product_rows()
+        else:
+            rows = _product_rows(Product.id.in_(changed)) if changed else []
+
+        with self._lock:
+            if self.version != cached_version:
+                # Refreshed by another thread meanwhile; a newer version than
+                # ours gets picked up again on the next lookup
+                return
+            if changed is None:
+                self.full_reloads += 1
+                self.by_id = {}
+                self.by_code = {}
+            else:
+                for product_id in changed:
+                    self._unindex(product_id)
+            for row in rows:
+                product = CatalogProduct(*row)
+                self.by_id[product.id] = product
+                if product.barcode:
+                    self.by_code[product.barcode] = product.id
+                if product.sku:
+                    self.by_code[product.sku] = product.id
+            self.products = tuple(sorted(self.by_id.values(), key=lambda p: p.name))
+            self.version = version
+
+    def _unindex(self, product_id):
+        product = self.by_id.pop(product_id, None)
+        if product:
+            for code in (product.barcode, product.sku):
+                if code and self.by_code.get(code) == product_id:
+                    del self.by_code[code]
+
+    def snapshot(self):
+        """All products, ordered by name."""
+        self._refresh()
+        return self.products
+
+    def in_stock(self):
+        """Products with stock on hand, ordered by name."""
+        return [p for p in self.snapshot() if p.quantity > 0]
+
+    def get(self, product_id):
+        self._refresh()
+        return self.by_id.get(product_id)
+
+    def lookup(self, code):
+        """Resolve a barcode or SKU to a CatalogProduct (None if unknown)."""
+        self._refresh()
+        product_id = self.by_code.get(code)
+        return self.by_id.get(product_id) if product_id is not None else None
+
+    def lookup_many(self, codes):
+        """Resolve a batch of codes with a single freshness check."""
+        self._refresh()
+        by_code, by_id = self.by_code, self.by_id
+        return [by_id.get(by_code.get(code)) for code in codes]
+
+    def warm(self):
+        """Load the snapshot ahead of the first request; loading doesn't count as a lookup."""
+        self._refresh()
+        self.hits = self.misses = self.full_reloads = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'version': self.version,
+            'products': len(self.by_id),
+            'codes': len(self.by_code),
+            'hits': self.hits,
+            'misses': self.misses,
+            'full_reloads': self.full_reloads,
+            'hit_ratio': round(self.hits / lookups, 4) if lookups else None
+        }
+
+
+def init_catalog_cache(app):
+    app.extensions['catalog_cache'] = CatalogCache()
+
+
+def get_catalog():
+    """Return this worker's catalog cache."""
+    return current_app.extensions['catalog_cache']
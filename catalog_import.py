@@ -0,0 +1,249 @@
+"""
+Bulk product import from CSV.
+
+The file is read as a stream and handled in chunks of IMPORT_CHUNK_SIZE rows,
+so a distributor price file of tens of thousands of lines never sits in
+memory as a whole. For each chunk:
+
+1. one query finds the existing products matching any barcode or SKU in it;
+2. rows for existing products are written with a single executemany UPDATE
+   and new products with a single executemany INSERT;
+3. the low stock flag is recomputed for the touched products, the catalog
+   cache version is bumped once for all of them and the chunk commits.
+
+Products are matched on barcode first, then SKU. Both columns are unique, so
+a plain INSERT ... ON CONFLICT could only target one of them; resolving the
+matches up front also lets a row whose barcode and SKU belong to two different
+products be reported instead of failing the whole chunk. The search index
+follows along through its triggers (SQLite) or expression indexes (PostgreSQL).
+
+Only the columns present in the file are written, so a price-only file
+(barcode,price) updates prices and leaves stock and names alone; blank cells
+likewise leave that field unchanged.
+"""
+
+import csv
+from collections import namedtuple
+
+from sqlalchemy import insert, or_, select, update
+
+from catalog_cache import bump_catalog_version
+from inventory import low_stock_values
+from models import db, Product
+
+IMPORT_CHUNK_SIZE = 1000
+
+# Accepted columns; header names are matched case-insensitively and spaces
+# may be used instead of underscores ("Low Stock Threshold")
+IMPORT_COLUMNS = ('name', 'price', 'quantity', 'category', 'barcode', 'sku',
+                  'low_stock_threshold', 'tax_exempt')
+
+TRUE_VALUES = ('1', 'true', 'yes', 'y')
+FALSE_VALUES = ('0', 'false', 'no', 'n')
+
+# A row that was skipped, with its line number in the file
+RowError = namedtuple('RowError', ['line', 'barcode', 'sku', 'message'])
+
+ImportSummary = namedtuple('ImportSummary', ['inserted', 'updated', 'errors'])
+
+
+class CatalogImportError(ValueError):
+    """The file as a whole can't be imported (bad or missing header)."""
+
+
+def _column_name(header):
+    return header.strip().lower().replace(' ', '_')
+
+
+def _text(value, column, max_length):
+    value = value.strip()
+    if len(value) > max_length:
+        raise ValueError(f'{column} is longer than {max_length} characters')
+    return value or None
+
+
+def _number(value, column, kind, minimum):
+    try:
+        number = kind(value.strip().lstrip('$'))
+    except ValueError:
+        raise ValueError(f'{column} "{value}" is not a number')
+    if number < minimum:
+        raise ValueError(f'{column} must be at least {minimum}')
+    return number
+
+
+def _boolean(value, column):
+    value = value.strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    raise ValueError(f'{column} "{value}" is not yes/no')
+
+
+def parse_row(raw, columns):
+    """
+    Validate one CSV row.
+
+    Returns:
+        dict: the product values for the non-blank columns
+
+    Raises:
+        ValueError: with a message for the error report
+    """
+    values = {}
+    for column in columns:
+        value = raw.get(column) or ''
+        if not value.strip():
+            # Blank cells leave the product's current value (or the default) alone
+            continue
+        if column == 'name':
+            values['name'] = _text(value, 'name', 100)
+        elif column == 'category':
+            values['category'] = _text(value, 'category', 50)
+        elif column in ('barcode', 'sku'):
+            values[column] = _text(value, column, 50)
+        elif column == 'price':
+            values['price'] = _number(value, 'price', float, 0.01)
+        elif column == 'quantity':
+            values['quantity'] = _number(value, 'quantity', int, 0)
+        elif column == 'low_stock_threshold':
+            values['low_stock_threshold'] = _number(value, 'low_stock_threshold', int, 1)
+        elif column == 'tax_exempt':
+            values['tax_exempt'] = _boolean(value, 'tax_exempt')
+    if not values.get('barcode') and not values.get('sku'):
+        raise ValueError('a barcode or SKU is required')
+    return values
+
+
+def _owners(chunk):
+    """Map each barcode and SKU used in the chunk to the existing product's id."""
+    barcodes = {values['barcode'] for _, values in chunk if values.get('barcode')}
+    skus = {values['sku'] for _, values in chunk if values.get('sku')}
+    by_barcode, by_sku = {}, {}
+    rows = db.session.execute(
+        select(Product.id, Product.barcode, Product.sku)
+        .where(or_(Product.barcode.in_(barcodes), Product.sku.in_(skus)))
+    ).all()
+    for product_id, barcode, sku in rows:
+        if barcode in barcodes:
+            by_barcode[barcode] = product_id
+        if sku in skus:
+            by_sku[sku] = product_id
+    return by_barcode, by_sku
+
+
+def _import_chunk(chunk, errors):
+    by_barcode, by_sku = _owners(chunk)
+    updates, inserts = [], []
+    seen = {}
+    for line, values in chunk:
+        barcode, sku = values.get('barcode'), values.get('sku')
+        keys = [('barcode', barcode), ('sku', sku)]
+        duplicate = next((seen[key] for key in keys if key[1] and key in seen), None)
+        if duplicate:
+            errors.append(RowError(line, barcode, sku, f'same barcode or SKU as line {duplicate}'))
+            continue
+        barcode_owner = by_barcode.get(barcode) if barcode else None
+        sku_owner = by_sku.get(sku) if sku else None
+        if barcode_owner and sku_owner and barcode_owner != sku_owner:
+            errors.append(RowError(line, barcode, sku, 'barcode and SKU belong to different products'))
+            continue
+        product_id = barcode_owner or sku_owner
+        if product_id:
+            updates.append(dict(values, id=product_id))
+        elif not values.get('name') or 'price' not in values:
+            errors.append(RowError(line, barcode, sku, 'new products need a name and a price'))
+            continue
+        else:
+            inserts.append(values)
+        for key in keys:
+            if key[1]:
+                seen[key] = line
+
+    product_ids = [values['id'] for values in updates]
+    if updates:
+        db.session.execute(update(Product), updates)
+    if inserts:
+        # executemany with RETURNING; rows that leave out optional columns get
+        # the column defaults
+        product_ids += db.session.execute(
+            insert(Product).returning(Product.id),
+            [dict({'quantity': 0, 'low_stock_threshold': 5, 'tax_exempt': False}, **values)
+             for values in inserts]
+        ).scalars().all()
+    if product_ids:
+        # Bulk statements skip the ORM events that keep the low stock flag
+        db.session.execute(
+            update(Product).where(Product.id.in_(product_ids))
+            .values(**low_stock_values(Product.quantity))
+            .execution_options(synchronize_session=False)
+        )
+        bump_catalog_version(product_ids)
+    db.session.commit()
+    return len(inserts), len(updates)
+
+
+def import_products(stream, chunk_size=IMPORT_CHUNK_SIZE):
+    """
+    Insert or update products from a CSV text stream, committing per chunk.
+
+    Rows with errors are skipped and reported; the rest of the file is still
+    imported. A chunk that fails in the database is rolled back and its rows
+    are reported as errors.
+
+    Args:
+        stream: text file object positioned at the header row
+
+    Returns:
+        ImportSummary: inserted and updated counts and a list of RowError
+
+    Raises:
+        CatalogImportError: if the header has no usable columns
+    """
+    reader = csv.DictReader(stream)
+    if not reader.fieldnames:
+        raise CatalogImportError('The file is empty.')
+    reader.fieldnames = [_column_name(name) for name in reader.fieldnames]
+    columns = [column for column in IMPORT_COLUMNS if column in reader.fieldnames]
+    if 'barcode' not in columns and 'sku' not in columns:
+        raise CatalogImportError('The file needs a barcode or sku column to match products on.')
+
+    inserted = updated = 0
+    errors = []
+    chunk = []
+
+    def flush():
+        nonlocal inserted, updated
+        try:
+            added, changed = _import_chunk(chunk, errors)
+        except Exception as e:
+            db.session.rollback()
+            message = f'not imported, the batch failed: {getattr(e, "orig", e)}'
+            errors.extend(RowError(line, values.get('barcode'), values.get('sku'), message)
+                          for line, values in chunk)
+        else:
+            inserted += added
+            updated += changed
+        chunk.clear()
+
+    for raw in reader:
+        try:
+            chunk.append((reader.line_num, parse_row(raw, columns)))
+        except ValueError as e:
+            errors.append(RowError(reader.line_num, (raw.get('barcode') or '').strip() or None,
+                                   (raw.get('sku') or '').strip() or None, str(e)))
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    errors.sort(key=lambda error: error.line)
+    return ImportSummary(inserted, updated, errors)
+
+
+def write_error_report(errors, stream):
+    """Write RowErrors as CSV (line, barcode, sku, error)."""
+    writer = csv.writer(stream)
+    writer.writerow(['line', 'barcode', 'sku', 'error'])
+    for error in errors:
+        writer.writerow([error.line, error.barcode or '', error.sku or '', error.message])
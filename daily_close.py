@@ -0,0 +1,147 @@
+"""
+Daily close figures computed from the data the till already records.
+
+Sales by payment method come from the daily SalesRollup rows and sales by
+category from CategorySalesRollup, both kept up to date by every checkout and
+return, so closing a day reads a handful of rollup rows instead of the day's
+transactions. Lottery and cash figures are summed from the report's own
+ledger entries when a manager recalculates the report; adding an entry adds
+its amount to what the report already holds.
+"""
+
+from datetime import datetime, time
+
+from sqlalchemy import case, func, select
+
+from models import db, CashTransaction, CategorySalesRollup, DailyReport, LotteryTransaction, SalesRollup
+
+# Product categories (compared case-insensitively) that have their own line on the report
+CATEGORY_FIELDS = {
+    'confectionery': 'confectionery_sales',
+    'tobacco': 'tobacco_sales',
+}
+
+# Cash ledger entry types that feed a report field; withdrawals only move cash
+CASH_FIELDS = {
+    'deposit': 'cash_deposits',
+    'expense': 'miscellaneous_expenses',
+}
+
+SALES_FIELDS = ('cash_sales', 'card_sales') + tuple(CATEGORY_FIELDS.values())
+LEDGER_FIELDS = ('lottery_sales', 'lottery_payouts', 'lottery_commission') + tuple(CASH_FIELDS.values())
+
+
+def sales_figures(day):
+    """
+    Net sales for a calendar day, from the rollups.
+
+    Cash and card sales are net of returns refunded the same way. Category
+    lines are item totals before GST and discounts, net of returned items.
+
+    Returns:
+        dict: cash_sales, card_sales, confectionery_sales, tobacco_sales
+    """
+    bucket = datetime.combine(day, time.min)
+    figures = dict.fromkeys(SALES_FIELDS, 0.0)
+
+    by_method = db.session.execute(
+        select(SalesRollup.payment_method,
+               func.sum(SalesRollup.gross) - func.sum(SalesRollup.return_amount))
+        .where(SalesRollup.granularity == 'day', SalesRollup.bucket == bucket)
+        .group_by(SalesRollup.payment_method)
+    ).all()
+    for payment_method, net in by_method:
+        field = 'cash_sales' if payment_method == 'cash' else 'card_sales'
+        figures[field] += net
+
+    by_category = db.session.execute(
+        select(CategorySalesRollup.category, CategorySalesRollup.gross)
+        .where(CategorySalesRollup.bucket == bucket)
+    ).all()
+    for category, gross in by_category:
+        field = CATEGORY_FIELDS.get(category.lower())
+        if field:
+            figures[field] += gross
+
+    return {field: round(value, 2) for field, value in figures.items()}
+
+
+def ledger_figures(report_id):
+    """
+    Lottery and cash ledger totals for a daily report, one aggregate query per ledger.
+
+    Returns:
+        dict: lottery_sales, lottery_payouts, lottery_commission,
+              cash_deposits, miscellaneous_expenses
+    """
+    is_sale = LotteryTransaction.transaction_type == 'sale'
+    lottery_sales, lottery_payouts, lottery_commission = db.session.execute(
+        select(
+            func.coalesce(func.sum(case((is_sale, LotteryTransaction.amount), else_=0.0)), 0.0),
+            func.coalesce(func.sum(case((is_sale, 0.0), else_=LotteryTransaction.amount)), 0.0),
+            func.coalesce(func.sum(case((is_sale, LotteryTransaction.commission_amount), else_=0.0)), 0.0)
+        ).where(LotteryTransaction.daily_report_id == report_id)
+    ).one()
+    figures = {
+        'lottery_sales': lottery_sales,
+        'lottery_payouts': lottery_payouts,
+        'lottery_commission': lottery_commission,
+    }
+    figures.update(dict.fromkeys(CASH_FIELDS.values(), 0.0))
+    cash = db.session.execute(
+        select(CashTransaction.transaction_type, func.sum(CashTransaction.amount))
+        .where(CashTransaction.daily_report_id == report_id,
+               CashTransaction.transaction_type.in_(CASH_FIELDS.keys()))
+        .group_by(CashTransaction.transaction_type)
+    ).all()
+    for transaction_type, amount in cash:
+        figures[CASH_FIELDS[transaction_type]] = amount
+    return {field: round(value, 2) for field, value in figures.items()}
+
+
+def daily_close(day):
+    """
+    Pre-filled values for a new daily report: the day's sales figures and an
+    opening balance carried over from the previous report's closing balance.
+
+    Returns:
+        dict: DailyReport field values
+    """
+    figures = sales_figures(day)
+    previous_closing = db.session.execute(
+        select(DailyReport.closing_cash_balance)
+        .where(DailyReport.date < day)
+        .order_by(DailyReport.date.desc())
+        .limit(1)
+    ).scalar()
+    if previous_closing is not None:
+        figures['opening_cash_balance'] = previous_closing
+    return figures
+
+
+def add_ledger_entry(report, entry):
+    """
+    Add a new lottery or cash ledger entry's amount to the report's totals
+    (caller commits).
+
+    Amounts are added to the stored values rather than recomputed from the
+    ledger, so figures a manager typed into the report are kept.
+    """
+    if isinstance(entry, LotteryTransaction):
+        if entry.transaction_type == 'sale':
+            report.lottery_sales = (report.lottery_sales or 0.0) + entry.amount
+            report.lottery_commission = (report.lottery_commission or 0.0) + (entry.commission_amount or 0.0)
+        else:
+            report.lottery_payouts = (report.lottery_payouts or 0.0) + entry.amount
+    else:
+        field = CASH_FIELDS.get(entry.transaction_type)
+        if field:
+            setattr(report, field, (getattr(report, field) or 0.0) + entry.amount)
+
+
+def refresh_daily_report(report):
+    """Overwrite a report's sales and ledger figures with the till's records (caller commits)."""
+    figures = ledger_figures(report.id)
+    figures.update(sales_figures(report.date))
+    for field, value in figures.items():
+        setattr(report, field, value)
@@ -0,0 +1,158 @@
+"""
+Named database engine profiles.
+
+DB_ENGINE_PROFILE (config or environment) picks one of PROFILES. 'auto', the
+default, picks the tuned profile for the configured database that keeps every
+commit durable; 'default' leaves SQLAlchemy's own settings alone. sqlite-wal
+trades the fsync on each commit for speed and is only used when asked for.
+
+A profile supplies engine options (pool sizes, connect args) that are merged
+under any SQLALCHEMY_ENGINE_OPTIONS already set, SQLite pragmas that are run
+on every new connection, and PostgreSQL settings (DB_REQUEST_SETTINGS) that
+are set with SET LOCAL on each transaction a web request begins. CLI commands,
+the write pipeline's thread and views marked @no_request_timeouts run without
+them, so a backfill, a REINDEX or a slowly read export isn't cancelled.
+"""
+
+import logging
+import os
+
+from flask import current_app, has_request_context, request
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger('pos.db')
+
+PROFILES = {
+    'default': {},
+    'sqlite-wal': {
+        'dialect': 'sqlite',
+        'pragmas': {
+            # Readers no longer block the writer and vice versa
+            'journal_mode': 'WAL',
+            # Only fsync at checkpoints; a power cut can lose the last commits
+            # but never corrupts the database
+            'synchronous': 'NORMAL',
+            'busy_timeout': 10000,
+            'cache_size': -64000,
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+        },
+    },
+    'sqlite-durable': {
+        'dialect': 'sqlite',
+        'pragmas': {
+            'journal_mode': 'WAL',
+            'synchronous': 'FULL',
+            'busy_timeout': 10000,
+            'cache_size': -64000,
+        },
+    },
+    'postgres-pooled': {
+        'dialect': 'postgresql',
+        'engine_options': {
+            'pool_size': 10,
+            'max_overflow': 20,
+            'pool_timeout': 10,
+            'pool_pre_ping': True,
+            'pool_recycle': 1800,
+        },
+        # Kill a web request's runaway statements instead of letting them hold
+        # locks and connections
+        'request_settings': {
+            'statement_timeout': 30000,
+            'idle_in_transaction_session_timeout': 60000,
+        },
+    },
+}
+
+# A receipt means the sale is on disk, so 'auto' never relaxes synchronous
+AUTO_PROFILES = {'sqlite': 'sqlite-durable', 'postgresql': 'postgres-pooled'}
+
+
+def _dialect(url):
+    scheme = url.split(':', 1)[0]
+    return scheme.split('+', 1)[0]
+
+
+def _set_pragmas(pragmas):
+    def on_connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name}={value}')
+        cursor.close()
+    return on_connect
+
+
+def configure_engine(app):
+    """
+    Apply the selected profile's engine options. Call before db.init_app(app).
+
+    Returns:
+        str: the name of the applied profile
+    """
+    name = app.config.get('DB_ENGINE_PROFILE') or os.environ.get('DB_ENGINE_PROFILE') or 'auto'
+    dialect = _dialect(app.config['SQLALCHEMY_DATABASE_URI'])
+    if name == 'auto':
+        name = AUTO_PROFILES.get(dialect, 'default')
+    if name not in PROFILES:
+        raise ValueError(f'Unknown DB_ENGINE_PROFILE: {name}')
+    profile = PROFILES[name]
+    if profile.get('dialect', dialect) != dialect:
+        raise ValueError(f'DB_ENGINE_PROFILE {name} is for {profile["dialect"]}, not {dialect}')
+
+    options = dict(profile.get('engine_options', {}))
+    options.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+    app.config['DB_ENGINE_PROFILE'] = name
+    app.config.setdefault('DB_REQUEST_SETTINGS', dict(profile.get('request_settings', {})))
+    return name
+
+
+def no_request_timeouts(view):
+    """Run a view's transactions without DB_REQUEST_SETTINGS (put it right above the def)."""
+    view.no_request_timeouts = True
+    return view
+
+
+def _timed_request():
+    if not has_request_context() or request.endpoint is None:
+        return False
+    view = current_app.view_functions.get(request.endpoint)
+    return not getattr(view, 'no_request_timeouts', False)
+
+
+@event.listens_for(Session, 'after_begin')
+def _apply_request_settings(db_session, transaction, connection):
+    if connection.dialect.name != 'postgresql' or not _timed_request():
+        return
+    settings = current_app.config.get('DB_REQUEST_SETTINGS')
+    if settings:
+        # set_config(..., true) is SET LOCAL: it ends with the transaction, so
+        # the pooled connection goes back without the timeouts
+        calls, params = [], {}
+        for i, (name, value) in enumerate(settings.items()):
+            calls.append(f'set_config(:name{i}, :value{i}, true)')
+            params[f'name{i}'] = name
+            params[f'value{i}'] = str(value)
+        connection.execute(text('SELECT ' + ', '.join(calls)), params)
+
+
+# Pragmas that change the database file rather than the connection
+WRITE_PRAGMAS = ('journal_mode', 'synchronous')
+
+
+def apply_engine_profile(app, engine, read_only=False):
+    """Install the profile's per-connection pragmas on an engine and log the settings."""
+    profile = PROFILES[app.config['DB_ENGINE_PROFILE']]
+    pragmas = profile.get('pragmas')
+    if pragmas and read_only:
+        pragmas = {name: value for name, value in pragmas.items() if name not in WRITE_PRAGMAS}
+    if pragmas:
+        event.listen(engine, 'connect', _set_pragmas(pragmas))
+    applied = dict(app.config['SQLALCHEMY_ENGINE_OPTIONS'])
+    if pragmas:
+        applied['pragmas'] = pragmas
+    logger.info('Database engine profile %s for %s%s: %s',
+                app.config['DB_ENGINE_PROFILE'], engine.dialect.name, ' (read-only)' if read_only else '',
+                applied or 'SQLAlchemy defaults')
@@ -1,6 +1,7 @@
 from flask_wtf import FlaskForm
+from flask_wtf.file import FileAllowed, FileField, FileRequired
 from wtforms import StringField, PasswordField, SubmitField, FloatField, IntegerField, SelectField, HiddenField, BooleanField, SearchField
-from wtforms.validators import DataRequired, Length, NumberRange, Optional, ValidationError
+from wtforms.validators import DataRequired, InputRequired, Length, NumberRange, Optional, ValidationError
 
 class LoginForm(FlaskForm):
     username = StringField('Username', validators=[DataRequired(), Length(min=3, max=50)])
@@ -15,8 +16,14 @@ class ProductForm(FlaskForm):
     barcode = StringField('Barcode', validators=[Optional(), Length(max=50)])
     sku = StringField('SKU', validators=[Optional(), Length(max=50)])
     low_stock_threshold = IntegerField('Low Stock Threshold', validators=[Optional(), NumberRange(min=1)])
+    tax_exempt = BooleanField('Tax Exempt')
     submit = SubmitField('Save')
 
+    def __init__(self, *args, product_id=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The product being edited, whose own barcode and SKU aren't duplicates
+        self.product_id = product_id
+
     def validate_price(self, field):
         if field.data <= 0:
             raise ValidationError('Price must be greater than 0.')
@@ -25,16 +32,67 @@ class ProductForm(FlaskForm):
         if field.data:
             from models import Product
             product = Product.query.filter_by(barcode=field.data).first()
-            if product and (not hasattr(self, 'id') or product.id != self.id.data):
+            if product and product.id != self.product_id:
                 raise ValidationError('This barcode is already in use.')
 
     def validate_sku(self, field):
         if field.data:
             from models import Product
             product = Product.query.filter_by(sku=field.data).first()
-            if product and (not hasattr(self, 'id') or product.id != self.id.data):
+            if product and product.id != self.product_id:
                 raise ValidationError('This SKU is already in use.')
 
+class ProductImportForm(FlaskForm):
+    file = FileField('Product File (CSV)', validators=[FileRequired(), FileAllowed(['csv'], 'Upload a .csv file.')])
+    submit = SubmitField('Import')
+
+class BulkEditForm(FlaskForm):
+    # Which products
+    q = StringField('Search', validators=[Optional(), Length(max=100)])
+    category = StringField('Category', validators=[Optional(), Length(max=50)])
+    product_ids = StringField('Product IDs', validators=[Optional()])
+    all_products = BooleanField('Change every product')
+    # What to change
+    price_mode = SelectField('Price Change', choices=[('', 'No change'), ('percent', 'Change by %'),
+                                                      ('amount', 'Change by $'), ('set', 'Set to $')],
+                             validators=[Optional()])
+    price_value = FloatField('Amount', validators=[Optional()])
+    low_stock_threshold = IntegerField('New Low Stock Threshold', validators=[Optional(), NumberRange(min=1)])
+    new_category = StringField('Move to Category', validators=[Optional(), Length(max=50)])
+    # Set by the preview; Apply only runs for the selection and changes it showed
+    preview_token = HiddenField()
+    preview = SubmitField('Preview')
+    apply = SubmitField('Apply Changes')
+
+    def validate_product_ids(self, field):
+        try:
+            self.selected_ids()
+        except ValueError:
+            raise ValidationError('Enter product IDs as numbers separated by commas.')
+
+    def validate_price_value(self, field):
+        if self.price_mode.data == 'set' and field.data < 0.01:
+            raise ValidationError('Price must be greater than 0.')
+
+    def validate(self, extra_validators=None):
+        # Optional() skips the field validators for blank fields, so checks
+        # that depend on several fields being filled in run here
+        if not super().validate(extra_validators):
+            return False
+        if self.price_mode.data and self.price_value.data is None:
+            self.price_value.errors.append('Enter the amount for the price change.')
+            return False
+        if not (self.price_mode.data or self.low_stock_threshold.data or (self.new_category.data or '').strip()):
+            self.new_category.errors.append('Choose at least one change to make.')
+            return False
+        if not ((self.q.data or '').strip() or self.category.data or self.selected_ids() or self.all_products.data):
+            self.all_products.errors.append('Choose the products to change, or tick "Change every product".')
+            return False
+        return True
+
+    def selected_ids(self):
+        return [int(part) for part in (self.product_ids.data or '').replace(' ', ',').split(',') if part]
+
 class TransactionItemForm(FlaskForm):
     product_id = SelectField('Product', coerce=int, validators=[DataRequired()])
     quantity = IntegerField('Quantity', validators=[DataRequired(), NumberRange(min=1)])
@@ -74,14 +132,14 @@ class QuickAddForm(FlaskForm):
     submit = SubmitField('Add to Cart')
 
     def validate_product_code(self, field):
-        from models import Product
-        product = Product.query.filter((Product.barcode == field.data) | (Product.sku == field.data)).first()
+        from catalog_cache import get_catalog
+        product = get_catalog().lookup(field.data)
         if not product:
             raise ValidationError('Product not found. Please check the barcode or SKU.')
 
     def validate_quantity(self, field):
-        from models import Product
-        product = Product.query.filter((Product.barcode == self.product_code.data) | (Product.sku == self.product_code.data)).first()
+        from catalog_cache import get_catalog
+        product = get_catalog().lookup(self.product_code.data)
         if product and field.data > product.quantity:
             raise ValidationError(f'Only {product.quantity} available in stock.')
 
@@ -105,19 +163,21 @@ class CustomProductForm(FlaskForm):
             raise ValidationError('Price must be greater than 0.')
 
 class DailyReportForm(FlaskForm):
+    # InputRequired rather than DataRequired: zero is a valid amount and the
+    # sales fields are pre-filled with 0.0 on days without sales
     date = StringField('Date', validators=[DataRequired()])
-    opening_cash_balance = FloatField('Opening Cash Balance', validators=[DataRequired(), NumberRange(min=0)])
-    closing_cash_balance = FloatField('Closing Cash Balance', validators=[DataRequired(), NumberRange(min=0)])
-    cash_sales = FloatField('Cash Sales', validators=[DataRequired(), NumberRange(min=0)])
-    card_sales = FloatField('Card Sales', validators=[DataRequired(), NumberRange(min=0)])
-    lottery_sales = FloatField('Lottery Sales', validators=[DataRequired(), NumberRange(min=0)])
-    confectionery_sales = FloatField('Confectionery Sales', validators=[DataRequired(), NumberRange(min=0)])
-    tobacco_sales = FloatField('Tobacco Sales', validators=[DataRequired(), NumberRange(min=0)])
-    lottery_payouts = FloatField('Lottery Payouts', validators=[DataRequired(), NumberRange(min=0)])
-    lottery_commission = FloatField('Lottery Commission', validators=[DataRequired(), NumberRange(min=0)])
-    restocking_costs = FloatField('Restocking Costs', validators=[DataRequired(), NumberRange(min=0)])
-    miscellaneous_expenses = FloatField('Miscellaneous Expenses', validators=[DataRequired(), NumberRange(min=0)])
-    cash_deposits = FloatField('Cash Deposits', validators=[DataRequired(), NumberRange(min=0)])
+    opening_cash_balance = FloatField('Opening Cash Balance', validators=[InputRequired(), NumberRange(min=0)])
+    closing_cash_balance = FloatField('Closing Cash Balance', validators=[InputRequired(), NumberRange(min=0)])
+    cash_sales = FloatField('Cash Sales', validators=[InputRequired(), NumberRange(min=0)])
+    card_sales = FloatField('Card Sales', validators=[InputRequired(), NumberRange(min=0)])
+    lottery_sales = FloatField('Lottery Sales', validators=[InputRequired(), NumberRange(min=0)])
+    confectionery_sales = FloatField('Confectionery Sales', validators=[InputRequired(), NumberRange(min=0)])
+    tobacco_sales = FloatField('Tobacco Sales', validators=[InputRequired(), NumberRange(min=0)])
+    lottery_payouts = FloatField('Lottery Payouts', validators=[InputRequired(), NumberRange(min=0)])
+    lottery_commission = FloatField('Lottery Commission', validators=[InputRequired(), NumberRange(min=0)])
+    restocking_costs = FloatField('Restocking Costs', validators=[InputRequired(), NumberRange(min=0)])
+    miscellaneous_expenses = FloatField('Miscellaneous Expenses', validators=[InputRequired(), NumberRange(min=0)])
+    cash_deposits = FloatField('Cash Deposits', validators=[InputRequired(), NumberRange(min=0)])
     notes = StringField('Notes', validators=[Optional()])
     submit = SubmitField('Save Daily Report')
 
@@ -0,0 +1,17 @@
+"""
+Gunicorn settings, picked up automatically from the working directory.
+
+The app is created once, in the master, and forked into the workers
+(preload_app); see preload.py for what is shared and what each worker
+opens for itself.
+"""
+
+wsgi_app = 'app:create_app()'
+preload_app = True
+
+
+def when_ready(server):
+    # The preloaded app is built by now and no worker has been forked yet
+    if server.cfg.preload_app:
+        from preload import warm_app
+        warm_app(server.app.wsgi())
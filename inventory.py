@@ -0,0 +1,160 @@
+from collections import namedtuple
+from datetime import datetime
+
+from sqlalchemy import case, event, func, select, true, update
+from sqlalchemy.sql import ClauseElement
+
+from models import db, Product
+
+# A cart line that could not be fulfilled: how much was asked for and how much
+# was actually on the shelf when the reservation ran.
+Shortage = namedtuple('Shortage', ['product_id', 'requested', 'available'])
+
+
+def _merge_demand(lines):
+    """Collapse (product_id, quantity) pairs into a {product_id: quantity} dict."""
+    demand = {}
+    for product_id, quantity in lines:
+        demand[product_id] = demand.get(product_id, 0) + quantity
+    return demand
+
+
+def low_stock_values(quantity, threshold=Product.low_stock_threshold):
+    """
+    SET values that keep Product.low_stock and low_stock_since in step with a
+    bulk UPDATE's new quantity (or threshold).
+
+    SET expressions see the row as it was before the UPDATE, so
+    low_stock_since keeps its original time while a product stays low and is
+    stamped only when it first drops to its threshold.
+
+    Args:
+        quantity: the SQL expression being assigned to Product.quantity
+        threshold: the value being assigned to Product.low_stock_threshold,
+                   if the UPDATE changes it
+    """
+    is_low = quantity <= threshold
+    return {
+        'low_stock': case((is_low, True), else_=False),
+        'low_stock_since': case((is_low, func.coalesce(Product.low_stock_since, datetime.utcnow())),
+                                else_=None),
+    }
+
+
+@event.listens_for(Product, 'before_insert')
+def _low_stock_on_insert(mapper, connection, product):
+    # Column defaults are only filled in after this hook, too late to compare
+    for column in ('quantity', 'low_stock_threshold'):
+        if getattr(product, column) is None:
+            setattr(product, column, Product.__table__.c[column].default.arg)
+    _sync_low_stock(mapper, connection, product)
+
+
+@event.listens_for(Product, 'before_update')
+def _sync_low_stock(mapper, connection, product):
+    # Product edits, returns and anything else that goes through the ORM
+    if isinstance(product.quantity, ClauseElement):
+        return
+    is_low = (product.quantity is not None and product.low_stock_threshold is not None
+              and product.quantity <= product.low_stock_threshold)
+    if product.low_stock != is_low:
+        product.low_stock = is_low
+    if not is_low:
+        product.low_stock_since = None
+    elif product.low_stock_since is None:
+        product.low_stock_since = datetime.utcnow()
+
+
+def refresh_low_stock():
+    """
+    Recompute the low stock flag for every product, for rows written by bulk
+    INSERTs or directly in the database.
+
+    Returns:
+        int: number of products now flagged as low stock
+    """
+    db.session.execute(
+        update(Product).values(**low_stock_values(Product.quantity))
+        .execution_options(synchronize_session=False)
+    )
+    return db.session.execute(select(func.count(Product.id)).where(Product.low_stock == true())).scalar()
+
+
+def low_stock_products(since=None):
+    """
+    Products at or below their low stock threshold, most recently low first.
+
+    Args:
+        since: only products that became low stock at or after this datetime
+
+    Returns:
+        list: Product objects
+    """
+    query = Product.query.filter(Product.low_stock == true())
+    if since is not None:
+        query = query.filter(Product.low_stock_since >= since)
+    return query.order_by(Product.low_stock_since.desc(), Product.id).all()
+
+
+def reserve_stock(lines):
+    """
+    Decrement stock for a whole cart in one conditional UPDATE.
+
+    Each product is decremented only if it still has at least the requested
+    quantity on hand, so two registers selling the last unit at the same time
+    cannot oversell: the database re-checks the condition under its row lock
+    (PostgreSQL) or writer lock (SQLite). If any line is short the caller must
+    roll the session back, which also undoes the lines that did succeed.
+
+    Args:
+        lines: iterable of (product_id, quantity) pairs for inventory products
+               (custom products must be filtered out by the caller)
+
+    Returns:
+        list: Shortage tuples for the lines that could not be fulfilled;
+              an empty list means every line was reserved
+    """
+    demand = _merge_demand(lines)
+    if not demand:
+        return []
+
+    requested = case(demand, value=Product.id)
+    remaining = Product.quantity - requested
+    reserved = db.session.execute(
+        update(Product)
+        .where(Product.id.in_(demand.keys()), Product.quantity >= requested)
+        .values(quantity=remaining, **low_stock_values(remaining))
+        .returning(Product.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if len(reserved) == len(demand):
+        return []
+
+    # Lines that failed the condition were left untouched, so their current
+    # quantity is exactly what was available. Deleted products count as zero.
+    reserved = set(reserved)
+    short_ids = [product_id for product_id in demand if product_id not in reserved]
+    on_hand = dict(db.session.execute(
+        select(Product.id, Product.quantity).where(Product.id.in_(short_ids))
+    ).all())
+    return [Shortage(product_id, demand[product_id], on_hand.get(product_id, 0))
+            for product_id in short_ids]
+
+
+def release_stock(lines):
+    """
+    Put stock back for (product_id, quantity) pairs in one UPDATE.
+
+    Used to undo reservations for lines that were taken before another line of
+    the same sale turned out to be short, and for restocking returns.
+    """
+    demand = _merge_demand(lines)
+    if not demand:
+        return
+    restocked = Product.quantity + case(demand, value=Product.id)
+    db.session.execute(
+        update(Product)
+        .where(Product.id.in_(demand.keys()))
+        .values(quantity=restocked, **low_stock_values(restocked))
+        .execution_options(synchronize_session=False)
+    )
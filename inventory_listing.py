@@ -0,0 +1,128 @@
+from collections import namedtuple
+
+from sqlalchemy import and_, case, func, not_, select, true
+
+from models import db, Product
+from search_index import search_condition
+
+# Lightweight product row for the products page and inventory report
+ProductRow = namedtuple('ProductRow', [
+    'id', 'name', 'category', 'price', 'quantity', 'low_stock_threshold', 'sku', 'barcode'
+])
+
+InventorySummary = namedtuple('InventorySummary', [
+    'total_products', 'out_of_stock', 'low_stock', 'total_quantity', 'stock_value'
+])
+
+SORT_COLUMNS = {
+    'id': Product.id,
+    'name': Product.name,
+    'category': Product.category,
+    'price': Product.price,
+    'quantity': Product.quantity,
+    'value': Product.price * Product.quantity,
+}
+
+OUT_OF_STOCK = Product.quantity <= 0
+LOW_STOCK = and_(Product.quantity > 0, Product.low_stock == true())
+
+STOCK_STATUSES = {
+    'out': OUT_OF_STOCK,
+    'low': LOW_STOCK,
+    'in': not_(Product.low_stock == true()),
+    # Everything that needs reordering
+    'reorder': Product.low_stock == true(),
+}
+
+MAX_PAGE_SIZE = 500
+
+
+def inventory_filters(args):
+    """
+    Read listing options from request args, falling back to defaults for
+    anything missing or invalid.
+
+    Returns:
+        dict: q, category, status, sort, direction, page, per_page
+    """
+    sort = args.get('sort', 'name')
+    direction = args.get('dir', 'asc')
+    status = args.get('status', '')
+    return {
+        'q': args.get('q', '').strip(),
+        'category': args.get('category', ''),
+        'status': status if status in STOCK_STATUSES else '',
+        'sort': sort if sort in SORT_COLUMNS else 'name',
+        'direction': direction if direction in ('asc', 'desc') else 'asc',
+        'page': max(args.get('page', 1, type=int) or 1, 1),
+        'per_page': min(max(args.get('per_page', 50, type=int) or 50, 1), MAX_PAGE_SIZE),
+    }
+
+
+def filter_conditions(filters):
+    """WHERE conditions for the q, category and status listing filters."""
+    conditions = []
+    if filters['q']:
+        conditions.append(search_condition(filters['q']))
+    if filters['category']:
+        conditions.append(Product.category == filters['category'])
+    if filters['status']:
+        conditions.append(STOCK_STATUSES[filters['status']])
+    return conditions
+
+
+def inventory_summary(filters):
+    """Counts, units and stock value for the filtered products, in one aggregate query."""
+    row = db.session.execute(
+        select(
+            func.count(Product.id),
+            func.coalesce(func.sum(case((OUT_OF_STOCK, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((LOW_STOCK, 1), else_=0)), 0),
+            func.coalesce(func.sum(Product.quantity), 0),
+            func.coalesce(func.sum(Product.price * Product.quantity), 0.0),
+        ).where(*filter_conditions(filters))
+    ).one()
+    return InventorySummary(*row)
+
+
+def inventory_page(filters):
+    """
+    One page of products, sorted and filtered in SQL.
+
+    Returns:
+        tuple: (list of ProductRow, InventorySummary)
+    """
+    summary = inventory_summary(filters)
+    column = SORT_COLUMNS[filters['sort']]
+    order = column.desc() if filters['direction'] == 'desc' else column.asc()
+    rows = db.session.execute(
+        select(Product.id, Product.name, Product.category, Product.price, Product.quantity,
+               Product.low_stock_threshold, Product.sku, Product.barcode)
+        .where(*filter_conditions(filters))
+        # id breaks ties so rows don't move between pages
+        .order_by(order, Product.id)
+        .limit(filters['per_page'])
+        .offset((filters['page'] - 1) * filters['per_page'])
+    ).all()
+    return [ProductRow(*row) for row in rows], summary
+
+
+def page_count(summary, filters):
+    return max((summary.total_products + filters['per_page'] - 1) // filters['per_page'], 1)
+
+
+def product_categories():
+    """Distinct product categories, for the filter dropdown."""
+    return db.session.execute(
+        select(Product.category).where(Product.category.isnot(None))
+        .group_by(Product.category).order_by(Product.category)
+    ).scalars().all()
+
+
+def stock_status(row):
+    """'out', 'low' or 'in' for one product row."""
+    if row.quantity <= 0:
+        return 'out'
+    if row.low_stock_threshold is not None and row.quantity <= row.low_stock_threshold:
+        return 'low'
+    return 'in'
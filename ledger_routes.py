@@ -0,0 +1,174 @@
+from flask import render_template, redirect, url_for, flash, request, Response
+from flask_login import login_required, current_user
+from datetime import datetime
+import csv
+from io import StringIO
+
+from models import db, DailyReport, LotteryTransaction, CashTransaction
+from read_routing import read_replica
+from daily_close import daily_close, refresh_daily_report, add_ledger_entry
+from forms import DailyReportForm, LotteryTransactionForm, CashTransactionForm
+
+
+def init_ledger_routes(app):
+    """Daily report routes: the daily close and its lottery and cash ledgers."""
+
+    # Daily report routes
+    @app.route('/reports/daily', methods=['GET'])
+    @login_required
+    @read_replica
+    def daily_reports():
+        reports = DailyReport.query.order_by(DailyReport.date.desc()).all()
+        return render_template('reports/daily_reports.html', reports=reports)
+
+    @app.route('/reports/daily/new', methods=['GET', 'POST'])
+    @login_required
+    def new_daily_report():
+        # Pre-fill the day's sales (and the opening balance) from the rollups
+        prefill = None
+        if request.method == 'GET':
+            try:
+                day = datetime.strptime(request.args.get('date', ''), '%Y-%m-%d').date()
+            except ValueError:
+                day = datetime.utcnow().date()
+            prefill = dict(daily_close(day), date=day.isoformat())
+        form = DailyReportForm(data=prefill)
+        if form.validate_on_submit():
+            report = DailyReport(
+                date=datetime.strptime(form.date.data, '%Y-%m-%d').date(),
+                opening_cash_balance=form.opening_cash_balance.data,
+                closing_cash_balance=form.closing_cash_balance.data,
+                cash_sales=form.cash_sales.data,
+                card_sales=form.card_sales.data,
+                lottery_sales=form.lottery_sales.data,
+                confectionery_sales=form.confectionery_sales.data,
+                tobacco_sales=form.tobacco_sales.data,
+                lottery_payouts=form.lottery_payouts.data,
+                lottery_commission=form.lottery_commission.data,
+                restocking_costs=form.restocking_costs.data,
+                miscellaneous_expenses=form.miscellaneous_expenses.data,
+                cash_deposits=form.cash_deposits.data,
+                notes=form.notes.data,
+                created_by=current_user.id
+            )
+            db.session.add(report)
+            db.session.commit()
+            flash('Daily report created successfully!', 'success')
+            return redirect(url_for('daily_reports'))
+        return render_template('reports/new_daily_report.html', form=form)
+
+    @app.route('/reports/daily/<int:id>', methods=['GET'])
+    @login_required
+    def view_daily_report(id):
+        report = DailyReport.query.get_or_404(id)
+        return render_template('reports/view_daily_report.html', report=report)
+
+    @app.route('/reports/daily/<int:id>/refresh', methods=['POST'])
+    @login_required
+    def refresh_daily_report_figures(id):
+        report = DailyReport.query.get_or_404(id)
+        refresh_daily_report(report)
+        db.session.commit()
+        flash('Sales and ledger figures recalculated.', 'success')
+        return redirect(url_for('view_daily_report', id=report.id))
+
+    @app.route('/reports/daily/<int:id>/lottery', methods=['GET', 'POST'])
+    @login_required
+    def add_lottery_transaction(id):
+        report = DailyReport.query.get_or_404(id)
+        form = LotteryTransactionForm()
+        if form.validate_on_submit():
+            transaction = LotteryTransaction(
+                transaction_type=form.transaction_type.data,
+                amount=form.amount.data,
+                ticket_number=form.ticket_number.data,
+                commission_rate=form.commission_rate.data,
+                commission_amount=(form.amount.data * form.commission_rate.data / 100),
+                daily_report_id=report.id,
+                created_by=current_user.id
+            )
+            db.session.add(transaction)
+            add_ledger_entry(report, transaction)
+            db.session.commit()
+            flash('Lottery transaction added successfully!', 'success')
+            return redirect(url_for('view_daily_report', id=report.id))
+        return render_template('reports/add_lottery_transaction.html', form=form, report=report)
+
+    @app.route('/reports/daily/<int:id>/cash', methods=['GET', 'POST'])
+    @login_required
+    def add_cash_transaction(id):
+        report = DailyReport.query.get_or_404(id)
+        form = CashTransactionForm()
+        if form.validate_on_submit():
+            transaction = CashTransaction(
+                transaction_type=form.transaction_type.data,
+                amount=form.amount.data,
+                description=form.description.data,
+                daily_report_id=report.id,
+                created_by=current_user.id
+            )
+            db.session.add(transaction)
+            add_ledger_entry(report, transaction)
+            db.session.commit()
+            flash('Cash transaction added successfully!', 'success')
+            return redirect(url_for('view_daily_report', id=report.id))
+        return render_template('reports/add_cash_transaction.html', form=form, report=report)
+
+    @app.route('/reports/daily/<int:id>/export')
+    @login_required
+    def export_daily_report(id):
+        report = DailyReport.query.get_or_404(id)
+        output = StringIO()
+        writer = csv.writer(output)
+        
+        # Write header
+        writer.writerow(['Daily Report - ' + report.date.strftime('%Y-%m-%d')])
+        writer.writerow([])
+        
+        # Write summary
+        writer.writerow(['Summary'])
+        writer.writerow(['Opening Cash Balance', report.opening_cash_balance])
+        writer.writerow(['Closing Cash Balance', report.closing_cash_balance])
+        writer.writerow(['Cash Sales', report.cash_sales])
+        writer.writerow(['Card Sales', report.card_sales])
+        writer.writerow(['Lottery Sales', report.lottery_sales])
+        writer.writerow(['Confectionery Sales', report.confectionery_sales])
+        writer.writerow(['Tobacco Sales', report.tobacco_sales])
+        writer.writerow(['Lottery Payouts', report.lottery_payouts])
+        writer.writerow(['Lottery Commission', report.lottery_commission])
+        writer.writerow(['Restocking Costs', report.restocking_costs])
+        writer.writerow(['Miscellaneous Expenses', report.miscellaneous_expenses])
+        writer.writerow(['Cash Deposits', report.cash_deposits])
+        writer.writerow(['Cash Shortage', report.cash_shortage])
+        writer.writerow(['Cash Overage', report.cash_overage])
+        writer.writerow([])
+        
+        # Write lottery transactions
+        writer.writerow(['Lottery Transactions'])
+        writer.writerow(['Type', 'Amount', 'Ticket Number', 'Commission Rate', 'Commission Amount'])
+        for transaction in report.lottery_transactions:
+            writer.writerow([
+                transaction.transaction_type,
+                transaction.amount,
+                transaction.ticket_number,
+                transaction.commission_rate,
+                transaction.commission_amount
+            ])
+        writer.writerow([])
+        
+        # Write cash transactions
+        writer.writerow(['Cash Transactions'])
+        writer.writerow(['Type', 'Amount', 'Description'])
+        for transaction in report.cash_transactions:
+            writer.writerow([
+                transaction.transaction_type,
+                transaction.amount,
+                transaction.description
+            ])
+        
+        output.seek(0)
+        return Response(
+            output,
+            mimetype='text/csv',
+            headers={'Content-Disposition': f'attachment; filename=daily_report_{report.date.strftime("%Y%m%d")}.csv'}
+        )
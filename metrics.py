@@ -0,0 +1,314 @@
+"""
+Prometheus text-format metrics, aggregated across gunicorn workers.
+
+Each worker keeps its counters and histograms in memory and writes them to
+its own JSON file under METRICS_DIR (instance/metrics by default) at most once
+per METRICS_FLUSH_INTERVAL seconds. /metrics merges every worker's file, so any
+worker can answer a scrape and the totals don't depend on which one it hit.
+Counters and histograms of workers that have exited are kept, like Prometheus'
+own multiprocess mode; gauges only count live workers. Clear the directory on
+deploy so restarted workers don't inherit stale totals.
+
+No collector or client library is needed: the endpoint can be scraped by a
+Prometheus server (with METRICS_TOKEN as a bearer token), or opened by a
+logged-in manager. Without a token, scrapers can't read it.
+"""
+
+import atexit
+import hmac
+import json
+import os
+import threading
+import time
+
+from flask import Response, current_app, g, has_app_context, request
+from flask_login import current_user
+from sqlalchemy import event
+
+# name -> (type, help, histogram buckets)
+METRICS = {
+    'pos_request_duration_seconds': (
+        'histogram', 'Request latency by endpoint.',
+        (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)),
+    'pos_requests_total': (
+        'counter', 'Requests by endpoint and status code.', None),
+    'pos_checkouts_total': (
+        'counter', 'Completed checkouts by payment method.', None),
+    'pos_checkout_failures_total': (
+        'counter', 'Checkouts rejected or rolled back, by reason.', None),
+    'pos_checkouts_pending_total': (
+        'counter', 'Checkouts the write pipeline had not committed when the register stopped waiting.', None),
+    'pos_checkout_amount_total': (
+        'counter', 'Sales value of completed checkouts.', None),
+    'pos_cart_lines': (
+        'histogram', 'Number of lines in the cart at checkout.',
+        (1, 2, 3, 5, 8, 13, 21, 34, 55)),
+    'pos_write_batch_size': (
+        'histogram', 'Sales committed together by the checkout write pipeline.',
+        (1, 2, 4, 8, 16, 32, 64, 128)),
+    'pos_search_duration_seconds': (
+        'histogram', 'Product search latency by search backend.',
+        (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+    'pos_template_render_seconds': (
+        'histogram', 'Time spent rendering each page template.',
+        (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)),
+    'pos_db_pool_checkouts_total': (
+        'counter', 'Connections checked out of the database pool.', None),
+    'pos_db_pool_waits_total': (
+        'counter', 'Checkouts that found no idle pooled connection and had to wait or overflow.', None),
+    'pos_db_pool_connections_total': (
+        'counter', 'New database connections opened by the pool.', None),
+    'pos_db_pool_checked_out': (
+        'gauge', 'Connections currently checked out of the pool.', None),
+    'pos_cache_hits_total': (
+        'counter', 'Cache lookups served from the worker\'s cache, by cache.', None),
+    'pos_cache_misses_total': (
+        'counter', 'Cache lookups that had to refresh from the database, by cache.', None),
+    'pos_cache_hit_ratio': (
+        'gauge', 'Share of cache lookups served without a refresh, by cache.', None),
+}
+
+
+def _key(name, labels):
+    return json.dumps([name, sorted(labels.items())])
+
+
+class MetricsStore:
+    """In-process metric values for one worker, flushed to METRICS_DIR."""
+
+    def __init__(self, directory, flush_interval=1.0):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.counters = {}
+        self.histograms = {}
+        self.gauges = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+        self._last_flush = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def inc(self, name, value=1, **labels):
+        key = _key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        buckets = METRICS[name][2]
+        key = _key(name, labels)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def set_counter(self, name, value, **labels):
+        """Overwrite a counter with a running total kept by another component."""
+        with self._lock:
+            self.counters[_key(name, labels)] = value
+
+    def set_gauge(self, name, value, **labels):
+        with self._lock:
+            self.gauges[_key(name, labels)] = value
+
+    def add_collector(self, collector):
+        """Register a callable that sets values from another component right before a flush."""
+        self.collectors.append(collector)
+
+    def reset(self):
+        """Forget every value, e.g. those a forked worker inherited from the gunicorn master."""
+        with self._lock:
+            self.counters = {}
+            self.histograms = {}
+            self.gauges = {}
+        self._last_flush = 0.0
+
+    def _path(self, pid):
+        return os.path.join(self.directory, f'{pid}.json')
+
+    def flush(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_flush < self.flush_interval:
+            return
+        self._last_flush = now
+        for collector in self.collectors:
+            collector(self)
+        with self._lock:
+            data = json.dumps({
+                'counters': self.counters,
+                'histograms': self.histograms,
+                'gauges': self.gauges,
+            })
+        path = self._path(os.getpid())
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _worker_files(self):
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, filename)
+            try:
+                with open(path) as f:
+                    yield int(filename[:-5]), json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def collect(self):
+        """Merge every worker's file into one set of counters, histograms and gauges."""
+        self.flush(force=True)
+        counters, histograms, gauges = {}, {}, {}
+        for pid, data in self._worker_files():
+            for key, value in data['counters'].items():
+                counters[key] = counters.get(key, 0) + value
+            for key, value in data['histograms'].items():
+                merged = histograms.setdefault(key, {'buckets': [0] * len(value['buckets']), 'sum': 0.0, 'count': 0})
+                merged['buckets'] = [a + b for a, b in zip(merged['buckets'], value['buckets'])]
+                merged['sum'] += value['sum']
+                merged['count'] += value['count']
+            if _alive(pid):
+                for key, value in data['gauges'].items():
+                    gauges[key] = gauges.get(key, 0) + value
+        return counters, histograms, gauges
+
+    def render(self):
+        """The merged metrics in Prometheus text exposition format."""
+        counters, histograms, gauges = self.collect()
+        _add_hit_ratios(counters, gauges)
+        series = {}
+        for values in (counters, histograms, gauges):
+            for key, value in values.items():
+                name, labels = json.loads(key)
+                series.setdefault(name, []).append((labels, value))
+
+        lines = []
+        for name in sorted(series):
+            kind, help_text, buckets = METRICS[name]
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(series[name], key=lambda item: item[0]):
+                if kind != 'histogram':
+                    lines.append(f'{name}{_labels(labels)} {_number(value)}')
+                    continue
+                for bound, count in zip(buckets, value['buckets']):
+                    lines.append(f'{name}_bucket{_labels(labels, le=_number(bound))} {count}')
+                lines.append(f'{name}_bucket{_labels(labels, le="+Inf")} {value["count"]}')
+                lines.append(f'{name}_sum{_labels(labels)} {_number(value["sum"])}')
+                lines.append(f'{name}_count{_labels(labels)} {value["count"]}')
+        return '\n'.join(lines) + '\n'
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _add_hit_ratios(counters, gauges):
+    lookups = {}
+    for key, value in counters.items():
+        name, labels = json.loads(key)
+        if name in ('pos_cache_hits_total', 'pos_cache_misses_total'):
+            cache = dict(labels)['cache']
+            hits, total = lookups.get(cache, (0, 0))
+            lookups[cache] = (hits + (value if name == 'pos_cache_hits_total' else 0), total + value)
+    for cache, (hits, total) in lookups.items():
+        if total:
+            gauges[_key('pos_cache_hit_ratio', {'cache': cache})] = round(hits / total, 4)
+
+
+def _labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def get_metrics():
+    """Return this worker's metrics store, or None outside an app with metrics enabled."""
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('metrics')
+
+
+def _instrument_pool(store, engine):
+    pool = engine.pool
+
+    @event.listens_for(pool, 'connect')
+    def on_connect(dbapi_connection, connection_record):
+        store.inc('pos_db_pool_connections_total')
+
+    @event.listens_for(pool, 'checkout')
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        store.inc('pos_db_pool_checkouts_total')
+        size = getattr(pool, 'size', None)
+        if callable(size) and pool.checkedout() > size():
+            store.inc('pos_db_pool_waits_total')
+
+    def collect_pool(store):
+        checkedout = getattr(pool, 'checkedout', None)
+        if callable(checkedout):
+            store.set_gauge('pos_db_pool_checked_out', checkedout())
+
+    store.add_collector(collect_pool)
+
+
+def init_metrics(app):
+    """Collect request, checkout, search, pool and cache metrics and serve /metrics."""
+    app.config.setdefault('METRICS_DIR', os.environ.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics'))
+    app.config.setdefault('METRICS_FLUSH_INTERVAL', 1.0)
+    app.config.setdefault('METRICS_TOKEN', os.environ.get('METRICS_TOKEN'))
+    store = MetricsStore(app.config['METRICS_DIR'], app.config['METRICS_FLUSH_INTERVAL'])
+    app.extensions['metrics'] = store
+    atexit.register(store.flush, force=True)
+
+    with app.app_context():
+        from models import db
+        _instrument_pool(store, db.engine)
+
+    def collect_catalog(store):
+        catalog = app.extensions.get('catalog_cache')
+        if catalog is not None:
+            store.set_counter('pos_cache_hits_total', catalog.hits, cache='catalog')
+            store.set_counter('pos_cache_misses_total', catalog.misses, cache='catalog')
+
+    store.add_collector(collect_catalog)
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_started = time.perf_counter()
+
+    @app.after_request
+    def record_request_metrics(response):
+        started = g.pop('metrics_started', None)
+        if started is not None and request.endpoint != 'metrics':
+            endpoint = request.endpoint or 'unmatched'
+            store.observe('pos_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+            store.inc('pos_requests_total', endpoint=endpoint, status=str(response.status_code))
+            store.flush()
+        return response
+
+    @app.route('/metrics')
+    def metrics():
+        # Sales totals and latencies aren't public: scrapers need the token,
+        # people need a manager login
+        token = app.config['METRICS_TOKEN']
+        scraper = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+        manager = current_user.is_authenticated and current_user.role == 'manager'
+        if not (scraper or manager):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+        return Response(store.render(), mimetype='text/plain; version=0.0.4')
@@ -0,0 +1,24 @@
+"""Add audit log
+
+This migration adds the audit log table, which records one entry per bulk
+change to the product catalog.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        'audit_log',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('date', sa.DateTime, nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('action', sa.String(50), nullable=False),
+        sa.Column('affected', sa.Integer, nullable=False),
+        sa.Column('details', sa.Text)
+    )
+    op.create_index('ix_audit_log_date', 'audit_log', ['date'])
+
+def downgrade():
+    op.drop_index('ix_audit_log_date')
+    op.drop_table('audit_log')
@@ -0,0 +1,18 @@
+"""Add cache version counters
+
+This migration adds the table holding the version counters that workers use to
+invalidate their in-process caches (product catalog snapshot).
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        'cache_version',
+        sa.Column('name', sa.String(50), primary_key=True),
+        sa.Column('version', sa.Integer, nullable=False, server_default='0')
+    )
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,22 @@
+"""Add catalog change log
+
+This migration adds the table recording which products changed at each catalog
+version, so workers can refresh their catalog snapshot and barcode/SKU index
+incrementally instead of reloading every product.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        'catalog_change',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('version', sa.Integer, nullable=False),
+        sa.Column('product_id', sa.Integer, nullable=True)
+    )
+    op.create_index('ix_catalog_change_version', 'catalog_change', ['version'])
+
+def downgrade():
+    op.drop_index('ix_catalog_change_version')
+    op.drop_table('catalog_change')
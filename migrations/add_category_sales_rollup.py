@@ -0,0 +1,23 @@
+"""Add category sales rollup table
+
+This migration adds the per-day, per-category sales totals that the daily close
+reads to pre-fill the confectionery and tobacco lines. Populate it afterwards
+with `flask backfill-rollups`.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        'category_sales_rollup',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('bucket', sa.DateTime, nullable=False),
+        sa.Column('category', sa.String(50), nullable=False),
+        sa.Column('gross', sa.Float, nullable=False),
+        sa.Column('quantity', sa.Integer, nullable=False),
+        sa.UniqueConstraint('bucket', 'category', name='uq_category_sales_rollup_key')
+    )
+
+def downgrade():
+    op.drop_table('category_sales_rollup')
@@ -0,0 +1,32 @@
+"""Add low stock flag
+
+This migration adds the indexed low_stock flag and low_stock_since timestamp to
+products, so the dashboard's low stock list no longer scans every product
+comparing quantity with low_stock_threshold, and backfills them.
+"""
+
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.add_column('product', sa.Column('low_stock', sa.Boolean, nullable=False, server_default=sa.false()))
+    op.add_column('product', sa.Column('low_stock_since', sa.DateTime, nullable=True))
+    op.create_index('ix_product_low_stock', 'product', ['low_stock', 'low_stock_since'])
+
+    product = sa.table('product',
+                       sa.column('quantity', sa.Integer),
+                       sa.column('low_stock_threshold', sa.Integer),
+                       sa.column('low_stock', sa.Boolean),
+                       sa.column('low_stock_since', sa.DateTime))
+    is_low = product.c.quantity <= product.c.low_stock_threshold
+    op.execute(product.update().values(
+        low_stock=sa.case((is_low, True), else_=False),
+        low_stock_since=sa.case((is_low, datetime.utcnow()), else_=None)
+    ))
+
+def downgrade():
+    op.drop_index('ix_product_low_stock')
+    op.drop_column('product', 'low_stock_since')
+    op.drop_column('product', 'low_stock')
@@ -0,0 +1,27 @@
+"""Link returns to their original sale
+
+This migration adds original_transaction_id to transactions and
+returned_quantity/original_item_id to transaction items, so a sale's
+returnable quantity is read from its own lines. Returns recorded before this
+migration are not linked to their sale and are not counted in
+returned_quantity.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.add_column('transaction', sa.Column('original_transaction_id', sa.Integer,
+                                           sa.ForeignKey('transaction.id'), nullable=True))
+    op.create_index('ix_transaction_original_transaction_id', 'transaction', ['original_transaction_id'])
+    op.add_column('transaction_item', sa.Column('returned_quantity', sa.Integer, nullable=False, server_default='0'))
+    op.add_column('transaction_item', sa.Column('original_item_id', sa.Integer,
+                                                sa.ForeignKey('transaction_item.id'), nullable=True))
+    op.create_index('ix_transaction_item_original_item_id', 'transaction_item', ['original_item_id'])
+
+def downgrade():
+    op.drop_index('ix_transaction_item_original_item_id')
+    op.drop_column('transaction_item', 'original_item_id')
+    op.drop_column('transaction_item', 'returned_quantity')
+    op.drop_index('ix_transaction_original_transaction_id')
+    op.drop_column('transaction', 'original_transaction_id')
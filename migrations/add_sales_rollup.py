@@ -0,0 +1,29 @@
+"""Add sales rollup table
+
+This migration adds the hourly/daily sales rollups that reports and charts read
+instead of scanning every transaction. Populate it afterwards with
+`flask backfill-rollups`.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    op.create_table(
+        'sales_rollup',
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('granularity', sa.String(10), nullable=False),
+        sa.Column('bucket', sa.DateTime, nullable=False),
+        sa.Column('payment_method', sa.String(20), nullable=False),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'), nullable=False),
+        sa.Column('gross', sa.Float, nullable=False),
+        sa.Column('gst', sa.Float, nullable=False),
+        sa.Column('discounts', sa.Float, nullable=False),
+        sa.Column('transaction_count', sa.Integer, nullable=False),
+        sa.Column('return_amount', sa.Float, nullable=False),
+        sa.Column('return_count', sa.Integer, nullable=False),
+        sa.UniqueConstraint('granularity', 'bucket', 'payment_method', 'user_id', name='uq_sales_rollup_key')
+    )
+
+def downgrade():
+    op.drop_table('sales_rollup')
@@ -0,0 +1,13 @@
+"""Index transaction items by transaction
+
+This migration indexes transaction_item.transaction_id so item counts and item
+lookups for a transaction don't scan the whole item table.
+"""
+
+from alembic import op
+
+def upgrade():
+    op.create_index('ix_transaction_item_transaction_id', 'transaction_item', ['transaction_id'])
+
+def downgrade():
+    op.drop_index('ix_transaction_item_transaction_id')
@@ -0,0 +1,21 @@
+"""Backfill transaction.is_return and index the sales listing
+
+This migration sets is_return to false where it was never filled in, makes the
+column NOT NULL and indexes (is_return, date, id), so the sales listing's
+plain is_return = false filter keeps every sale and pages through the index.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+def upgrade():
+    transaction = sa.table('transaction', sa.column('is_return', sa.Boolean))
+    op.execute(transaction.update().where(transaction.c.is_return.is_(None)).values(is_return=False))
+    with op.batch_alter_table('transaction') as batch:
+        batch.alter_column('is_return', existing_type=sa.Boolean, nullable=False, server_default=sa.false())
+    op.create_index('ix_transaction_is_return_date', 'transaction', ['is_return', 'date', 'id'])
+
+def downgrade():
+    op.drop_index('ix_transaction_is_return_date')
+    with op.batch_alter_table('transaction') as batch:
+        batch.alter_column('is_return', existing_type=sa.Boolean, nullable=True, server_default=None)
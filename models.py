@@ -2,7 +2,9 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_login import UserMixin
 from datetime import datetime
 
-db = SQLAlchemy()
+from read_routing import RoutingSession
+
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model, UserMixin):
     id = db.Column(db.Integer, primary_key=True)
@@ -24,7 +26,14 @@ class Product(db.Model):
     sku = db.Column(db.String(50), unique=True, nullable=True)
     low_stock_threshold = db.Column(db.Integer, default=5)
     tax_exempt = db.Column(db.Boolean, default=False)
+    # Kept in step with quantity and low_stock_threshold by inventory.py, so the
+    # low stock list is an index lookup instead of a column-to-column scan
+    low_stock = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    low_stock_since = db.Column(db.DateTime, nullable=True)
     transaction_items = db.relationship('TransactionItem', backref='product', lazy=True)
+    __table_args__ = (
+        db.Index('ix_product_low_stock', 'low_stock', 'low_stock_since'),
+    )
     
     def __repr__(self):
         return f'<Product {self.name}>'
@@ -48,19 +57,29 @@ class Transaction(db.Model):
     discount_amount = db.Column(db.Float, default=0.0)
     gst_amount = db.Column(db.Float, default=0.0)
     gst_applied = db.Column(db.Boolean, default=True)
-    is_return = db.Column(db.Boolean, default=False)
+    is_return = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
+    # The sale a return transaction refunds
+    original_transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=True, index=True)
+    __table_args__ = (
+        # The sales listing pages through sales (not returns) newest first
+        db.Index('ix_transaction_is_return_date', 'is_return', 'date', 'id'),
+    )
     
     def __repr__(self):
         return f'<Transaction {self.id}>'
 
 class TransactionItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=True)
     quantity = db.Column(db.Integer, nullable=False)
     price_at_time_of_sale = db.Column(db.Float, nullable=False)
     custom_name = db.Column(db.String(100), nullable=True)
     is_custom_product = db.Column(db.Boolean, default=False)
+    # On sale lines: how many units have been returned so far (see returns.py)
+    returned_quantity = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # On return lines: the sale line being returned
+    original_item_id = db.Column(db.Integer, db.ForeignKey('transaction_item.id'), nullable=True, index=True)
     
     def __repr__(self):
         return f'<TransactionItem {self.id}>'
@@ -115,4 +134,81 @@ class CashTransaction(db.Model):
     created_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     
     def __repr__(self):
-        return f'<CashTransaction {self.id}>' 
\ No newline at end of file
+        return f'<CashTransaction {self.id}>'
+
+class SalesRollup(db.Model):
+    # Pre-aggregated sales per hour/day bucket, payment method and cashier,
+    # maintained in the same database transaction as checkout and returns
+    __table_args__ = (
+        db.UniqueConstraint('granularity', 'bucket', 'payment_method', 'user_id', name='uq_sales_rollup_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    granularity = db.Column(db.String(10), nullable=False)  # 'hour' or 'day'
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the hour/day
+    payment_method = db.Column(db.String(20), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    gross = db.Column(db.Float, nullable=False, default=0.0)
+    gst = db.Column(db.Float, nullable=False, default=0.0)
+    discounts = db.Column(db.Float, nullable=False, default=0.0)
+    transaction_count = db.Column(db.Integer, nullable=False, default=0)
+    return_amount = db.Column(db.Float, nullable=False, default=0.0)
+    return_count = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<SalesRollup {self.granularity} {self.bucket}>'
+
+class CategorySalesRollup(db.Model):
+    # Line totals per day and product category, maintained with SalesRollup so
+    # the daily close can split sales by category without scanning the day's items
+    __table_args__ = (
+        db.UniqueConstraint('bucket', 'category', name='uq_category_sales_rollup_key'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    bucket = db.Column(db.DateTime, nullable=False)  # Start of the day
+    category = db.Column(db.String(50), nullable=False)
+    gross = db.Column(db.Float, nullable=False, default=0.0)
+    quantity = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CategorySalesRollup {self.bucket} {self.category}>'
+
+class CacheVersion(db.Model):
+    # Monotonic counters bumped by writers so every worker can tell when its
+    # in-process caches are stale ('catalog', ...)
+    name = db.Column(db.String(50), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+class CatalogChange(db.Model):
+    # Which products changed at each catalog version, so workers can refresh
+    # their snapshot incrementally. A NULL product_id means "reload everything".
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, index=True)
+    product_id = db.Column(db.Integer, nullable=True)
+    
+    def __repr__(self):
+        return f'<CatalogChange {self.version}: {self.product_id}>'
+
+class AuditLog(db.Model):
+    # One entry per bulk change to the catalog: who ran it, what it matched
+    # and what it set (JSON in details)
+    id = db.Column(db.Integer, primary_key=True)
+    date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    user = db.relationship('User')
+    action = db.Column(db.String(50), nullable=False)
+    affected = db.Column(db.Integer, nullable=False, default=0)
+    details = db.Column(db.Text)
+    
+    def __repr__(self):
+        return f'<AuditLog {self.action} {self.date}>'
+
+def upsert(model):
+    """Return a dialect-specific INSERT supporting on_conflict_do_update()."""
+    if db.engine.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    return insert(model)
@@ -0,0 +1,69 @@
+"""
+Support for gunicorn's preload_app (see gunicorn.conf.py).
+
+With preloading the master process builds the app once and forks it into the
+workers, so they share its imported modules, compiled templates and product
+catalog snapshot copy-on-write instead of each building their own.
+warm_app() fills those in the master before the fork and then freezes the
+garbage collector, whose bookkeeping would otherwise touch (and so copy) every
+shared page in each worker.
+
+Database connections must never cross a fork: two processes talking over one
+socket corrupt each other's results. warm_app() closes the master's
+connections once it is done, and every forked child discards the pools it
+inherited, without closing the parent's sockets, and opens its own. The child
+also drops the metric values counted in the master.
+"""
+
+import gc
+import os
+import weakref
+
+from catalog_cache import get_catalog
+from models import db
+from read_routing import REPLICA_EXTENSION
+
+_apps = weakref.WeakSet()
+
+
+def _engines(app):
+    with app.app_context():
+        engines = list(db.engines.values())
+    replica = app.extensions.get(REPLICA_EXTENSION)
+    if replica is not None:
+        engines.append(replica)
+    return engines
+
+
+def _after_fork_in_child():
+    for app in list(_apps):
+        for engine in _engines(app):
+            engine.dispose(close=False)
+        metrics = app.extensions.get('metrics')
+        if metrics is not None:
+            metrics.reset()
+
+
+os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def init_preload(app):
+    """Reset the app's connection pools and metrics in every process forked from this one."""
+    _apps.add(app)
+
+
+def warm_app(app):
+    """
+    Get the app ready to be forked: load the catalog snapshot and compile every
+    template, then close the master's database connections.
+    """
+    with app.app_context():
+        get_catalog().warm()
+        for name in app.jinja_env.list_templates():
+            app.jinja_env.get_template(name)
+    metrics = app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.reset()
+    for engine in _engines(app):
+        engine.dispose()
+    gc.freeze()
@@ -0,0 +1,111 @@
+"""
+Per-request SQL instrumentation.
+
+Every statement run on the request's app context is counted and timed through
+SQLAlchemy's cursor events. At the end of the request the totals are sent back
+in a Server-Timing header (visible in the browser's network panel) and written
+as one JSON log line on the `pos.requests` logger.
+
+QUERY_BUDGETS maps endpoint names to the most queries they may issue. With
+QUERY_BUDGET_MODE = 'enforce' (the default under TESTING) a request that goes
+over budget raises QueryBudgetExceeded, so an N+1 that sneaks into checkout or
+a report fails the test run instead of shipping; 'warn' only logs it.
+"""
+
+import json
+import logging
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger('pos.requests')
+
+DEFAULT_QUERY_BUDGETS = {
+    'checkout': 12,
+    'new_transaction': 8,
+    'sales_report': 6,
+}
+
+
+class QueryBudgetExceeded(RuntimeError):
+    """Raised in enforce mode when an endpoint issues more queries than its budget."""
+
+    def __init__(self, endpoint, count, budget):
+        super().__init__(f'{endpoint} issued {count} SQL queries (budget {budget})')
+        self.endpoint = endpoint
+        self.count = count
+        self.budget = budget
+
+
+def _collecting():
+    return has_app_context() and 'query_count' in g
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _collecting():
+        conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get('query_started')
+    if not started:
+        return
+    elapsed = time.perf_counter() - started.pop()
+    if _collecting():
+        g.query_count += 1
+        g.query_time += elapsed
+
+
+def query_stats():
+    """Queries issued and seconds spent in the database so far in this request."""
+    if not _collecting():
+        return 0, 0.0
+    return g.query_count, g.query_time
+
+
+def init_query_stats(app):
+    """Start counting queries for each request of this app."""
+    app.config.setdefault('QUERY_BUDGETS', dict(DEFAULT_QUERY_BUDGETS))
+    app.config.setdefault('QUERY_BUDGET_MODE', 'enforce' if app.testing else 'warn')
+
+    @app.before_request
+    def start_query_stats():
+        g.query_count = 0
+        g.query_time = 0.0
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def report_query_stats(response):
+        if 'request_started' not in g:
+            return response
+        total_ms = (time.perf_counter() - g.request_started) * 1000
+        count, db_time = query_stats()
+        db_ms = db_time * 1000
+        response.headers.add(
+            'Server-Timing',
+            f'db;dur={db_ms:.1f};desc="{count} queries", app;dur={total_ms:.1f}'
+        )
+
+        endpoint = request.endpoint
+        budget = app.config['QUERY_BUDGETS'].get(endpoint)
+        over_budget = budget is not None and count > budget
+        logger.info(json.dumps({
+            'method': request.method,
+            'path': request.path,
+            'endpoint': endpoint,
+            'status': response.status_code,
+            'duration_ms': round(total_ms, 2),
+            'queries': count,
+            'db_ms': round(db_ms, 2),
+            'query_budget': budget,
+            'over_budget': over_budget,
+        }))
+        if over_budget:
+            if app.config['QUERY_BUDGET_MODE'] == 'enforce':
+                raise QueryBudgetExceeded(endpoint, count, budget)
+            logger.warning('%s issued %d SQL queries (budget %d)', endpoint, count, budget)
+        return response
@@ -0,0 +1,105 @@
+"""
+Read/write routing between the primary database and a read-only replica.
+
+Views decorated with @read_replica run their queries on the replica engine
+when one is configured; everything else, and anything that flushes, stays on
+the primary. READ_REPLICA_URI selects the replica:
+
+    READ_REPLICA_URI = 'postgresql://...'   # a streaming replica
+    READ_REPLICA_URI = 'sqlite-readonly'    # the primary SQLite file, opened
+                                            # read-only (best with WAL)
+
+Replicas can lag. For READ_YOUR_WRITES_SECONDS after a browser session
+commits a write, its reads stay on the primary so a manager who just edited
+something sees the change on the next report.
+"""
+
+import os
+import time
+from functools import wraps
+
+from flask import current_app, g, has_app_context, session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+
+REPLICA_EXTENSION = 'read_replica'
+
+
+class RoutingSession(Session):
+    """Session that sends reads from @read_replica views to the replica bind."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and _use_replica():
+            replica = current_app.extensions.get(REPLICA_EXTENSION)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _use_replica():
+    if not has_app_context() or not g.get('use_replica'):
+        return False
+    window = current_app.config['READ_YOUR_WRITES_SECONDS']
+    last_write = session.get('last_write_at')
+    return not (window and last_write and time.time() - last_write < window)
+
+
+def read_replica(view):
+    """Run a view's queries on the read replica (if one is configured)."""
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        g.use_replica = True
+        return view(*args, **kwargs)
+    return wrapped
+
+
+def _replica_uri(app):
+    uri = app.config.get('READ_REPLICA_URI') or os.environ.get('READ_REPLICA_URI')
+    if uri != 'sqlite-readonly':
+        return uri
+    url = make_url(app.config['SQLALCHEMY_DATABASE_URI'])
+    if url.get_backend_name() != 'sqlite' or url.database in (None, '', ':memory:'):
+        raise ValueError('READ_REPLICA_URI=sqlite-readonly needs a file-based SQLite primary')
+    path = url.database
+    if not os.path.isabs(path):
+        path = os.path.join(app.instance_path, path)
+    return f'sqlite:///file:{path}?mode=ro&uri=true'
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _note_flush(db_session, flush_context):
+    if has_app_context():
+        g.wrote = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _note_bulk_write(orm_execute_state):
+    # Bulk INSERT/UPDATE statements run through session.execute() skip the flush
+    if has_app_context() and (orm_execute_state.is_insert or orm_execute_state.is_update
+                              or orm_execute_state.is_delete):
+        g.wrote = True
+
+
+def init_read_routing(app):
+    """
+    Create the replica engine, if one is configured, and track writes for the
+    read-your-writes window.
+
+    Returns:
+        Engine: the replica engine, or None when reports read from the primary
+    """
+    app.config.setdefault('READ_YOUR_WRITES_SECONDS', 5)
+    replica = None
+    uri = _replica_uri(app)
+    if uri:
+        replica = create_engine(uri, **app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+        app.extensions[REPLICA_EXTENSION] = replica
+
+    @app.after_request
+    def remember_last_write(response):
+        if g.pop('wrote', False) and app.config['READ_YOUR_WRITES_SECONDS']:
+            session['last_write_at'] = time.time()
+        return response
+
+    return replica
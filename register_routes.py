@@ -0,0 +1,763 @@
+from flask import render_template, redirect, url_for, flash, session, request, jsonify
+from sqlalchemy.orm import contains_eager, joinedload, selectinload
+from flask_login import login_required, current_user
+import uuid
+
+from models import db, Product, Transaction, TransactionItem, QuickAccessProduct
+from cart_store import get_cart, cart_key, cart_totals
+from catalog_cache import get_catalog
+from search_index import full_text_search
+from write_pipeline import commit_sale, pending_sale, Sale, SalePending
+from metrics import get_metrics
+from returns import returnable_lines, return_items
+from forms import TransactionItemForm, PaymentForm, ReturnForm, QuickAddForm, ProductSearchForm, CustomProductForm
+
+
+def flash_shortages(shortages, cart):
+    names = {item['product_id']: item['name'] for item in cart}
+    for shortage in shortages:
+        flash(f"Only {shortage.available} {names.get(shortage.product_id, 'units')} "
+              f"available in stock (requested {shortage.requested})", 'danger')
+
+
+def init_register_routes(app):
+    """Register routes: the transaction screen, cart, checkout and returns."""
+
+    # Transaction routes
+    @app.route('/transactions/new', methods=['GET', 'POST'])
+    @login_required
+    def new_transaction():
+        cart = get_cart()
+        
+        # Loaded from inside the template's cached quick access grid, so the
+        # query only runs when the grid has to be re-rendered
+        def quick_access_grid():
+            # Get quick access products with a single query using join
+            quick_access_products = (QuickAccessProduct.query
+                .join(Product)
+                .options(contains_eager(QuickAccessProduct.product))
+                .filter(Product.quantity > 0)
+                .order_by(QuickAccessProduct.position)
+                .all())
+        
+            # Create a list of quick access positions with products
+            quick_access_list = []
+            current_position = 1
+            for qap in quick_access_products:
+                # Fill in any missing positions
+                while current_position < qap.position:
+                    quick_access_list.append({
+                        'position': current_position,
+                        'product': None
+                    })
+                    current_position += 1
+            
+                quick_access_list.append({
+                    'position': qap.position,
+                    'product': qap.product
+                })
+                current_position = qap.position + 1
+        
+            # Fill remaining positions up to 10
+            while current_position <= 10:
+                quick_access_list.append({
+                    'position': current_position,
+                    'product': None
+                })
+                current_position += 1
+            
+            return quick_access_list
+        
+        # Initialize form; the product choices are only needed to validate a post
+        form = TransactionItemForm()
+        if request.method == 'POST':
+            form.product_id.choices = [(p.id, f"{p.name} - ${p.price:.2f} ({p.quantity} in stock)") 
+                                     for p in get_catalog().in_stock()]
+        
+        if form.validate_on_submit():
+            product = Product.query.get(form.product_id.data)
+            if product:
+                # Get price (use custom price if provided)
+                price = form.custom_price.data if form.custom_price.data else product.price
+                
+                # Update existing cart item or add new one
+                item = cart.get(product.id)
+                if item:
+                    item['quantity'] += form.quantity.data
+                    if form.custom_price.data:
+                        item['price'] = price
+                    cart.put(item)
+                    flash(f'Updated quantity for {product.name}', 'success')
+                else:
+                    cart.put({
+                        'product_id': product.id,
+                        'name': product.name,
+                        'price': price,
+                        'quantity': form.quantity.data,
+                        'is_custom_price': bool(form.custom_price.data)
+                    })
+                    flash(f'Added {product.name} to cart', 'success')
+                
+                return redirect(url_for('new_transaction'))
+        
+        cart = cart.lines()
+        
+        # Calculate subtotal first
+        subtotal = sum(item['price'] * item['quantity'] for item in cart)
+        
+        # Calculate GST (13% of subtotal)
+        gst_amount = round(subtotal * 0.13, 2)
+        
+        # Calculate total after GST
+        total = subtotal
+        
+        # Get last transaction for history display
+        last_transaction = None
+        if 'last_transaction_id' in session and not cart:
+            # The panel lists every line with its product; load them up front
+            last_transaction = (Transaction.query
+                .options(selectinload(Transaction.items).joinedload(TransactionItem.product))
+                .filter_by(id=session['last_transaction_id'])
+                .first())
+        
+        search_form = ProductSearchForm()
+        
+        return render_template('new_transaction.html',
+                             form=form,
+                             cart=cart,
+                             subtotal=subtotal,
+                             total=total,
+                             gst_amount=gst_amount,
+                             search_form=search_form,
+                             quick_access_products=quick_access_grid,
+                             last_transaction=last_transaction)
+
+    @app.route('/transactions/quick_add', methods=['GET', 'POST'])
+    @login_required
+    def quick_add():
+        # Redirect to the new combined product search page
+        return redirect(url_for('search_products'))
+
+    @app.route('/update_quantity/<product_id>', methods=['POST'])
+    @login_required
+    def update_quantity(product_id):
+        cart = get_cart()
+        product_id = cart_key(product_id)
+        quantity = int(request.form.get('quantity', 1))
+        
+        # Custom products are not in the inventory, so only check real ones
+        product = None
+        if isinstance(product_id, int):
+            product = Product.query.get(product_id)
+            if not product:
+                flash('Product not found', 'danger')
+                return redirect(url_for('new_transaction'))
+            
+        if quantity <= 0:
+            # Remove item from cart if quantity is 0 or negative
+            cart.remove(product_id)
+            flash('Item removed from cart', 'success')
+        else:
+            # Check if quantity is available in stock
+            if product and quantity > product.quantity:
+                flash(f'Only {product.quantity} available in stock', 'danger')
+                return redirect(url_for('new_transaction'))
+                
+            # Update quantity
+            item = cart.get(product_id)
+            if item:
+                item['quantity'] = quantity
+                cart.put(item)
+                flash('Quantity updated', 'success')
+        
+        return redirect(url_for('new_transaction'))
+    
+    @app.route('/update_price/<product_id>', methods=['POST'])
+    @login_required
+    def update_price(product_id):
+        product_id = cart_key(product_id)
+        new_price = float(request.form.get('price', 0))
+        if new_price < 0:
+            flash('Price cannot be negative', 'danger')
+            return redirect(url_for('new_transaction'))
+        
+        cart = get_cart()
+        item = cart.get(product_id)
+        if item:
+            # Store the original price if this is the first price override
+            if not item.get('is_custom_price', False):
+                item['original_price'] = item['price']
+            
+            item['price'] = new_price
+            item['is_custom_price'] = True
+            cart.put(item)
+            flash('Price updated', 'success')
+        
+        return redirect(url_for('new_transaction'))
+
+    @app.route('/transactions/clear_cart', methods=['GET'])
+    @login_required
+    def confirm_clear_cart():
+        return render_template('confirm_clear_cart.html')
+
+    @app.route('/transactions/clear_cart', methods=['POST'])
+    @login_required
+    def clear_cart():
+        get_cart().clear()
+        flash('Cart cleared', 'success')
+        return redirect(url_for('new_transaction'))
+
+    @app.route('/products/search', methods=['GET', 'POST'])
+    @login_required
+    def search_products():
+        form = ProductSearchForm()
+        quick_add_form = QuickAddForm()
+        products = []
+        
+        # Handle product search form submission
+        if form.validate_on_submit() or request.args.get('search_term'):
+            search_term = form.search_term.data or request.args.get('search_term', '')
+            # Relevance-ranked prefix search through the full-text index
+            products = full_text_search(search_term, limit=100)
+        
+        # Handle quick add form submission
+        if quick_add_form.validate_on_submit():
+            product_code = quick_add_form.product_code.data
+            quantity = quick_add_form.quantity.data
+            
+            # Resolve the code from the in-memory barcode/SKU index
+            product = get_catalog().lookup(product_code)
+            
+            if product:
+                cart = get_cart()
+                
+                # Update existing cart item or add new one
+                item = cart.get(product.id)
+                if item:
+                    item['quantity'] += quantity
+                    cart.put(item)
+                    flash(f'Updated quantity for {product.name}', 'success')
+                else:
+                    cart.put({
+                        'product_id': product.id,
+                        'name': product.name,
+                        'price': product.price,
+                        'quantity': quantity
+                    })
+                    flash(f'Added {product.name} to cart', 'success')
+                
+                return redirect(url_for('search_products'))
+        
+        cart = get_cart().lines()
+        total = sum(item['price'] * item['quantity'] for item in cart)
+            
+        return render_template('product_search.html',
+                             form=form,
+                             quick_add_form=quick_add_form,
+                             products=products,
+                             cart=cart,
+                             total=total)
+
+    @app.route('/api/products/search', methods=['GET'])
+    @login_required
+    def api_search_products():
+        search_term = request.args.get('term', '')
+        if len(search_term) < 2:
+            return jsonify([])
+            
+        products = full_text_search(search_term, limit=10)
+        
+        results = [{'id': p.id, 'text': f"{p.name} - ${p.price:.2f} ({p.quantity} in stock)"} for p in products]
+        return jsonify(results)
+
+    @app.route('/api/scan', methods=['POST'])
+    @login_required
+    def api_scan():
+        """
+        Resolve a burst of scanned barcodes/SKUs in one call.
+        
+        Accepts {"codes": [...], "add_to_cart": false}. Codes are resolved from
+        the in-memory index; with add_to_cart, every resolved code adds one unit
+        (repeated codes add several) to the current cart.
+        """
+        data = request.get_json(silent=True) or {}
+        codes = data.get('codes')
+        if not isinstance(codes, list) or not codes:
+            return jsonify({'error': 'Expected a non-empty list of codes'}), 400
+        codes = [str(code).strip() for code in codes]
+            
+        products = get_catalog().lookup_many(codes)
+        results = [{
+            'code': code,
+            'product': {
+                'id': product.id,
+                'name': product.name,
+                'price': product.price,
+                'quantity': product.quantity,
+                'sku': product.sku,
+                'barcode': product.barcode
+            } if product else None
+        } for code, product in zip(codes, products)]
+        response = {
+            'results': results,
+            'not_found': [code for code, product in zip(codes, products) if not product]
+        }
+        
+        if data.get('add_to_cart'):
+            scanned = {}
+            for product in products:
+                if product:
+                    scanned[product.id] = scanned.get(product.id, 0) + 1
+                    
+            cart = get_cart()
+            lines = []
+            errors = []
+            for product_id, quantity in scanned.items():
+                product = get_catalog().get(product_id)
+                item = cart.get(product_id)
+                new_quantity = quantity + (item['quantity'] if item else 0)
+                if new_quantity > product.quantity:
+                    errors.append(f'Only {product.quantity} {product.name} available in stock')
+                    continue
+                if item:
+                    item['quantity'] = new_quantity
+                else:
+                    item = {
+                        'product_id': product.id,
+                        'name': product.name,
+                        'price': product.price,
+                        'quantity': quantity
+                    }
+                cart.put(item)
+                lines.append(dict(item, line_total=round(item['price'] * item['quantity'], 2)))
+            response.update(lines=lines, errors=errors, totals=cart_totals(cart.lines()))
+            
+        return jsonify(response)
+
+    @app.route('/api/cache/stats')
+    @login_required
+    def api_cache_stats():
+        if current_user.role != 'manager':
+            return jsonify({'error': 'Access denied'}), 403
+        return jsonify({'catalog': get_catalog().stats()})
+
+    @app.route('/products/add_to_cart/<int:product_id>', methods=['POST'])
+    @login_required
+    def add_to_cart_from_search(product_id):
+        product = Product.query.get_or_404(product_id)
+        
+        if product.quantity <= 0:
+            flash('Product is out of stock', 'danger')
+            return redirect(url_for('search_products'))
+            
+        cart = get_cart()
+        
+        # Check if product already in cart
+        item = cart.get(product.id)
+        if item:
+            item['quantity'] += 1
+            cart.put(item)
+            flash(f'Updated quantity for {product.name}', 'success')
+            return redirect(url_for('search_products'))
+        
+        cart.put({
+            'product_id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'quantity': 1
+        })
+        flash(f'Added {product.name} to cart', 'success')
+        return redirect(url_for('search_products'))
+
+    @app.route('/transactions/remove/<product_id>', methods=['POST'])
+    @login_required
+    def remove_from_cart(product_id):
+        get_cart().remove(cart_key(product_id))
+        flash('Item removed from cart', 'success')
+        return redirect(url_for('new_transaction'))
+
+    # JSON cart API used by the register page to update the cart in place
+    def cart_json(cart, line=None, removed=None):
+        if line:
+            line = dict(line, line_total=round(line['price'] * line['quantity'], 2))
+        return jsonify({
+            'line': line,
+            'removed': removed,
+            'totals': cart_totals(cart.lines())
+        })
+
+    def cart_request_data():
+        return request.get_json(silent=True) or request.form
+
+    @app.route('/api/cart/add', methods=['POST'])
+    @login_required
+    def api_cart_add():
+        data = cart_request_data()
+        try:
+            product_id = int(data.get('product_id'))
+            quantity = int(data.get('quantity', 1))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid product or quantity'}), 400
+        if quantity < 1:
+            return jsonify({'error': 'Quantity must be at least 1'}), 400
+            
+        product = Product.query.get(product_id)
+        if not product:
+            return jsonify({'error': 'Product not found'}), 404
+            
+        cart = get_cart()
+        item = cart.get(product_id)
+        new_quantity = quantity + (item['quantity'] if item else 0)
+        if new_quantity > product.quantity:
+            return jsonify({'error': f'Only {product.quantity} {product.name} available in stock'}), 409
+            
+        if item:
+            item['quantity'] = new_quantity
+        else:
+            item = {
+                'product_id': product.id,
+                'name': product.name,
+                'price': product.price,
+                'quantity': quantity
+            }
+        cart.put(item)
+        return cart_json(cart, line=item)
+
+    @app.route('/api/cart/quantity', methods=['POST'])
+    @login_required
+    def api_cart_quantity():
+        data = cart_request_data()
+        product_id = cart_key(data.get('product_id', ''))
+        try:
+            quantity = int(data.get('quantity'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid quantity'}), 400
+            
+        cart = get_cart()
+        item = cart.get(product_id)
+        if not item:
+            return jsonify({'error': 'Item is not in the cart'}), 404
+            
+        if quantity <= 0:
+            cart.remove(product_id)
+            return cart_json(cart, removed=product_id)
+            
+        # Custom products are not in the inventory, so only check real ones
+        if not item.get('is_custom_product'):
+            product = Product.query.get(product_id)
+            if not product:
+                return jsonify({'error': 'Product not found'}), 404
+            if quantity > product.quantity:
+                return jsonify({'error': f'Only {product.quantity} available in stock'}), 409
+                
+        item['quantity'] = quantity
+        cart.put(item)
+        return cart_json(cart, line=item)
+
+    @app.route('/api/cart/price', methods=['POST'])
+    @login_required
+    def api_cart_price():
+        data = cart_request_data()
+        product_id = cart_key(data.get('product_id', ''))
+        try:
+            new_price = float(data.get('price'))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Invalid price'}), 400
+        if new_price < 0:
+            return jsonify({'error': 'Price cannot be negative'}), 400
+            
+        cart = get_cart()
+        item = cart.get(product_id)
+        if not item:
+            return jsonify({'error': 'Item is not in the cart'}), 404
+            
+        # Store the original price if this is the first price override
+        if not item.get('is_custom_price', False):
+            item['original_price'] = item['price']
+        item['price'] = new_price
+        item['is_custom_price'] = True
+        cart.put(item)
+        return cart_json(cart, line=item)
+
+    @app.route('/api/cart/remove', methods=['POST'])
+    @login_required
+    def api_cart_remove():
+        product_id = cart_key(cart_request_data().get('product_id', ''))
+        cart = get_cart()
+        cart.remove(product_id)
+        return cart_json(cart, removed=product_id)
+
+    @app.route('/api/cart/totals', methods=['GET'])
+    @login_required
+    def api_cart_totals():
+        return cart_json(get_cart())
+
+    @app.route('/transactions/checkout', methods=['GET', 'POST'])
+    @login_required
+    def checkout():
+        # Don't ring the cart up again while its last checkout may still commit
+        if session.get('pending_sale'):
+            return redirect(url_for('check_pending_sale'))
+
+        current_cart = get_cart()
+        cart = current_cart.lines()
+        if not cart:
+            flash('Your cart is empty. Add products before checkout.', 'warning')
+            return redirect(url_for('new_transaction'))
+        
+        form = PaymentForm()
+        
+        # Calculate totals including GST
+        subtotal = sum(item['price'] * item['quantity'] for item in cart)
+        gst_amount = round(subtotal * 0.13, 2)
+        total_amount = round(subtotal + gst_amount, 2)
+        
+        if form.validate_on_submit():
+            payment_method = form.payment_method.data
+            amount_tendered = form.amount_tendered.data
+            discount_amount = form.discount_amount.data or 0
+            
+            # Apply discount after GST
+            final_total = round(total_amount - discount_amount, 2)
+            
+            if amount_tendered < final_total:
+                flash('Amount tendered must be at least equal to the total amount.', 'danger')
+                return render_template('checkout.html', 
+                                    cart=cart, 
+                                    form=form, 
+                                    subtotal=subtotal, 
+                                    gst_amount=gst_amount,
+                                    total=total_amount)
+            
+            # Column values for the transaction row
+            transaction_fields = dict(
+                total_amount=final_total,
+                payment_method=payment_method,
+                user_id=current_user.id,
+                discount_amount=discount_amount,
+                gst_amount=gst_amount,
+                gst_applied=True
+            )
+            
+            # Prepare all items in memory
+            transaction_items = []
+            stock_lines = []
+            
+            for item in cart:
+                transaction_items.append(dict(
+                    product_id=item['product_id'] if not item.get('is_custom_product') else None,
+                    quantity=item['quantity'],
+                    price_at_time_of_sale=item['price'],
+                    custom_name=item.get('name') if item.get('is_custom_product') else None,
+                    is_custom_product=item.get('is_custom_product', False)
+                ))
+                
+                # Custom products don't affect inventory
+                if not item.get('is_custom_product'):
+                    stock_lines.append((item['product_id'], item['quantity']))
+            
+            # Perform all database operations in a single transaction
+            try:
+                # Reserves stock with one conditional update, writes the sale
+                # and commits, either directly or batched with other registers
+                result = commit_sale(Sale(transaction_fields, transaction_items, stock_lines))
+                if result.shortages:
+                    get_metrics().inc('pos_checkout_failures_total', reason='out_of_stock')
+                    flash_shortages(result.shortages, cart)
+                    return redirect(url_for('new_transaction'))
+                
+                transaction_id = result.transaction_id
+                
+                # Store the transaction ID and clear cart only after successful commit
+                session['last_transaction_id'] = transaction_id
+                current_cart.clear()
+                
+                metrics = get_metrics()
+                metrics.inc('pos_checkouts_total', payment_method=payment_method)
+                metrics.inc('pos_checkout_amount_total', final_total)
+                metrics.observe('pos_cart_lines', len(cart))
+                
+                # Load the receipt with its cashier, lines and products up front
+                transaction = (Transaction.query
+                    .options(joinedload(Transaction.user),
+                             selectinload(Transaction.items).joinedload(TransactionItem.product))
+                    .populate_existing()
+                    .get(transaction_id))
+                
+                # Calculate change
+                change = amount_tendered - final_total
+                
+                return render_template('receipt.html', 
+                                    transaction=transaction, 
+                                    payment_method=payment_method,
+                                    amount_tendered=amount_tendered,
+                                    change=change)
+
+            except SalePending as pending:
+                # The writer is still on it; the cart stays until we know the outcome
+                session['pending_sale'] = pending.token
+                get_metrics().inc('pos_checkouts_pending_total')
+                return redirect(url_for('check_pending_sale'))
+                                    
+            except Exception as e:
+                db.session.rollback()
+                app.logger.exception('Checkout failed')
+                get_metrics().inc('pos_checkout_failures_total', reason='error')
+                flash('An error occurred while processing the transaction. Please try again.', 'danger')
+                return redirect(url_for('checkout'))
+        
+        return render_template('checkout.html', 
+                             cart=cart, 
+                             form=form, 
+                             subtotal=subtotal,
+                             gst_amount=gst_amount,
+                             total=total_amount)
+
+    @app.route('/transactions/pending')
+    @login_required
+    def check_pending_sale():
+        token = session.get('pending_sale')
+        if not token:
+            return redirect(url_for('new_transaction'))
+        try:
+            done, result = pending_sale(token)
+        except Exception:
+            session.pop('pending_sale', None)
+            app.logger.exception('Pending checkout failed')
+            get_metrics().inc('pos_checkout_failures_total', reason='error')
+            flash('The sale could not be recorded. Please check out again.', 'danger')
+            return redirect(url_for('checkout'))
+        if not done:
+            return render_template('sale_pending.html')
+
+        session.pop('pending_sale', None)
+        if result is None:
+            flash('This register could not confirm whether the last sale was recorded. '
+                  'Check recent transactions before checking the cart out again.', 'warning')
+            return redirect(url_for('new_transaction'))
+        if result.shortages:
+            get_metrics().inc('pos_checkout_failures_total', reason='out_of_stock')
+            flash_shortages(result.shortages, get_cart().lines())
+            return redirect(url_for('new_transaction'))
+
+        session['last_transaction_id'] = result.transaction_id
+        get_cart().clear()
+        transaction = db.session.get(Transaction, result.transaction_id)
+        metrics = get_metrics()
+        metrics.inc('pos_checkouts_total', payment_method=transaction.payment_method)
+        metrics.inc('pos_checkout_amount_total', transaction.total_amount)
+        flash(f'Transaction #{transaction.id} was recorded.', 'success')
+        return redirect(url_for('new_transaction'))
+
+    # Returns routes
+    @app.route('/returns', methods=['GET', 'POST'])
+    @login_required
+    def returns():
+        form = ReturnForm()
+        if form.validate_on_submit():
+            transaction = Transaction.query.get(form.transaction_id.data)
+            if not transaction:
+                flash('Transaction not found', 'danger')
+                return redirect(url_for('returns'))
+            return redirect(url_for('process_return', transaction_id=transaction.id))
+        return render_template('returns.html', form=form)
+
+    @app.route('/returns/<int:transaction_id>', methods=['GET', 'POST'])
+    @login_required
+    def process_return(transaction_id):
+        transaction = Transaction.query.get_or_404(transaction_id)
+        if transaction.is_return:
+            flash(f'Transaction #{transaction.id} is itself a return', 'danger')
+            return redirect(url_for('returns'))
+        
+        lines = returnable_lines(transaction.id)
+        
+        if request.method == 'POST':
+            # Collect the requested quantities per sale line
+            requested = {}
+            for line in lines:
+                try:
+                    return_quantity = int(request.form.get(f'return_quantity_{line.item_id}', 0))
+                except ValueError:
+                    return_quantity = 0
+                if return_quantity > 0:
+                    if return_quantity > line.returnable:
+                        flash(f'Only {line.returnable} of {line.name} can still be returned', 'danger')
+                        return redirect(url_for('process_return', transaction_id=transaction.id))
+                    requested[line.item_id] = return_quantity
+            
+            if not requested:
+                flash('No items selected for return', 'danger')
+                return redirect(url_for('process_return', transaction_id=transaction.id))
+            
+            # Marks the lines returned, writes the return and restocks in bulk
+            result = return_items(transaction, requested, current_user.id)
+            if result.rejected:
+                db.session.rollback()
+                names = {line.item_id: line.name for line in lines}
+                for line in result.rejected:
+                    flash(f'Only {line.returnable} of {names.get(line.item_id, "this item")} '
+                          f'can still be returned (requested {line.requested})', 'danger')
+                return redirect(url_for('process_return', transaction_id=transaction.id))
+            db.session.commit()
+            
+            flash('Return processed successfully', 'success')
+            return redirect(url_for('dashboard'))
+        
+        return render_template('process_return.html', transaction=transaction, lines=lines)
+
+    @app.route('/quick_access/add_to_cart/<int:product_id>', methods=['POST'])
+    @login_required
+    def add_to_cart_from_quick_access(product_id):
+        product = Product.query.get_or_404(product_id)
+        
+        if product.quantity <= 0:
+            flash(f'Sorry, {product.name} is out of stock.', 'danger')
+            return redirect(url_for('new_transaction'))
+            
+        cart = get_cart()
+        
+        # Check if product already in cart
+        item = cart.get(product.id)
+        if item:
+            item['quantity'] += 1  # Add one by default
+            cart.put(item)
+            flash(f'Updated quantity for {product.name}', 'success')
+            return redirect(url_for('new_transaction'))
+        
+        cart.put({
+            'product_id': product.id,
+            'name': product.name,
+            'price': product.price,
+            'quantity': 1  # Add one by default
+        })
+        flash(f'Added {product.name} to cart', 'success')
+        return redirect(url_for('new_transaction'))
+
+    @app.route('/transactions/custom_product', methods=['GET', 'POST'])
+    @login_required
+    def add_custom_product():
+        form = CustomProductForm()
+        
+        if form.validate_on_submit():
+            name = form.name.data
+            price = form.price.data
+            quantity = form.quantity.data
+            
+            cart = get_cart()
+            
+            # Generate a unique ID for the custom product
+            custom_id = f"custom_{uuid.uuid4().hex[:8]}"
+            
+            cart.put({
+                'product_id': custom_id,
+                'name': name,
+                'price': price,
+                'quantity': quantity,
+                'is_custom_product': True
+            })
+            
+            flash(f'Added custom product: {name} to cart', 'success')
+            return redirect(url_for('new_transaction'))
+        
+        return render_template('custom_product.html', form=form)
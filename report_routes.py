@@ -0,0 +1,288 @@
+from flask import render_template, redirect, url_for, flash, request, jsonify, Response, stream_with_context
+from flask_login import login_required, current_user
+from datetime import datetime, timedelta
+
+from rollups import sales_totals, sales_series
+from sales_listing import sales_page, iter_sales_csv
+from inventory_listing import inventory_filters, inventory_page, page_count, product_categories, stock_status
+from read_routing import read_replica
+from engine_profiles import no_request_timeouts
+from inventory import low_stock_products
+
+
+def init_report_routes(app):
+    """Sales and inventory report routes."""
+
+    # Reporting routes
+    @app.route('/reports')
+    @login_required
+    def reports():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+        return render_template('reports.html')
+
+    @app.route('/reports/sales')
+    @login_required
+    @read_replica
+    def sales_report():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        # Get period from query parameter, default to 'all'
+        period = request.args.get('period', 'all')
+        
+        start_date, end_date = get_period_range(period)
+        
+        # One page of lightweight transaction rows, newest first
+        cursor = request.args.get('cursor')
+        transactions, next_cursor = sales_page(start_date, end_date, cursor=cursor,
+                                               limit=app.config['REPORT_PAGE_SIZE'])
+        
+        # Calculate totals from the daily rollups
+        total_sales, transaction_count = sales_totals(start_date, end_date)
+        avg_transaction = total_sales / transaction_count if transaction_count else 0
+        
+        return render_template(
+            'sales_report.html', 
+            transactions=transactions, 
+            transaction_count=transaction_count,
+            cursor=cursor,
+            next_cursor=next_cursor,
+            total_sales=total_sales,
+            avg_transaction=avg_transaction,
+            period=period,
+            start_date=start_date,
+            end_date=end_date
+        )
+    
+    @app.route('/api/reports/sales')
+    @login_required
+    @read_replica
+    def api_sales_report():
+        if current_user.role != 'manager':
+            return jsonify({'error': 'Access denied'}), 403
+            
+        period = request.args.get('period', 'all')
+        start_date, end_date = get_period_range(period)
+        limit = min(request.args.get('limit', app.config['REPORT_PAGE_SIZE'], type=int), 500)
+        transactions, next_cursor = sales_page(start_date, end_date,
+                                               cursor=request.args.get('cursor'), limit=max(limit, 1))
+        
+        # Format data for API response
+        transaction_data = [{
+            'id': t.id,
+            'date': t.date.strftime('%Y-%m-%d %H:%M:%S'),
+            'cashier': t.cashier,
+            'items_count': t.items_count,
+            'payment_method': t.payment_method,
+            'discount': t.discount_amount,
+            'total': t.total_amount
+        } for t in transactions]
+        
+        total_sales, transaction_count = sales_totals(start_date, end_date)
+        avg_transaction = total_sales / transaction_count if transaction_count else 0
+        
+        return jsonify({
+            'transactions': transaction_data,
+            'next_cursor': next_cursor,
+            'total_sales': total_sales,
+            'transaction_count': transaction_count,
+            'avg_transaction': avg_transaction,
+            'period': period,
+            'start_date': start_date.strftime('%Y-%m-%d') if start_date else None,
+            'end_date': end_date.strftime('%Y-%m-%d') if end_date else None
+        })
+    
+    @app.route('/api/reports/sales/chart-data')
+    @login_required
+    @read_replica
+    def api_sales_chart_data():
+        if current_user.role != 'manager':
+            return jsonify({'error': 'Access denied'}), 403
+            
+        period = request.args.get('period', 'all')
+        start_date, end_date = get_period_range(period)
+        
+        # Group data by date for charting, reading the rollups instead of transactions
+        if period == 'daily':
+            # Group by hour
+            granularity, label_format = 'hour', '%H:00'
+        elif period == 'weekly':
+            # Group by day of week
+            granularity, label_format = 'day', '%a'  # Mon, Tue, etc.
+        elif period == 'monthly':
+            # Group by day of month
+            granularity, label_format = 'day', '%d'  # 01, 02, etc.
+        elif period == 'yearly':
+            # Group by month
+            granularity, label_format = 'day', '%b'  # Jan, Feb, etc.
+        else:
+            # Group by month-year for all time or custom
+            granularity, label_format = 'day', '%b %Y'
+        
+        chart_data = {}
+        for bucket, gross in sales_series(granularity, start_date, end_date):
+            label = bucket.strftime(label_format)
+            chart_data[label] = chart_data.get(label, 0) + gross
+        
+        # Convert to lists for Chart.js
+        labels = list(chart_data.keys())
+        values = list(chart_data.values())
+        
+        return jsonify({
+            'labels': labels,
+            'values': values
+        })
+    
+    def get_period_range(period):
+        """
+        Get the date range covered by a report period.
+        
+        Args:
+            period (str): One of 'daily', 'weekly', 'monthly', 'yearly', 'all', 
+                          or 'custom:YYYY-MM-DD:YYYY-MM-DD' for custom date range
+        
+        Returns:
+            tuple: (start_date, end_date), both None for all time
+        """
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start_date = None
+        end_date = None
+        
+        if period == 'daily':
+            # Today's transactions
+            start_date = today
+            end_date = today + timedelta(days=1) - timedelta(microseconds=1)
+        elif period == 'weekly':
+            # This week's transactions (starting Monday)
+            start_date = today - timedelta(days=today.weekday())
+            end_date = start_date + timedelta(days=7) - timedelta(microseconds=1)
+        elif period == 'monthly':
+            # This month's transactions
+            start_date = today.replace(day=1)
+            if start_date.month == 12:
+                end_date = start_date.replace(year=start_date.year + 1, month=1) - timedelta(microseconds=1)
+            else:
+                end_date = start_date.replace(month=start_date.month + 1) - timedelta(microseconds=1)
+        elif period == 'yearly':
+            # This year's transactions
+            start_date = today.replace(month=1, day=1)
+            end_date = start_date.replace(year=start_date.year + 1) - timedelta(microseconds=1)
+        elif period.startswith('custom:'):
+            # Custom date range: custom:YYYY-MM-DD:YYYY-MM-DD
+            try:
+                dates = period.split(':')
+                start_date = datetime.strptime(dates[1], '%Y-%m-%d')
+                end_date = datetime.strptime(dates[2], '%Y-%m-%d') + timedelta(days=1) - timedelta(microseconds=1)
+            except (IndexError, ValueError):
+                # If custom format is invalid, default to all transactions
+                pass
+        
+        return start_date, end_date
+    
+    @app.route('/reports/inventory')
+    @login_required
+    @read_replica
+    def inventory_report():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        filters = inventory_filters(request.args)
+        products, summary = inventory_page(filters)
+        return render_template('inventory_report.html',
+                             products=products,
+                             summary=summary,
+                             filters=filters,
+                             pages=page_count(summary, filters),
+                             categories=product_categories())
+
+    @app.route('/api/reports/inventory')
+    @login_required
+    @read_replica
+    def api_inventory_report():
+        if current_user.role != 'manager':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        filters = inventory_filters(request.args)
+        products, summary = inventory_page(filters)
+        return jsonify({
+            'products': [dict(product._asdict(), status=stock_status(product)) for product in products],
+            'summary': summary._asdict(),
+            'page': filters['page'],
+            'per_page': filters['per_page'],
+            'pages': page_count(summary, filters),
+            'sort': filters['sort'],
+            'dir': filters['direction'],
+            'q': filters['q'],
+            'category': filters['category'],
+            'status': filters['status']
+        })
+
+    @app.route('/api/reports/low_stock')
+    @login_required
+    @read_replica
+    def api_low_stock_report():
+        if current_user.role != 'manager':
+            return jsonify({'error': 'Access denied'}), 403
+        
+        # ?since=YYYY-MM-DD[THH:MM[:SS]] lists only products that became low since then
+        since = request.args.get('since')
+        if since:
+            try:
+                since = datetime.fromisoformat(since)
+            except ValueError:
+                return jsonify({'error': 'Invalid since, expected an ISO date or datetime'}), 400
+        products = low_stock_products(since=since or None)
+        return jsonify({
+            'products': [{
+                'id': product.id,
+                'name': product.name,
+                'category': product.category,
+                'quantity': product.quantity,
+                'low_stock_threshold': product.low_stock_threshold,
+                'sku': product.sku,
+                'barcode': product.barcode,
+                'low_stock_since': product.low_stock_since.isoformat() if product.low_stock_since else None
+            } for product in products],
+            'since': since.isoformat() if since else None
+        })
+
+    @app.route('/reports/sales/export')
+    @login_required
+    @read_replica
+    @no_request_timeouts
+    def export_sales_report():
+        if current_user.role != 'manager':
+            flash('Access denied. Manager role required.', 'danger')
+            return redirect(url_for('dashboard'))
+            
+        period = request.args.get('period', 'all')
+        start_date, end_date = get_period_range(period)
+        compress = request.args.get('gzip') == '1'
+        
+        # Generate filename based on period
+        if period == 'daily':
+            filename = f"sales_report_daily_{start_date.strftime('%Y-%m-%d')}.csv"
+        elif period == 'weekly':
+            filename = f"sales_report_weekly_{start_date.strftime('%Y-%m-%d')}_to_{end_date.strftime('%Y-%m-%d')}.csv"
+        elif period == 'monthly':
+            filename = f"sales_report_monthly_{start_date.strftime('%Y-%m')}.csv"
+        elif period == 'yearly':
+            filename = f"sales_report_yearly_{start_date.strftime('%Y')}.csv"
+        elif period.startswith('custom:'):
+            filename = f"sales_report_custom_{start_date.strftime('%Y-%m-%d')}_to_{end_date.strftime('%Y-%m-%d')}.csv"
+        else:
+            filename = "sales_report_all.csv"
+        
+        # Stream the CSV in chunks straight from the database cursor
+        rows = iter_sales_csv(start_date, end_date, compress=compress)
+        if compress:
+            filename += '.gz'
+        return Response(
+            stream_with_context(rows),
+            mimetype="application/gzip" if compress else "text/csv",
+            headers={"Content-disposition": f"attachment; filename={filename}"}
+        )
@@ -0,0 +1,125 @@
+"""
+Returns against a recorded sale.
+
+Every sale line keeps a running returned_quantity, so what is still
+returnable is quantity - returned_quantity on the sale's own lines (one
+lookup on the transaction_id index) rather than a search through every
+return transaction. A return is written as a handful of bulk statements:
+
+1. one conditional UPDATE that adds the returned units to the sale lines,
+   only where that keeps returned_quantity <= quantity;
+2. the return transaction and all its lines, linked back to the sale;
+3. one UPDATE restocking every returned product (inventory.release_stock).
+
+As with reserve_stock, the database re-checks the condition in (1) under its
+lock, so two registers returning the same item at once cannot refund more
+units than were sold.
+"""
+
+from collections import namedtuple
+
+from sqlalchemy import case, func, insert, select, update
+
+from catalog_cache import bump_catalog_version
+from inventory import release_stock
+from models import db, Product, Transaction, TransactionItem
+from rollups import record_return
+
+# A sale line with how much of it can still be returned
+ReturnableLine = namedtuple('ReturnableLine', [
+    'item_id', 'product_id', 'name', 'price', 'quantity', 'returned_quantity', 'returnable'
+])
+
+# A requested return line that exceeds what is left to return
+Unreturnable = namedtuple('Unreturnable', ['item_id', 'requested', 'returnable'])
+
+# transaction_id is None when the return was rejected for the listed lines
+ReturnResult = namedtuple('ReturnResult', ['transaction_id', 'rejected'])
+
+
+def returnable_lines(transaction_id):
+    """
+    The lines of a sale with their returned and still returnable quantities.
+
+    Returns:
+        list: ReturnableLine tuples in the order they were rung up
+    """
+    rows = db.session.execute(
+        select(
+            TransactionItem.id,
+            TransactionItem.product_id,
+            func.coalesce(TransactionItem.custom_name, Product.name),
+            TransactionItem.price_at_time_of_sale,
+            TransactionItem.quantity,
+            TransactionItem.returned_quantity
+        )
+        .outerjoin(Product, TransactionItem.product_id == Product.id)
+        .where(TransactionItem.transaction_id == transaction_id)
+        .order_by(TransactionItem.id)
+    ).all()
+    return [ReturnableLine(*row, returnable=row.quantity - row.returned_quantity) for row in rows]
+
+
+def return_items(sale, requested, user_id):
+    """
+    Record a return of some of a sale's lines (caller commits or rolls back).
+
+    Args:
+        sale: the original Transaction
+        requested: {sale item id: quantity to return}, quantities > 0
+        user_id: the cashier processing the return
+
+    Returns:
+        ReturnResult: with the new return transaction's id, or with the lines
+                      that exceed what is left to return. On rejection nothing
+                      has been written that the caller's rollback won't undo.
+    """
+    item_ids = list(requested)
+    returning = case(requested, value=TransactionItem.id)
+    accepted = db.session.execute(
+        update(TransactionItem)
+        .where(TransactionItem.id.in_(item_ids),
+               TransactionItem.transaction_id == sale.id,
+               TransactionItem.returned_quantity + returning <= TransactionItem.quantity)
+        .values(returned_quantity=TransactionItem.returned_quantity + returning)
+        .returning(TransactionItem.id, TransactionItem.product_id, TransactionItem.price_at_time_of_sale,
+                   TransactionItem.custom_name, TransactionItem.is_custom_product)
+        .execution_options(synchronize_session=False)
+    ).all()
+    if len(accepted) < len(item_ids):
+        accepted_ids = {line.id for line in accepted}
+        remaining = dict(db.session.execute(
+            select(TransactionItem.id, TransactionItem.quantity - TransactionItem.returned_quantity)
+            .where(TransactionItem.id.in_(item_ids), TransactionItem.transaction_id == sale.id)
+        ).all())
+        return ReturnResult(None, [Unreturnable(item_id, requested[item_id], remaining.get(item_id, 0))
+                                   for item_id in item_ids if item_id not in accepted_ids])
+
+    return_transaction = Transaction(
+        total_amount=sum(line.price_at_time_of_sale * requested[line.id] for line in accepted),
+        payment_method=sale.payment_method,
+        user_id=user_id,
+        is_return=True,
+        original_transaction_id=sale.id
+    )
+    db.session.add(return_transaction)
+    db.session.flush()
+
+    db.session.execute(insert(TransactionItem), [dict(
+        transaction_id=return_transaction.id,
+        product_id=line.product_id,
+        quantity=requested[line.id],
+        price_at_time_of_sale=line.price_at_time_of_sale,
+        custom_name=line.custom_name,
+        is_custom_product=line.is_custom_product,
+        original_item_id=line.id
+    ) for line in accepted])
+
+    # Custom products were never in stock
+    restock = [(line.product_id, requested[line.id]) for line in accepted if line.product_id is not None]
+    release_stock(restock)
+
+    record_return(return_transaction)
+    if restock:
+        bump_catalog_version([product_id for product_id, _ in restock])
+    return ReturnResult(return_transaction.id, [])
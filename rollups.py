@@ -0,0 +1,207 @@
+from datetime import datetime
+
+from sqlalchemy import DateTime, case, delete, func, insert, literal, select
+
+from models import db, CategorySalesRollup, Product, SalesRollup, Transaction, TransactionItem, upsert
+
+GRANULARITIES = ('hour', 'day')
+
+KEY_COLUMNS = ['granularity', 'bucket', 'payment_method', 'user_id']
+
+# Category rollup key for custom products and products without a category
+UNCATEGORIZED = 'Uncategorized'
+
+_category = func.coalesce(Product.category, UNCATEGORIZED)
+
+
+def bucket_start(moment, granularity):
+    """Truncate a datetime to the start of its hour or day bucket."""
+    if granularity == 'hour':
+        return moment.replace(minute=0, second=0, microsecond=0)
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _increment(transaction, **amounts):
+    # Rollups are bucketed on the stored transaction date, so make sure it is
+    # set before the row is flushed
+    if transaction.date is None:
+        transaction.date = datetime.utcnow()
+    rows = []
+    for granularity in GRANULARITIES:
+        row = dict(
+            granularity=granularity,
+            bucket=bucket_start(transaction.date, granularity),
+            payment_method=transaction.payment_method,
+            user_id=transaction.user_id,
+            gross=0.0, gst=0.0, discounts=0.0, transaction_count=0,
+            return_amount=0.0, return_count=0
+        )
+        row.update(amounts)
+        rows.append(row)
+    stmt = upsert(SalesRollup).values(rows)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=KEY_COLUMNS,
+        set_={column: getattr(SalesRollup, column) + getattr(stmt.excluded, column) for column in amounts}
+    ))
+
+
+def _increment_categories(transaction, sign):
+    # Group the transaction's lines by category in the database and add them to
+    # the day's rows in the same statement. Line totals are before GST and
+    # discounts, like the per-item amounts on the receipt.
+    db.session.flush()
+    lines = (
+        select(
+            literal(bucket_start(transaction.date, 'day'), DateTime),
+            _category,
+            func.sum(TransactionItem.price_at_time_of_sale * TransactionItem.quantity) * sign,
+            func.sum(TransactionItem.quantity) * sign
+        )
+        .select_from(TransactionItem)
+        .outerjoin(Product, TransactionItem.product_id == Product.id)
+        .where(TransactionItem.transaction_id == transaction.id)
+        .group_by(_category)
+    )
+    stmt = upsert(CategorySalesRollup).from_select(['bucket', 'category', 'gross', 'quantity'], lines)
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['bucket', 'category'],
+        set_={
+            'gross': CategorySalesRollup.gross + stmt.excluded.gross,
+            'quantity': CategorySalesRollup.quantity + stmt.excluded.quantity
+        }
+    ))
+
+
+def record_sale(transaction):
+    """Add a completed sale to its hourly, daily and category rollups (caller commits)."""
+    _increment(
+        transaction,
+        gross=transaction.total_amount,
+        gst=transaction.gst_amount or 0.0,
+        discounts=transaction.discount_amount or 0.0,
+        transaction_count=1
+    )
+    _increment_categories(transaction, 1)
+
+
+def record_return(transaction):
+    """Add a return transaction to its hourly, daily and category rollups (caller commits)."""
+    _increment(transaction, return_amount=transaction.total_amount, return_count=1)
+    _increment_categories(transaction, -1)
+
+
+def _bucket_expression(granularity):
+    if db.engine.dialect.name == 'postgresql':
+        return func.date_trunc(granularity, Transaction.date)
+    if granularity == 'hour':
+        return func.strftime('%Y-%m-%d %H:00:00', Transaction.date)
+    return func.strftime('%Y-%m-%d 00:00:00', Transaction.date)
+
+
+def backfill_rollups():
+    """
+    Rebuild every rollup row from the transaction history.
+
+    Returns:
+        int: number of rollup rows written
+    """
+    db.session.execute(delete(SalesRollup))
+    is_return = func.coalesce(Transaction.is_return, False)
+    written = 0
+    for granularity in GRANULARITIES:
+        bucket = _bucket_expression(granularity)
+        rows = db.session.execute(
+            select(
+                bucket,
+                Transaction.payment_method,
+                Transaction.user_id,
+                func.sum(case((is_return, 0.0), else_=Transaction.total_amount)),
+                func.sum(case((is_return, 0.0), else_=func.coalesce(Transaction.gst_amount, 0.0))),
+                func.sum(case((is_return, 0.0), else_=func.coalesce(Transaction.discount_amount, 0.0))),
+                func.sum(case((is_return, 0), else_=1)),
+                func.sum(case((is_return, Transaction.total_amount), else_=0.0)),
+                func.sum(case((is_return, 1), else_=0))
+            )
+            .group_by(bucket, Transaction.payment_method, Transaction.user_id)
+        ).all()
+        values = []
+        for row in rows:
+            bucket_value = row[0]
+            if isinstance(bucket_value, str):
+                bucket_value = datetime.strptime(bucket_value, '%Y-%m-%d %H:%M:%S')
+            values.append(dict(
+                granularity=granularity, bucket=bucket_value,
+                payment_method=row[1], user_id=row[2],
+                gross=row[3], gst=row[4], discounts=row[5], transaction_count=row[6],
+                return_amount=row[7], return_count=row[8]
+            ))
+        if values:
+            db.session.execute(insert(SalesRollup), values)
+        written += len(values)
+    written += _backfill_categories()
+    db.session.commit()
+    return written
+
+
+def _backfill_categories():
+    db.session.execute(delete(CategorySalesRollup))
+    bucket = _bucket_expression('day')
+    sign = case((func.coalesce(Transaction.is_return, False), -1), else_=1)
+    rows = db.session.execute(
+        select(
+            bucket,
+            _category,
+            func.sum(TransactionItem.price_at_time_of_sale * TransactionItem.quantity * sign),
+            func.sum(TransactionItem.quantity * sign)
+        )
+        .select_from(TransactionItem)
+        .join(Transaction, TransactionItem.transaction_id == Transaction.id)
+        .outerjoin(Product, TransactionItem.product_id == Product.id)
+        .group_by(bucket, _category)
+    ).all()
+    values = []
+    for bucket_value, category, gross, quantity in rows:
+        if isinstance(bucket_value, str):
+            bucket_value = datetime.strptime(bucket_value, '%Y-%m-%d %H:%M:%S')
+        values.append(dict(bucket=bucket_value, category=category, gross=gross, quantity=quantity))
+    if values:
+        db.session.execute(insert(CategorySalesRollup), values)
+    return len(values)
+
+
+def _in_range(query, start_date, end_date):
+    if start_date and end_date:
+        query = query.where(SalesRollup.bucket >= start_date, SalesRollup.bucket <= end_date)
+    return query
+
+
+def sales_totals(start_date=None, end_date=None):
+    """
+    Gross sales and number of sales between two dates, from the daily rollups.
+
+    Returns:
+        tuple: (total_sales, transaction_count)
+    """
+    query = select(
+        func.coalesce(func.sum(SalesRollup.gross), 0.0),
+        func.coalesce(func.sum(SalesRollup.transaction_count), 0)
+    ).where(SalesRollup.granularity == 'day')
+    total_sales, transaction_count = db.session.execute(_in_range(query, start_date, end_date)).one()
+    return total_sales, transaction_count
+
+
+def sales_series(granularity, start_date=None, end_date=None):
+    """
+    Gross sales per bucket, newest first, skipping buckets without sales.
+
+    Returns:
+        list: (bucket, gross) tuples
+    """
+    query = (
+        select(SalesRollup.bucket, func.sum(SalesRollup.gross))
+        .where(SalesRollup.granularity == granularity)
+        .group_by(SalesRollup.bucket)
+        .having(func.sum(SalesRollup.transaction_count) > 0)
+        .order_by(SalesRollup.bucket.desc())
+    )
+    return db.session.execute(_in_range(query, start_date, end_date)).all()
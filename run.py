@@ -1,4 +1,4 @@
-from app import app
+from app import create_app
 import argparse
 import os
 
@@ -11,4 +11,4 @@ if __name__ == '__main__':
     os.environ['FLASK_ENV'] = 'development'
     
     # Development configuration that allows all hosts
-    app.run(debug=True, host='0.0.0.0', port=args.port) 
\ No newline at end of file
+    create_app().run(debug=True, host='0.0.0.0', port=args.port) 
\ No newline at end of file
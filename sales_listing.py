@@ -0,0 +1,123 @@
+import base64
+import csv
+import zlib
+from collections import namedtuple
+from datetime import datetime
+from io import StringIO
+
+from sqlalchemy import and_, func, or_, select
+
+from models import db, Transaction, TransactionItem, User
+
+# Lightweight transaction row for listings; avoids loading ORM objects and
+# their lazy user/items relationships
+SaleRow = namedtuple('SaleRow', [
+    'id', 'date', 'cashier', 'items_count', 'payment_method', 'discount_amount', 'total_amount'
+])
+
+
+def encode_cursor(row):
+    """Opaque cursor pointing just past a row in (date, id) descending order."""
+    raw = f'{row.date.isoformat()}|{row.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (date, id) from a cursor, or None if it is missing or malformed."""
+    if not cursor:
+        return None
+    try:
+        date, transaction_id = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date), int(transaction_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def sales_query(start_date=None, end_date=None):
+    """Select SaleRow columns for the sales (not returns) in a date range, newest first."""
+    items_count = (
+        select(func.count(TransactionItem.id))
+        .where(TransactionItem.transaction_id == Transaction.id)
+        .scalar_subquery()
+    )
+    query = (
+        select(Transaction.id, Transaction.date, User.username, items_count,
+               Transaction.payment_method, Transaction.discount_amount, Transaction.total_amount)
+        .join(User, Transaction.user_id == User.id)
+        .where(Transaction.is_return == False)  # noqa: E712
+        .order_by(Transaction.date.desc(), Transaction.id.desc())
+    )
+    if start_date and end_date:
+        query = query.where(Transaction.date >= start_date, Transaction.date <= end_date)
+    return query
+
+
+def sales_page(start_date=None, end_date=None, cursor=None, limit=50):
+    """
+    One page of sales using keyset pagination on (date, id).
+
+    Unlike OFFSET, the cost of a page doesn't grow with how deep into the
+    history it is: the cursor turns into an index range condition.
+
+    Returns:
+        tuple: (list of SaleRow, cursor for the next page or None)
+    """
+    query = sales_query(start_date, end_date)
+    position = decode_cursor(cursor)
+    if position:
+        date, transaction_id = position
+        query = query.where(or_(
+            Transaction.date < date,
+            and_(Transaction.date == date, Transaction.id < transaction_id)
+        ))
+    # Fetch one extra row to know whether there is a next page
+    rows = [SaleRow(*row) for row in db.session.execute(query.limit(limit + 1))]
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+EXPORT_HEADER = ['ID', 'Date', 'Cashier', 'Items', 'Payment Method', 'Discount', 'Total']
+
+
+def iter_sales_csv(start_date=None, end_date=None, chunk_size=1000, compress=False):
+    """
+    Generate the sales CSV export chunk by chunk.
+
+    Rows are read through a server-side cursor chunk_size at a time and each
+    chunk is written out before the next is fetched, so memory use stays flat
+    however long the period is. With compress, the output is a gzip stream.
+    """
+    compressor = zlib.compressobj(wbits=31) if compress else None
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        data = buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    writer.writerow(EXPORT_HEADER)
+    yield flush()
+
+    result = db.session.execute(
+        sales_query(start_date, end_date).execution_options(yield_per=chunk_size)
+    )
+    for chunk in result.partitions():
+        for row in chunk:
+            t = SaleRow(*row)
+            writer.writerow([
+                t.id,
+                t.date.strftime('%Y-%m-%d %H:%M:%S'),
+                t.cashier,
+                t.items_count,
+                t.payment_method,
+                f"${t.discount_amount:.2f}" if t.discount_amount and t.discount_amount > 0 else "-",
+                f"${t.total_amount:.2f}"
+            ])
+        data = flush()
+        if data:
+            yield data
+
+    if compressor:
+        yield compressor.flush()
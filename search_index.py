@@ -0,0 +1,211 @@
+"""
+Full-text product search.
+
+SQLite installs use an FTS5 external-content table over the product table,
+kept in sync by triggers. PostgreSQL uses a tsvector expression index for
+ranked prefix matching plus pg_trgm indexes for fuzzy and substring matches.
+Both are created together with the product table (db.create_all) and can be
+(re)built on an existing database with `flask rebuild-search-index`.
+"""
+
+import re
+import time
+
+from sqlalchemy import DDL, event, func, literal_column, or_, select, table, text, true
+
+from metrics import get_metrics
+from models import db, Product
+
+# Relative weight of the name, sku, barcode and category columns when ranking
+FTS_WEIGHTS = (10.0, 5.0, 5.0, 1.0)
+
+SQLITE_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS product_fts USING fts5("
+    "name, sku, barcode, category, content='product', content_rowid='id', "
+    "tokenize=\"unicode61 tokenchars '-_'\")",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ai AFTER INSERT ON product BEGIN "
+    "INSERT INTO product_fts(rowid, name, sku, barcode, category) "
+    "VALUES (new.id, new.name, new.sku, new.barcode, new.category); END",
+    "CREATE TRIGGER IF NOT EXISTS product_fts_ad AFTER DELETE ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, sku, barcode, category) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.category); END",
+    # Stock movements don't touch the indexed columns, so they skip this trigger
+    "CREATE TRIGGER IF NOT EXISTS product_fts_au AFTER UPDATE OF name, sku, barcode, category ON product BEGIN "
+    "INSERT INTO product_fts(product_fts, rowid, name, sku, barcode, category) "
+    "VALUES ('delete', old.id, old.name, old.sku, old.barcode, old.category); "
+    "INSERT INTO product_fts(rowid, name, sku, barcode, category) "
+    "VALUES (new.id, new.name, new.sku, new.barcode, new.category); END",
+]
+
+POSTGRES_SEARCH_VECTOR = (
+    "to_tsvector('simple', coalesce(name, '') || ' ' || coalesce(sku, '') || ' ' || "
+    "coalesce(barcode, '') || ' ' || coalesce(category, ''))"
+)
+
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS ix_product_search_vector ON product USING gin ({POSTGRES_SEARCH_VECTOR})",
+    "CREATE INDEX IF NOT EXISTS ix_product_name_trgm ON product USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_product_sku_trgm ON product USING gin (sku gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_product_barcode_trgm ON product USING gin (barcode gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_product_category_trgm ON product USING gin (category gin_trgm_ops)",
+]
+
+# Columns returned by every search, in the shape the templates expect
+RESULT_COLUMNS = (Product.id, Product.name, Product.price, Product.quantity,
+                  Product.sku, Product.barcode, Product.category)
+
+# Engines known to have the index, keyed by URL
+_available = {}
+
+
+def _sqlite_has_fts5(ddl, target, bind, **kw):
+    options = bind.exec_driver_sql('PRAGMA compile_options').scalars().all()
+    return 'ENABLE_FTS5' in options
+
+
+for statement in SQLITE_DDL:
+    event.listen(Product.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='sqlite', callable_=_sqlite_has_fts5))
+for statement in POSTGRES_DDL:
+    event.listen(Product.__table__, 'after_create',
+                 DDL(statement).execute_if(dialect='postgresql'))
+
+
+def rebuild_search_index():
+    """Create the search index if missing and repopulate it from the product table."""
+    dialect = db.engine.dialect.name
+    if dialect == 'sqlite':
+        for statement in SQLITE_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text("INSERT INTO product_fts(product_fts) VALUES ('rebuild')"))
+    elif dialect == 'postgresql':
+        for statement in POSTGRES_DDL:
+            db.session.execute(text(statement))
+        db.session.execute(text('REINDEX TABLE product'))
+    else:
+        raise RuntimeError(f'No search index support for {dialect}')
+    db.session.commit()
+    _available.pop(str(db.engine.url), None)
+
+
+def search_index_available():
+    key = str(db.engine.url)
+    if key not in _available:
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            found = db.session.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'product_fts'"
+            )).scalar()
+        elif dialect == 'postgresql':
+            found = db.session.execute(text("SELECT to_regclass('ix_product_search_vector')")).scalar()
+        else:
+            found = False
+        _available[key] = bool(found)
+    return _available[key]
+
+
+def _terms(search_term):
+    return re.findall(r'\w[\w\-]*', search_term.lower())
+
+
+def _fts_match(terms):
+    # Every term must match, each as a prefix: "dark choc" -> "dark"* "choc"*
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+def _search_sqlite(terms, limit):
+    match = _fts_match(terms)
+    rank = 'bm25(product_fts, {})'.format(', '.join(str(w) for w in FTS_WEIGHTS))
+    query = text(
+        f'SELECT rowid FROM product_fts WHERE product_fts MATCH :match ORDER BY {rank} LIMIT :limit'
+    )
+    ids = db.session.execute(query, {'match': match, 'limit': limit}).scalars().all()
+    if not ids:
+        return []
+    rows = {row.id: row for row in db.session.execute(
+        select(*RESULT_COLUMNS).where(Product.id.in_(ids))
+    )}
+    return [rows[product_id] for product_id in ids if product_id in rows]
+
+
+def _search_postgres(search_term, terms, limit):
+    vector = literal_column(POSTGRES_SEARCH_VECTOR)
+    tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+    matches = vector.op('@@')(tsquery)
+    similar = Product.name.op('%')(search_term)
+    return db.session.execute(
+        select(*RESULT_COLUMNS)
+        .where(or_(matches, similar))
+        .order_by(func.ts_rank(vector, tsquery).desc(),
+                  func.similarity(Product.name, search_term).desc(),
+                  Product.name)
+        .limit(limit)
+    ).all()
+
+
+def _search_like(search_term, limit):
+    pattern = f'%{search_term}%'
+    return db.session.execute(
+        select(*RESULT_COLUMNS)
+        .where(or_(Product.name.ilike(pattern), Product.sku.ilike(pattern),
+                   Product.barcode.ilike(pattern), Product.category.ilike(pattern)))
+        .order_by(Product.name)
+        .limit(limit)
+    ).all()
+
+
+def search_condition(search_term):
+    """
+    A WHERE condition matching products for a search term, for filtering
+    listings that do their own sorting and paging. Uses the same prefix
+    matching as full_text_search() when the index exists.
+    """
+    terms = _terms(search_term)
+    if not terms:
+        return true()
+    if search_index_available():
+        dialect = db.engine.dialect.name
+        if dialect == 'sqlite':
+            match = _fts_match(terms)
+            return Product.id.in_(
+                select(literal_column('rowid'))
+                .select_from(table('product_fts'))
+                .where(literal_column('product_fts').op('MATCH')(match))
+            )
+        if dialect == 'postgresql':
+            tsquery = func.to_tsquery('simple', ' & '.join(f'{term}:*' for term in terms))
+            return literal_column(POSTGRES_SEARCH_VECTOR).op('@@')(tsquery)
+    pattern = f'%{search_term}%'
+    return or_(Product.name.ilike(pattern), Product.sku.ilike(pattern),
+               Product.barcode.ilike(pattern), Product.category.ilike(pattern))
+
+
+def full_text_search(search_term, limit=50):
+    """
+    Search products by name, SKU, barcode and category.
+
+    Terms are matched as prefixes and results are ordered by relevance.
+    Falls back to a substring scan when the search index hasn't been built.
+
+    Returns:
+        list: rows with id, name, price, quantity, sku, barcode and category
+    """
+    terms = _terms(search_term)
+    if not terms:
+        return []
+    started = time.perf_counter()
+    backend = 'like'
+    if search_index_available():
+        backend = db.engine.dialect.name
+    if backend == 'sqlite':
+        results = _search_sqlite(terms, limit)
+    elif backend == 'postgresql':
+        results = _search_postgres(search_term, terms, limit)
+    else:
+        backend = 'like'
+        results = _search_like(search_term, limit)
+    metrics = get_metrics()
+    if metrics is not None:
+        metrics.observe('pos_search_duration_seconds', time.perf_counter() - started, backend=backend)
+    return results
@@ -0,0 +1,330 @@
+"""
+Multi-register soak test.
+
+Seeds a throwaway database, starts the app under gunicorn on it and runs a
+number of simulated cashiers against it at the same time. Each cashier logs
+in, rings up items from the quick access grid and from searches, checks out
+and now and then returns part of an earlier sale. At the end it prints latency
+percentiles per action, the error rate, how many requests hit "database is
+locked", and whether every product's stock still adds up:
+
+    starting stock - units sold + units returned == ending stock
+
+The app's metrics files, cart store and compiled templates go to the soak's
+temporary directory, not the repo's instance folder.
+
+Usage:
+    python soak.py --cashiers 8 --duration 60
+"""
+
+import argparse
+import atexit
+import http.cookiejar
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import defaultdict
+
+SEARCH_TERMS = ['cola', 'chips', 'choc', 'milk', 'bread', 'coffee', 'gum', 'tea', 'soap', 'rice']
+
+CSRF_PATTERN = re.compile(r'name="csrf_token"[^>]*value="([^"]+)"')
+QUICK_ACCESS_PATTERN = re.compile(r'/quick_access/add_to_cart/(\d+)')
+TRANSACTION_ID_PATTERN = re.compile(r'Transaction ID:</strong>\s*(\d+)')
+RETURN_ITEM_PATTERN = re.compile(r'name="return_quantity_(\d+)"')
+RETURN_ACCEPTED = 'Return processed successfully'
+
+# App settings that would otherwise write into the repo's instance folder; the
+# soak points them at its temporary directory so its metrics, carts and
+# compiled templates never mix with the real ones
+WORKDIR_SETTINGS = {
+    'METRICS_DIR': 'metrics',
+    'CART_STORE_PATH': 'carts.sqlite',
+    'TEMPLATE_BYTECODE_DIR': 'jinja_cache',
+}
+
+
+class Results:
+    """Latencies and outcomes collected from every cashier thread."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.outcomes = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, action, seconds, error=None):
+        with self._lock:
+            self.latencies[action].append(seconds)
+            if error:
+                self.errors[(action, error)] += 1
+
+    def count(self, outcome):
+        with self._lock:
+            self.outcomes[outcome] += 1
+
+
+class Cashier(threading.Thread):
+    def __init__(self, number, base_url, username, password, results, deadline, return_rate, seed):
+        super().__init__(name=f'cashier-{number}', daemon=True)
+        self.base_url = base_url
+        self.username = username
+        self.password = password
+        self.results = results
+        self.deadline = deadline
+        self.return_rate = return_rate
+        self.rng = random.Random(seed)
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()))
+        self.sales = []
+
+    def request(self, action, path, data=None):
+        """Issue one request; returns (final_url, body), or (None, None) on an error."""
+        if data is not None:
+            data = urllib.parse.urlencode(data).encode()
+        started = time.perf_counter()
+        try:
+            with self.opener.open(self.base_url + path, data=data, timeout=60) as response:
+                body = response.read().decode('utf-8', 'replace')
+                url = response.geturl()
+        except urllib.error.HTTPError as e:
+            self.results.record(action, time.perf_counter() - started, f'HTTP {e.code}')
+            return None, None
+        except (urllib.error.URLError, OSError) as e:
+            self.results.record(action, time.perf_counter() - started, type(e).__name__)
+            return None, None
+        self.results.record(action, time.perf_counter() - started)
+        return url, body
+
+    def csrf_token(self, action, path):
+        url, body = self.request(action, path)
+        match = CSRF_PATTERN.search(body or '')
+        return match.group(1) if match else None, body
+
+    def login(self):
+        token, _ = self.csrf_token('login_form', '/login')
+        url, _ = self.request('login', '/login', {
+            'csrf_token': token or '', 'username': self.username, 'password': self.password})
+        return url is not None and not url.endswith('/login')
+
+    def ring_up(self):
+        url, body = self.request('new_transaction', '/transactions/new')
+        grid = QUICK_ACCESS_PATTERN.findall(body or '')
+        for product_id in self.rng.sample(grid, min(len(grid), self.rng.randint(1, 4))):
+            self.request('add_quick_access', f'/quick_access/add_to_cart/{product_id}', {})
+        if self.rng.random() < 0.5:
+            term = self.rng.choice(SEARCH_TERMS)
+            url, body = self.request('api_search', f'/api/products/search?term={term}')
+            ids = re.findall(r'"id":\s*(\d+)', body or '')
+            if ids:
+                self.request('add_from_search', f'/products/add_to_cart/{self.rng.choice(ids)}', {})
+
+    def checkout(self):
+        token, body = self.csrf_token('checkout_form', '/transactions/checkout')
+        if token is None:
+            return
+        url, body = self.request('checkout', '/transactions/checkout', {
+            'csrf_token': token, 'payment_method': self.rng.choice(['cash', 'card']),
+            'amount_tendered': '10000', 'discount_amount': '0'})
+        if url is None:
+            return
+        match = TRANSACTION_ID_PATTERN.search(body)
+        if match:
+            self.results.count('checkouts')
+            self.sales.append(int(match.group(1)))
+        elif url.endswith('/transactions/new'):
+            self.results.count('checkouts_short_on_stock')
+        else:
+            # The checkout rolled back and sent the cashier back to the payment form
+            self.results.count('checkouts_failed')
+            self.results.record('checkout', 0.0, 'rolled back')
+
+    def process_return(self):
+        transaction_id = self.sales.pop(self.rng.randrange(len(self.sales)))
+        url, body = self.request('return_form', f'/returns/{transaction_id}')
+        items = RETURN_ITEM_PATTERN.findall(body or '')
+        if not items:
+            return
+        url, body = self.request('process_return', f'/returns/{transaction_id}',
+                                 {f'return_quantity_{self.rng.choice(items)}': '1'})
+        if url is None:
+            return
+        if RETURN_ACCEPTED in body:
+            self.results.count('returns')
+        else:
+            # Sent back to the return form with the reason flashed
+            self.results.count('returns_rejected')
+            self.results.record('process_return', 0.0, 'rejected')
+
+    def run(self):
+        if not self.login():
+            self.results.count('login_failures')
+            return
+        while time.monotonic() < self.deadline:
+            self.ring_up()
+            self.checkout()
+            if self.sales and self.rng.random() < self.return_rate:
+                self.process_return()
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def seed_database(database_url, products):
+    """Create the soak database and return {product_id: quantity} before the run."""
+    os.environ['DATABASE_URL'] = database_url
+    from app import create_app
+    from bench import seed_bench
+    from models import db, Product
+
+    app = create_app()
+    # This process only seeds and checks stock; don't write it into the metrics
+    atexit.unregister(app.extensions['metrics'].flush)
+    with app.app_context():
+        seed_bench(products=products, transactions=0, days=1, echo=lambda message: None)
+        stock = dict(db.session.query(Product.id, Product.quantity).all())
+        db.engine.dispose()
+    return app, stock
+
+
+def check_stock(app, starting_stock):
+    """Products whose ending stock doesn't match the sales and returns recorded against them."""
+    from sqlalchemy import case, func
+    from models import db, Product, Transaction, TransactionItem
+
+    with app.app_context():
+        sign = case((Transaction.is_return == True, 1), else_=-1)  # noqa: E712
+        movement = dict(
+            db.session.query(TransactionItem.product_id, func.sum(sign * TransactionItem.quantity))
+            .join(Transaction, TransactionItem.transaction_id == Transaction.id)
+            .filter(TransactionItem.product_id.isnot(None))
+            .group_by(TransactionItem.product_id)
+            .all()
+        )
+        ending = dict(db.session.query(Product.id, Product.quantity).all())
+    return [(product_id, quantity, movement.get(product_id, 0), ending.get(product_id))
+            for product_id, quantity in starting_stock.items()
+            if quantity + movement.get(product_id, 0) != ending.get(product_id)]
+
+
+def wait_until_up(base_url, server, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise SystemExit('gunicorn exited during startup')
+        try:
+            urllib.request.urlopen(base_url + '/login', timeout=2).read()
+            return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.2)
+    raise SystemExit('gunicorn did not start in time')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run simulated cashiers against the app under gunicorn')
+    parser.add_argument('--cashiers', type=int, default=8, help='Number of concurrent cashiers')
+    parser.add_argument('--duration', type=float, default=60, help='Seconds to run')
+    parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='Threads per gunicorn worker')
+    parser.add_argument('--port', type=int, default=5055, help='Port to run gunicorn on')
+    parser.add_argument('--products', type=int, default=2000, help='Products in the seeded catalog')
+    parser.add_argument('--return-rate', type=float, default=0.1, help='Chance of a return after each sale')
+    parser.add_argument('--database-url', help='Database to seed and use (default: a temporary SQLite file); '
+                                               'every table in it is dropped')
+    parser.add_argument('--yes', action='store_true', help="Don't ask before dropping the --database-url tables")
+    parser.add_argument('--seed', type=int, default=42, help='Random seed for the cashiers')
+    parser.add_argument('--keep', action='store_true', help='Keep the temporary directory with the database, log and metrics')
+    args = parser.parse_args()
+
+    if args.database_url and not args.yes:
+        answer = input(f'This drops every table in {args.database_url}. Continue? [y/N] ')
+        if answer.strip().lower() not in ('y', 'yes'):
+            raise SystemExit('Aborted!')
+
+    workdir = tempfile.mkdtemp(prefix='pos-soak-')
+    for name, path in WORKDIR_SETTINGS.items():
+        os.environ[name] = os.path.join(workdir, path)
+    database_url = args.database_url or 'sqlite:///' + os.path.join(workdir, 'pos.sqlite')
+    app, starting_stock = seed_database(database_url, args.products)
+    print(f'Seeded {len(starting_stock)} products in {database_url}')
+
+    log_path = os.path.join(workdir, 'gunicorn.log')
+    env = dict(os.environ, DATABASE_URL=database_url)
+    base_url = f'http://127.0.0.1:{args.port}'
+    with open(log_path, 'w') as log:
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-w', str(args.workers), '--threads', str(args.threads),
+             '-b', f'127.0.0.1:{args.port}', '--error-logfile', '-', 'app:create_app()'],
+            cwd=os.path.dirname(os.path.abspath(__file__)), env=env, stdout=log, stderr=subprocess.STDOUT)
+    try:
+        wait_until_up(base_url, server)
+        results = Results()
+        deadline = time.monotonic() + args.duration
+        users = ['admin'] + [f'bench{i + 1}' for i in range(5)]
+        cashiers = [Cashier(i, base_url, users[i % len(users)], 'admin123', results, deadline,
+                            args.return_rate, args.seed + i)
+                    for i in range(args.cashiers)]
+        started = time.monotonic()
+        for cashier in cashiers:
+            cashier.start()
+        for cashier in cashiers:
+            cashier.join()
+        elapsed = time.monotonic() - started
+    finally:
+        server.terminate()
+        server.wait(timeout=30)
+
+    # Count the wrapped SQLAlchemy error once per failed request, not every traceback line
+    with open(log_path) as f:
+        lock_errors = f.read().count('OperationalError) database is locked')
+
+    print(f'\n{args.cashiers} cashiers, {args.workers} workers x {args.threads} threads, {elapsed:.1f}s\n')
+    print(f'{"action":20} {"count":>7} {"errors":>7} {"p50 ms":>9} {"p95 ms":>9} {"p99 ms":>9}')
+    total_requests = total_errors = 0
+    for action, latencies in sorted(results.latencies.items()):
+        errors = sum(count for (name, _), count in results.errors.items() if name == action)
+        total_requests += len(latencies)
+        total_errors += errors
+        print(f'{action:20} {len(latencies):7} {errors:7} '
+              f'{percentile(latencies, 0.50) * 1000:9.1f} {percentile(latencies, 0.95) * 1000:9.1f} '
+              f'{percentile(latencies, 0.99) * 1000:9.1f}')
+
+    print()
+    for outcome, count in sorted(results.outcomes.items()):
+        print(f'{outcome}: {count}')
+    if results.outcomes.get('checkouts'):
+        print(f'checkouts/s: {results.outcomes["checkouts"] / elapsed:.1f}')
+    print(f'error rate: {total_errors / total_requests:.2%}' if total_requests else 'error rate: n/a')
+    for (action, error), count in sorted(results.errors.items()):
+        print(f'  {action}: {error} x{count}')
+    print(f'"database is locked" in server log: {lock_errors}')
+
+    mismatches = check_stock(app, starting_stock)
+    if mismatches:
+        print(f'STOCK MISMATCH for {len(mismatches)} products:')
+        for product_id, starting, movement, ending in mismatches[:20]:
+            print(f'  product {product_id}: {starting} {movement:+d} != {ending}')
+    else:
+        print('Stock consistent: starting stock - net sales == ending stock for every product')
+
+    if args.keep:
+        print(f'\nDatabase and server log kept in {workdir}')
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+    if mismatches or total_errors:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Template rendering: compiled template cache, fragment cache and render timing.
+
+Compiled templates are written to TEMPLATE_BYTECODE_DIR (instance/jinja_cache
+by default), so a freshly forked gunicorn worker loads them instead of
+recompiling every template on its first requests. Jinja checks each file
+against the template source, so an edited template is simply recompiled.
+
+Blocks of a template that rarely change can be cached with
+
+    {% cache 'quick_access_grid' %} ... {% endcache %}
+    {% cache 'product_options', current_user.role %} ... {% endcache %}
+
+The rendered HTML is kept per worker, keyed by the fragment name, the
+optional extra key and the current catalog and quick_access versions, so a
+checkout, product edit or quick access change makes every worker re-render
+the fragment on its next request. Values the fragment needs should be loaded
+inside it (pass a callable to the template) so a hit skips their queries too.
+TEMPLATE_FRAGMENT_CACHE_SIZE bounds the number of fragments kept; 0 turns
+fragment caching off.
+
+Every render_template() call is timed into the pos_template_render_seconds
+histogram and the request's Server-Timing header.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from flask import before_render_template, g, has_request_context, template_rendered
+from jinja2 import FileSystemBytecodeCache, nodes
+from jinja2.ext import Extension
+
+from catalog_cache import current_version
+
+# Cache versions every fragment key includes
+FRAGMENT_VERSIONS = ('catalog', 'quick_access')
+
+
+class FragmentCache:
+    """Least recently used store of rendered fragments for one worker."""
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            html = self._fragments.get(key)
+            if html is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self._fragments.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        with self._lock:
+            self._fragments[key] = html
+            self._fragments.move_to_end(key)
+            while len(self._fragments) > self.size:
+                self._fragments.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._fragments.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """The {% cache name[, key] %} ... {% endcache %} tag."""
+
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        if parser.stream.skip_if('comma'):
+            args.append(parser.parse_expression())
+        else:
+            args.append(nodes.Const(None))
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_fragment', args), [], [], body).set_lineno(lineno)
+
+    def _render_fragment(self, name, extra, caller):
+        cache = self.environment.fragment_cache
+        if cache is None or not has_request_context():
+            return caller()
+        key = (name, extra) + tuple(current_version(version) for version in FRAGMENT_VERSIONS)
+        html = cache.get(key)
+        if html is None:
+            html = caller()
+            cache.set(key, html)
+        return html
+
+
+def _template_name(template):
+    return template.name or 'string'
+
+
+def init_template_cache(app):
+    """Set up the bytecode cache, the {% cache %} tag and render timing."""
+    app.config.setdefault('TEMPLATE_BYTECODE_DIR',
+                          os.environ.get('TEMPLATE_BYTECODE_DIR') or os.path.join(app.instance_path, 'jinja_cache'))
+    app.config.setdefault('TEMPLATE_FRAGMENT_CACHE_SIZE', 256)
+
+    directory = app.config['TEMPLATE_BYTECODE_DIR']
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(directory)
+
+    app.jinja_env.add_extension(FragmentCacheExtension)
+    size = app.config['TEMPLATE_FRAGMENT_CACHE_SIZE']
+    fragments = FragmentCache(size) if size else None
+    app.jinja_env.fragment_cache = fragments
+    app.extensions['fragment_cache'] = fragments
+
+    store = app.extensions.get('metrics')
+    if store is not None and fragments is not None:
+        def collect_fragments(store):
+            store.set_counter('pos_cache_hits_total', fragments.hits, cache='fragments')
+            store.set_counter('pos_cache_misses_total', fragments.misses, cache='fragments')
+
+        store.add_collector(collect_fragments)
+
+    @before_render_template.connect_via(app)
+    def start_render_timer(sender, template, context, **extra):
+        if has_request_context():
+            g.setdefault('render_timers', []).append(time.perf_counter())
+
+    @template_rendered.connect_via(app)
+    def record_render_time(sender, template, context, **extra):
+        timers = g.get('render_timers') if has_request_context() else None
+        if not timers:
+            return
+        elapsed = time.perf_counter() - timers.pop()
+        g.render_time = g.get('render_time', 0.0) + elapsed
+        if store is not None:
+            store.observe('pos_template_render_seconds', elapsed, template=_template_name(template))
+
+    @app.after_request
+    def report_render_time(response):
+        render_time = g.pop('render_time', None)
+        if render_time is not None:
+            response.headers.add('Server-Timing', f'tpl;dur={render_time * 1000:.1f};desc="templates"')
+        return response
@@ -0,0 +1,40 @@
+import os
+import sys
+
+import pytest
+from werkzeug.security import generate_password_hash
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app  # noqa: E402
+from models import db, User, Product, QuickAccessProduct  # noqa: E402
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = create_app({
+        'TESTING': True,
+        'WTF_CSRF_ENABLED': False,
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + str(tmp_path / 'pos.sqlite'),
+        'METRICS_DIR': str(tmp_path / 'metrics'),
+        'TEMPLATE_BYTECODE_DIR': str(tmp_path / 'jinja_cache'),
+    })
+    with app.app_context():
+        db.create_all()
+        db.session.add(User(username='admin', password=generate_password_hash('admin123'), role='manager'))
+        products = [Product(name=f'Product {i}', price=1.0 + i, quantity=50, category='Snacks',
+                            barcode=f'100{i}', sku=f'SKU{i}') for i in range(10)]
+        db.session.add_all(products)
+        db.session.flush()
+        db.session.add_all([QuickAccessProduct(position=i + 1, product_id=product.id)
+                            for i, product in enumerate(products)])
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin123'})
+    assert response.status_code == 302
+    return client
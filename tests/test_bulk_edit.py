@@ -0,0 +1,90 @@
+import re
+
+from bulk_edit import BulkChanges, apply_bulk_edit, preview_bulk_edit
+from models import db, AuditLog, Product
+
+
+def _prices(app):
+    with app.app_context():
+        return {product.id: product.price for product in Product.query.order_by(Product.id)}
+
+
+def _preview(client, data):
+    response = client.post('/products/bulk_edit', data=dict(data, preview='Preview'))
+    assert response.status_code == 200
+    match = re.search(r'name="preview_token" type="hidden" value="([0-9a-f]+)"', response.get_data(as_text=True))
+    return match.group(1) if match else None
+
+
+def test_empty_selection_is_refused(app, client):
+    before = _prices(app)
+    response = client.post('/products/bulk_edit', data={'price_mode': 'set', 'price_value': '0.01', 'apply': 'y'})
+    assert response.status_code == 200
+    assert 'Change every product' in response.get_data(as_text=True)
+    assert _prices(app) == before
+
+
+def test_apply_needs_a_preview(app, client):
+    before = _prices(app)
+    response = client.post('/products/bulk_edit', data={'category': 'Snacks', 'price_mode': 'set',
+                                                        'price_value': '0.01', 'apply': 'y'})
+    assert response.status_code == 200
+    assert _prices(app) == before
+
+
+def test_apply_after_preview(app, client):
+    data = {'product_ids': '1, 2', 'price_mode': 'percent', 'price_value': '10'}
+    token = _preview(client, data)
+    assert token
+    response = client.post('/products/bulk_edit', data=dict(data, preview_token=token, apply='y'))
+    assert response.status_code == 302
+    prices = _prices(app)
+    assert prices[1] == 1.1 and prices[2] == 2.2 and prices[3] == 3.0
+    with app.app_context():
+        assert AuditLog.query.filter_by(action='bulk_edit').one().affected == 2
+
+
+def test_apply_with_changed_form_is_refused(app, client):
+    data = {'product_ids': '1', 'price_mode': 'set', 'price_value': '5'}
+    token = _preview(client, data)
+    before = _prices(app)
+    response = client.post('/products/bulk_edit', data=dict(data, product_ids='1,2,3', preview_token=token, apply='y'))
+    assert response.status_code == 200
+    assert _prices(app) == before
+
+
+def test_every_product_with_confirmation(app, client):
+    data = {'all_products': 'y', 'low_stock_threshold': '7'}
+    token = _preview(client, data)
+    response = client.post('/products/bulk_edit', data=dict(data, preview_token=token, apply='y'))
+    assert response.status_code == 302
+    with app.app_context():
+        assert {product.low_stock_threshold for product in Product.query} == {7}
+
+
+def test_search_selection_and_price_floor(app, client):
+    data = {'q': 'Product 1', 'price_mode': 'amount', 'price_value': '-1.5'}
+    token = _preview(client, data)
+    client.post('/products/bulk_edit', data=dict(data, preview_token=token, apply='y'))
+    with app.app_context():
+        # Product 1 costs 2.00 and drops to 0.50; nothing else matches the search
+        assert db.session.get(Product, 2).price == 0.5
+        assert db.session.get(Product, 1).price == 1.0
+
+
+def test_selection_needs_every_filter_to_match(app):
+    with app.app_context():
+        db.session.get(Product, 2).category = 'Drinks'
+        db.session.commit()
+        filters = {'q': '', 'category': 'Snacks', 'status': ''}
+        changes = BulkChanges('amount', -3.5, None, None)
+
+        preview = preview_bulk_edit(changes, filters, [1, 2, 3, 4])
+        # Product 1 is in Drinks; Product 0 (1.00) and Product 2 (3.00) would go below $0.01
+        assert (preview.matched, preview.skipped) == (3, 2)
+        assert [row.id for row in preview.products] == [1, 3, 4]
+
+        updated = apply_bulk_edit(changes, filters, [1, 2, 3, 4], user_id=1)
+        db.session.commit()
+        assert updated == [4]
+        assert [db.session.get(Product, i).price for i in (1, 2, 3, 4)] == [1.0, 2.0, 3.0, 0.5]
@@ -0,0 +1,49 @@
+import sqlite3
+import time
+
+from cart_store import SQLiteCartStore
+
+
+def line(product_id, quantity=1):
+    return {'product_id': product_id, 'name': f'Product {product_id}', 'price': 1.0, 'quantity': quantity}
+
+
+def test_abandoned_carts_are_purged_on_write(tmp_path):
+    store = SQLiteCartStore(str(tmp_path / 'carts.sqlite'), max_age=3600)
+    store.put_line('abandoned', line(1))
+    store.put_line('abandoned', line(2))
+    store.put_line('active', line(1))
+    # Only one of the active cart's lines is recent; the cart as a whole is kept
+    store.put_line('active', line(2))
+    with sqlite3.connect(store.path) as conn:
+        conn.execute('UPDATE cart_line SET updated_at = ? WHERE handle = ? OR product_key = ?',
+                     (time.time() - 7200, 'abandoned', '1'))
+
+    store._next_purge = 0.0
+    store.put_line('new', line(3))
+    assert store.lines('abandoned') == []
+    assert [item['product_id'] for item in store.lines('active')] == [1, 2]
+    assert store.lines('new') == [line(3)]
+
+
+def test_purge_runs_at_most_once_per_interval(tmp_path):
+    store = SQLiteCartStore(str(tmp_path / 'carts.sqlite'), max_age=3600, purge_interval=3600)
+    store.put_line('first', line(1))
+    with sqlite3.connect(store.path) as conn:
+        conn.execute('UPDATE cart_line SET updated_at = 0')
+    store.put_line('second', line(1))
+    assert store.lines('first') == [line(1)]
+
+
+def test_store_created_before_purging_gets_the_column(tmp_path):
+    path = str(tmp_path / 'carts.sqlite')
+    with sqlite3.connect(path) as conn:
+        conn.execute('CREATE TABLE cart_line (handle TEXT NOT NULL, product_key TEXT NOT NULL,'
+                     ' position INTEGER NOT NULL, data TEXT NOT NULL, PRIMARY KEY (handle, product_key))'
+                     ' WITHOUT ROWID')
+        conn.execute("INSERT INTO cart_line VALUES ('old', '1', 1, '{\"product_id\": 1}')")
+
+    store = SQLiteCartStore(path)
+    assert store.purge(time.time()) == 1
+    store.put_line('cart', line(1))
+    assert store.lines('cart') == [line(1)]
@@ -0,0 +1,40 @@
+from flask import g
+
+from catalog_cache import bump_catalog_version, current_version, get_catalog
+from models import db, Product
+
+
+def test_changed_products_are_reloaded(app):
+    with app.test_request_context():
+        catalog = get_catalog()
+        assert catalog.lookup('1003').name == 'Product 3'
+        db.session.get(Product, 4).name = 'Renamed'
+        bump_catalog_version([4])
+        db.session.commit()
+
+    with app.test_request_context():
+        assert catalog.lookup('1003').name == 'Renamed'
+        assert catalog.stats()['full_reloads'] == 1
+
+
+def test_request_with_an_older_version_keeps_the_newer_snapshot(app):
+    with app.test_request_context():
+        catalog = get_catalog()
+        catalog.snapshot()
+        old_version = current_version('catalog')
+        bump_catalog_version([1])
+        db.session.commit()
+
+    with app.test_request_context():
+        catalog.snapshot()
+        new_version = catalog.version
+        assert new_version > old_version
+
+    # A request that read the version before this worker moved on
+    with app.test_request_context():
+        g.cache_versions = {'catalog': old_version}
+        stats = catalog.stats()
+        catalog.snapshot()
+        assert catalog.version == new_version
+        assert catalog.stats()['full_reloads'] == stats['full_reloads']
+        assert catalog.stats()['misses'] == stats['misses']
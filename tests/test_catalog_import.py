@@ -0,0 +1,60 @@
+from io import StringIO
+
+import pytest
+
+from catalog_import import CatalogImportError, import_products
+from models import db, Product
+
+
+def run_import(app, text, **kwargs):
+    with app.app_context():
+        return import_products(StringIO(text), **kwargs)
+
+
+def product(app, product_id):
+    with app.app_context():
+        return db.session.get(Product, product_id)
+
+
+def test_rows_match_on_barcode_then_sku(app):
+    summary = run_import(app, 'Barcode,SKU,Price,Quantity\n'
+                              '1001,,9.99,\n'
+                              ',SKU2,,7\n'
+                              '1003,SKU3,4.50,0\n')
+    assert summary == (0, 3, [])
+    assert (product(app, 2).price, product(app, 2).quantity) == (9.99, 50)
+    assert (product(app, 3).price, product(app, 3).quantity) == (3.0, 7)
+    assert product(app, 4).quantity == 0 and product(app, 4).low_stock
+
+
+def test_new_products_are_inserted_with_defaults(app):
+    summary = run_import(app, 'name,price,barcode,category\nNew Gum,1.25,2001,Candy\n')
+    assert (summary.inserted, summary.updated, summary.errors) == (1, 0, [])
+    with app.app_context():
+        new = Product.query.filter_by(barcode='2001').one()
+        assert (new.name, new.price, new.quantity, new.category) == ('New Gum', 1.25, 0, 'Candy')
+
+
+def test_bad_rows_are_reported_and_the_rest_imported(app):
+    summary = run_import(app, 'barcode,sku,name,price\n'
+                              '1001,,,abc\n'                 # line 2: bad price
+                              ',,Nameless,1.00\n'            # line 3: nothing to match on
+                              '3001,,No Price,\n'            # line 4: new product without a price
+                              '1002,SKU5,,2.00\n'            # line 5: codes of two products
+                              '1006,,,6.50\n'                # line 6: fine
+                              '1006,,,7.50\n', chunk_size=2)  # line 7: same barcode again
+    assert summary.updated == 1
+    assert [(error.line, error.message) for error in summary.errors] == [
+        (2, 'price "abc" is not a number'),
+        (3, 'a barcode or SKU is required'),
+        (4, 'new products need a name and a price'),
+        (5, 'barcode and SKU belong to different products'),
+        (7, 'same barcode or SKU as line 6'),
+    ]
+    assert product(app, 7).price == 6.5
+    assert product(app, 3).price == 3.0
+
+
+def test_file_without_a_code_column_is_refused(app):
+    with pytest.raises(CatalogImportError):
+        run_import(app, 'name,price\nGum,1.00\n')
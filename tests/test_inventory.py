@@ -0,0 +1,47 @@
+from inventory import Shortage, reserve_stock
+from models import db, Product, Transaction
+
+
+def quantities(*product_ids):
+    return [db.session.get(Product, product_id).quantity for product_id in product_ids]
+
+
+def test_reserve_stock_decrements_every_line(app):
+    with app.app_context():
+        assert reserve_stock([(1, 3), (2, 45), (1, 2)]) == []
+        db.session.commit()
+        assert quantities(1, 2) == [45, 5]
+        product = db.session.get(Product, 2)
+        assert product.low_stock and product.low_stock_since is not None
+
+
+def test_shortages_report_what_was_on_hand(app):
+    with app.app_context():
+        # Repeated lines are added up before they are checked
+        shortages = reserve_stock([(1, 10), (2, 30), (2, 30), (3, 1)])
+        assert shortages == [Shortage(2, 60, 50)]
+        db.session.rollback()
+        assert quantities(1, 2, 3) == [50, 50, 50]
+
+
+def test_deleted_product_is_short_of_everything(app):
+    with app.app_context():
+        assert reserve_stock([(1, 1), (999, 2)]) == [Shortage(999, 2, 0)]
+        db.session.rollback()
+
+
+def test_checkout_short_on_stock_writes_nothing(app, client):
+    client.post('/quick_access/add_to_cart/1')
+    client.post('/quick_access/add_to_cart/2')
+    with app.app_context():
+        db.session.get(Product, 2).quantity = 0
+        db.session.commit()
+
+    response = client.post('/transactions/checkout', data={
+        'payment_method': 'cash', 'amount_tendered': '100', 'discount_amount': '0'})
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/transactions/new')
+    assert b'Only 0 Product 1 available in stock (requested 1)' in client.get('/transactions/new').data
+    with app.app_context():
+        assert Transaction.query.count() == 0
+        assert quantities(1, 2) == [50, 0]
@@ -0,0 +1,30 @@
+from werkzeug.security import generate_password_hash
+
+from models import db, User
+
+
+def test_metrics_refused_without_login(app):
+    assert app.test_client().get('/metrics').status_code == 401
+
+
+def test_metrics_refused_for_cashier(app):
+    with app.app_context():
+        db.session.add(User(username='cashier', password=generate_password_hash('cashier123'), role='cashier'))
+        db.session.commit()
+    cashier = app.test_client()
+    cashier.post('/login', data={'username': 'cashier', 'password': 'cashier123'})
+    assert cashier.get('/metrics').status_code == 401
+
+
+def test_metrics_served_to_manager(client):
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+def test_metrics_token(app):
+    app.config['METRICS_TOKEN'] = 'secret'
+    scraper = app.test_client()
+    assert scraper.get('/metrics').status_code == 401
+    assert scraper.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert scraper.get('/metrics', headers={'Authorization': 'Bearer secret'}).status_code == 200
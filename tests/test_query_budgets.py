@@ -0,0 +1,42 @@
+import re
+
+import pytest
+
+from query_stats import DEFAULT_QUERY_BUDGETS
+
+
+def query_count(response):
+    match = re.search(r'desc="(\d+) queries"', ', '.join(response.headers.getlist('Server-Timing')))
+    return int(match.group(1))
+
+
+def test_budgets_are_enforced_under_testing(app):
+    assert app.config['QUERY_BUDGET_MODE'] == 'enforce'
+
+
+@pytest.mark.parametrize('lines', [1, 3, 5, 8])
+def test_register_pages_stay_within_budget(client, lines):
+    for product_id in range(1, lines + 1):
+        client.post(f'/quick_access/add_to_cart/{product_id}')
+
+    response = client.post('/transactions/checkout', data={
+        'payment_method': 'cash', 'amount_tendered': '1000', 'discount_amount': '0'})
+    assert response.status_code == 200
+    assert query_count(response) <= DEFAULT_QUERY_BUDGETS['checkout']
+
+    # The register page after a sale shows the last sale with all its lines
+    response = client.get('/transactions/new')
+    assert response.status_code == 200
+    assert b'Product 0' in response.data
+    assert query_count(response) <= DEFAULT_QUERY_BUDGETS['new_transaction']
+
+
+@pytest.mark.parametrize('period', ['daily', 'weekly', 'monthly', 'yearly', 'all'])
+def test_sales_report_stays_within_budget(client, period):
+    client.post('/quick_access/add_to_cart/1')
+    client.post('/transactions/checkout', data={
+        'payment_method': 'card', 'amount_tendered': '0', 'discount_amount': '0'})
+
+    response = client.get(f'/reports/sales?period={period}')
+    assert response.status_code == 200
+    assert query_count(response) <= DEFAULT_QUERY_BUDGETS['sales_report']
@@ -0,0 +1,76 @@
+import pytest
+
+from models import db, Product, Transaction, TransactionItem
+from returns import Unreturnable, return_items, returnable_lines
+
+
+@pytest.fixture
+def sale(app, client):
+    """A sale of 2 x product 1 and 1 x product 2; returns its id."""
+    for product_id in (1, 1, 2):
+        client.post(f'/quick_access/add_to_cart/{product_id}')
+    client.post('/transactions/checkout', data={
+        'payment_method': 'cash', 'amount_tendered': '100', 'discount_amount': '0'})
+    with app.app_context():
+        return Transaction.query.filter_by(is_return=False).one().id
+
+
+def lines_by_product(transaction_id):
+    return {line.product_id: line for line in returnable_lines(transaction_id)}
+
+
+def test_partial_returns_add_up(app, sale):
+    with app.app_context():
+        transaction = db.session.get(Transaction, sale)
+        lines = lines_by_product(sale)
+        first = return_items(transaction, {lines[1].item_id: 1}, transaction.user_id)
+        db.session.commit()
+        second = return_items(transaction, {lines[1].item_id: 1, lines[2].item_id: 1}, transaction.user_id)
+        db.session.commit()
+        assert first.transaction_id and second.transaction_id and not second.rejected
+
+        assert [line.returnable for line in returnable_lines(sale)] == [0, 0]
+        assert db.session.get(Product, 1).quantity == 50
+        assert db.session.get(Product, 2).quantity == 50
+        returned = db.session.get(Transaction, second.transaction_id)
+        assert returned.is_return and returned.original_transaction_id == sale
+        assert returned.total_amount == 3.0
+
+
+def test_over_returning_a_line_is_rejected(app, sale):
+    with app.app_context():
+        transaction = db.session.get(Transaction, sale)
+        lines = lines_by_product(sale)
+        result = return_items(transaction, {lines[1].item_id: 1, lines[2].item_id: 2}, transaction.user_id)
+        assert result == (None, [Unreturnable(lines[2].item_id, 2, 1)])
+        db.session.rollback()
+
+        # The line that fit was not returned either
+        assert [line.returnable for line in returnable_lines(sale)] == [2, 1]
+        assert Transaction.query.filter_by(is_return=True).count() == 0
+        assert db.session.get(Product, 1).quantity == 48
+
+
+def test_lines_of_another_sale_are_rejected(app, sale):
+    with app.app_context():
+        transaction = db.session.get(Transaction, sale)
+        other = Transaction(total_amount=1.0, payment_method='cash', user_id=transaction.user_id)
+        db.session.add(other)
+        db.session.flush()
+        item = TransactionItem(transaction_id=other.id, product_id=3, quantity=1, price_at_time_of_sale=1.0)
+        db.session.add(item)
+        db.session.commit()
+
+        result = return_items(transaction, {item.id: 1}, transaction.user_id)
+        assert result.transaction_id is None
+        db.session.rollback()
+
+
+def test_return_page_refuses_more_than_was_sold(app, client, sale):
+    with app.app_context():
+        item_id = lines_by_product(sale)[2].item_id
+    response = client.post(f'/returns/{sale}', data={f'return_quantity_{item_id}': '5'})
+    assert response.headers['Location'].endswith(f'/returns/{sale}')
+    assert b'Only 1 of Product 1 can still be returned' in client.get(f'/returns/{sale}').data
+    with app.app_context():
+        assert Transaction.query.filter_by(is_return=True).count() == 0
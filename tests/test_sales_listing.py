@@ -0,0 +1,23 @@
+from datetime import datetime, timedelta
+
+from models import db, Transaction, User
+from sales_listing import sales_page
+
+
+def test_listing_pages_through_sales_but_not_returns(app):
+    with app.app_context():
+        user = db.session.query(User).first()
+        start = datetime(2026, 1, 1)
+        sales = [Transaction(total_amount=10.0, payment_method='cash', user_id=user.id,
+                             date=start + timedelta(hours=i)) for i in range(5)]
+        db.session.add_all(sales)
+        db.session.flush()
+        db.session.add(Transaction(total_amount=10.0, payment_method='cash', user_id=user.id,
+                                   is_return=True, original_transaction_id=sales[0].id,
+                                   date=start + timedelta(hours=10)))
+        db.session.commit()
+
+        first, cursor = sales_page(limit=3)
+        second, last_cursor = sales_page(cursor=cursor, limit=3)
+        assert [row.id for row in first + second] == [sale.id for sale in reversed(sales)]
+        assert last_cursor is None
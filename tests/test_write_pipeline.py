@@ -0,0 +1,54 @@
+import threading
+import time
+
+import pytest
+
+import write_pipeline
+from models import db, Product, Transaction
+
+
+@pytest.fixture
+def stuck_writer(app, monkeypatch):
+    """Make the pipeline's writer wait for the returned Event before writing each sale."""
+    app.config.update(WRITE_PIPELINE=True, WRITE_PIPELINE_TIMEOUT=0.2)
+    write_pipeline.init_write_pipeline(app)
+    release = threading.Event()
+    write_sale = write_pipeline.write_sale
+
+    def slow_write_sale(sale):
+        release.wait(10)
+        return write_sale(sale)
+
+    monkeypatch.setattr(write_pipeline, 'write_sale', slow_write_sale)
+    yield release
+    release.set()
+
+
+def checkout(client):
+    return client.post('/transactions/checkout', data={
+        'payment_method': 'cash', 'amount_tendered': '1000', 'discount_amount': '0'})
+
+
+def test_stuck_writer_leaves_the_sale_pending(app, client, stuck_writer):
+    client.post('/quick_access/add_to_cart/1')
+
+    response = checkout(client)
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith('/transactions/pending')
+    assert b'Sale Pending' in client.get('/transactions/pending').data
+    # The cart can't be checked out again while the sale may still commit
+    assert checkout(client).headers['Location'].endswith('/transactions/pending')
+
+    stuck_writer.set()
+    for _ in range(50):
+        response = client.get('/transactions/pending')
+        if response.status_code == 302:
+            break
+        time.sleep(0.05)
+    assert response.headers['Location'].endswith('/transactions/new')
+    assert b'was recorded' in client.get('/transactions/new').data
+    with app.app_context():
+        assert Transaction.query.count() == 1
+        assert db.session.get(Product, 1).quantity == 49
+    # The cart was cleared along with the pending sale
+    assert checkout(client).headers['Location'].endswith('/transactions/new')
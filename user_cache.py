@@ -0,0 +1,101 @@
+"""
+Per-worker cache of logged-in users for Flask-Login's user_loader.
+
+Every authenticated request loads its user, cart updates and search-as-you-type
+included, so the loader keeps each user's identity (id, username, role) in a
+least recently used map of USER_CACHE_SIZE entries. The cached CachedUser is a
+plain object, not an ORM row, so role checks never touch the database session.
+
+Entries are tagged with the 'users' cache version they were loaded under.
+edit_user and delete_user bump that version, so every worker reloads the user
+on its next request and a role change or deletion takes effect everywhere at
+once. The version is read together with the other cache versions in one query
+per request (catalog_cache.current_version), so checking it costs nothing
+extra on pages that read the catalog anyway. Setting USER_CACHE_SIZE to 0
+loads the user from the database on every request.
+"""
+
+import threading
+from collections import OrderedDict
+
+from flask import current_app
+from flask_login import UserMixin
+from sqlalchemy import select
+
+from catalog_cache import current_version
+from models import db, User
+
+
+class CachedUser(UserMixin):
+    """The identity of a logged-in user, detached from the database."""
+
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+
+class UserCache:
+    """Users by id with the users version they were loaded under, least recently used first."""
+
+    def __init__(self, size):
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._users = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, user_id, version):
+        with self._lock:
+            entry = self._users.get(user_id)
+            if entry is not None and entry[0] == version:
+                self.hits += 1
+                self._users.move_to_end(user_id)
+                return entry[1]
+            self.misses += 1
+            return None
+
+    def set(self, user, version):
+        with self._lock:
+            self._users[user.id] = (version, user)
+            self._users.move_to_end(user.id)
+            while len(self._users) > self.size:
+                self._users.popitem(last=False)
+
+
+def init_user_cache(app):
+    app.config.setdefault('USER_CACHE_SIZE', 1024)
+    size = app.config['USER_CACHE_SIZE']
+    users = UserCache(size) if size else None
+    app.extensions['user_cache'] = users
+
+    store = app.extensions.get('metrics')
+    if store is not None and users is not None:
+        def collect_users(store):
+            store.set_counter('pos_cache_hits_total', users.hits, cache='users')
+            store.set_counter('pos_cache_misses_total', users.misses, cache='users')
+
+        store.add_collector(collect_users)
+
+
+def load_user(user_id):
+    """Flask-Login user_loader: the CachedUser for an id, or None if there is no such user."""
+    users = current_app.extensions.get('user_cache')
+    if users is not None:
+        version = current_version('users')
+        user = users.get(user_id, version)
+        if user is not None:
+            return user
+    row = db.session.execute(
+        select(User.id, User.username, User.role).where(User.id == user_id)
+    ).first()
+    if row is None:
+        return None
+    user = CachedUser(*row)
+    if users is not None:
+        users.set(user, version)
+    return user
+
@@ -0,0 +1,277 @@
+"""
+Group commit for checkout.
+
+SQLite allows one writer at a time and every commit is an fsync, so registers
+checking out at the same moment queue up on the write lock and each pays for
+its own sync. With WRITE_PIPELINE enabled, checkout hands the sale to a single
+writer thread instead. The writer waits up to WRITE_PIPELINE_WINDOW_MS for more
+sales to arrive, writes the whole batch in one transaction and commits once.
+Each register blocks on its own Future until that commit has returned, so the
+receipt is only rendered for a sale that is on disk. It waits at most
+WRITE_PIPELINE_TIMEOUT seconds for the writer to take the sale and as long
+again for the commit. A sale the writer is still busy with after that is
+held as pending: the register shows it as such and checks back for the
+outcome instead of tying up the worker.
+
+A longer window means larger batches and fewer syncs but adds up to that much
+latency to every checkout; WRITE_PIPELINE_MAX_BATCH caps how many sales share a
+commit. The writer lives in each worker process, so batching only happens
+between requests served by the same worker: run gunicorn with threads
+(`-w 1 --threads 8`) rather than processes to get the full benefit.
+"""
+
+import queue
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import Future
+
+from flask import current_app
+from sqlalchemy import insert
+
+from catalog_cache import bump_catalog_version
+from inventory import reserve_stock, release_stock
+from metrics import get_metrics
+from models import db, Transaction, TransactionItem
+from rollups import record_sale
+
+# A completed sale ready to be written: Transaction column values, item rows
+# (dicts without transaction_id) and the (product_id, quantity) stock lines
+Sale = namedtuple('Sale', ['fields', 'items', 'stock_lines'])
+
+# transaction_id is None when the sale was rejected for the listed shortages
+SaleResult = namedtuple('SaleResult', ['transaction_id', 'shortages'])
+
+# Seconds a pending sale's outcome is kept for its register to pick up
+HELD_SALE_TTL = 3600
+
+
+class SalePending(Exception):
+    """The writer had started on the sale but not committed it in time; it may still commit."""
+
+    def __init__(self, token):
+        super().__init__(f'Sale {token} is still being written')
+        self.token = token
+
+
+def write_sale(sale):
+    """
+    Stage one sale in the current session without committing.
+
+    Stock is reserved first. If any line is short the stock that was reserved
+    for the other lines is released again, so a rejected sale leaves nothing
+    behind in the transaction and the sales batched with it can still commit.
+
+    Returns:
+        SaleResult
+    """
+    shortages = reserve_stock(sale.stock_lines)
+    if shortages:
+        short_ids = {shortage.product_id for shortage in shortages}
+        release_stock([(product_id, quantity) for product_id, quantity in sale.stock_lines
+                       if product_id not in short_ids])
+        return SaleResult(None, shortages)
+
+    transaction = Transaction(**sale.fields)
+    db.session.add(transaction)
+    db.session.flush()
+
+    # Insert every line in one executemany instead of one INSERT per item
+    items = [dict(item, transaction_id=transaction.id) for item in sale.items]
+    db.session.execute(insert(TransactionItem), items)
+
+    record_sale(transaction)
+    return SaleResult(transaction.id, [])
+
+
+def _product_ids(sales):
+    return [product_id for sale in sales for product_id, _ in sale.stock_lines]
+
+
+class WritePipeline:
+    """A single writer thread that commits queued sales in batches."""
+
+    def __init__(self, app, window, max_batch):
+        self.app = app
+        self.window = window
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # token -> (time held, Future) for sales reported as pending
+        self._held = {}
+
+    def submit(self, sale):
+        """Queue a sale; the Future resolves to its SaleResult once committed."""
+        self._ensure_writer()
+        future = Future()
+        self._queue.put((sale, future))
+        return future
+
+    def hold(self, future):
+        """Keep a pending sale's Future for its register to check later; returns its token."""
+        token = uuid.uuid4().hex
+        now = time.monotonic()
+        with self._lock:
+            for held_token, (held_at, _) in list(self._held.items()):
+                if now - held_at > HELD_SALE_TTL:
+                    del self._held[held_token]
+            self._held[token] = (now, future)
+        return token
+
+    def held(self, token):
+        """The Future of a pending sale, or None if this worker doesn't hold it."""
+        with self._lock:
+            entry = self._held.get(token)
+        return entry[1] if entry else None
+
+    def release(self, token):
+        with self._lock:
+            self._held.pop(token, None)
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='checkout-writer', daemon=True)
+                self._thread.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        # Sales whose register gave up waiting (cancelled) are dropped; the
+        # rest can no longer be cancelled and will be answered
+        return [(sale, future) for sale, future in batch if future.set_running_or_notify_cancel()]
+
+    def _run(self):
+        with self.app.app_context():
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    continue
+                try:
+                    results = self._commit_batch(batch)
+                except Exception:
+                    db.session.rollback()
+                    # Something other than a stock shortage failed; retry each
+                    # sale in its own transaction so one bad sale can't fail the rest
+                    for sale, future in batch:
+                        self._commit_one(sale, future)
+                else:
+                    for (_, future), result in zip(batch, results):
+                        future.set_result(result)
+                    metrics = get_metrics()
+                    if metrics is not None:
+                        metrics.observe('pos_write_batch_size', len(batch))
+                finally:
+                    db.session.remove()
+
+    def _commit_batch(self, batch):
+        results = [write_sale(sale) for sale, _ in batch]
+        written = [sale for (sale, _), result in zip(batch, results) if result.transaction_id]
+        # Custom items aren't in the catalog
+        changed = _product_ids(written)
+        if changed:
+            bump_catalog_version(changed)
+        db.session.commit()
+        return results
+
+    def _commit_one(self, sale, future):
+        try:
+            result = write_sale(sale)
+            changed = _product_ids([sale])
+            if result.transaction_id and changed:
+                bump_catalog_version(changed)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.app.logger.exception('Checkout write failed')
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+
+
+def init_write_pipeline(app):
+    """Create the checkout writer if WRITE_PIPELINE is on (it starts on the first sale)."""
+    app.config.setdefault('WRITE_PIPELINE', False)
+    app.config.setdefault('WRITE_PIPELINE_WINDOW_MS', 5)
+    app.config.setdefault('WRITE_PIPELINE_MAX_BATCH', 64)
+    app.config.setdefault('WRITE_PIPELINE_TIMEOUT', 30)
+    if app.config['WRITE_PIPELINE']:
+        app.extensions['write_pipeline'] = WritePipeline(
+            app,
+            window=app.config['WRITE_PIPELINE_WINDOW_MS'] / 1000,
+            max_batch=app.config['WRITE_PIPELINE_MAX_BATCH']
+        )
+
+
+def commit_sale(sale):
+    """
+    Write and commit a sale, through the pipeline when it is enabled.
+
+    Returns:
+        SaleResult: committed (transaction_id set) or rejected (shortages set)
+
+    Raises:
+        TimeoutError: the sale waited WRITE_PIPELINE_TIMEOUT seconds in the
+                      pipeline's queue and was withdrawn without being written,
+                      so the checkout can safely be retried
+        SalePending: the writer took the sale but hadn't committed it after
+                     another WRITE_PIPELINE_TIMEOUT seconds; pending_sale()
+                     gives its outcome later
+    """
+    pipeline = current_app.extensions.get('write_pipeline')
+    if pipeline is not None:
+        timeout = current_app.config['WRITE_PIPELINE_TIMEOUT']
+        future = pipeline.submit(sale)
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            if future.cancel():
+                raise
+        # The writer already has it; reporting a failure now could get the
+        # sale recorded twice on retry, so wait for its commit, but not forever
+        try:
+            return future.result(timeout=timeout)
+        except TimeoutError:
+            raise SalePending(pipeline.hold(future)) from None
+
+    result = write_sale(sale)
+    if result.shortages:
+        db.session.rollback()
+        return result
+    changed = _product_ids([sale])
+    if changed:
+        bump_catalog_version(changed)
+    db.session.commit()
+    return result
+
+
+def pending_sale(token):
+    """
+    Check on a sale commit_sale() reported as pending.
+
+    Returns:
+        tuple: (done, SaleResult). done is False while the writer is still on
+               it, and the result is None when this worker doesn't know the
+               token (another worker, or a restart)
+
+    Raises:
+        Exception: whatever made the writer fail to commit the sale
+    """
+    pipeline = current_app.extensions.get('write_pipeline')
+    future = pipeline.held(token) if pipeline is not None else None
+    if future is None:
+        return True, None
+    if not future.done():
+        return False, None
+    pipeline.release(token)
+    return True, future.result()